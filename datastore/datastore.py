@@ -1,11 +1,17 @@
 from abc import ABC, abstractmethod
-from typing import Dict, List, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
 import asyncio
+import functools
+import heapq
+import os
 
 from models.models import (
     Document,
     DocumentChunk,
+    DocumentChunkWithCollection,
     DocumentMetadataFilter,
+    MultiCollectionQueryResult,
     Query,
     QueryResult,
     QueryWithEmbedding,
@@ -14,31 +20,33 @@ from services.chunks import get_document_chunks
 from services.openai import get_embeddings
 from services.mpnet import get_mpnet_embeddings
 
+# The number of seconds a single collection may take to answer a multi-collection query before it is skipped
+COLLECTION_QUERY_TIMEOUT = float(os.environ.get("COLLECTION_QUERY_TIMEOUT", 10))
+# The default number of threads running the blocking calls of a provider client, per provider
+DATASTORE_IO_WORKERS = int(os.environ.get("DATASTORE_IO_WORKERS", 16))
+
 
 class DataStore(ABC):
+    # The width of the thread pool running the blocking client calls, providers set it from their own env var
+    io_workers: int = DATASTORE_IO_WORKERS
+    _io_executor: Optional[ThreadPoolExecutor] = None
+
     async def upsert(
-        self, documents: List[Document], chunk_token_size: Optional[int] = None, mode='openai', model=None, tokenizer=None, collection_name=None
+        self, documents: List[Document], chunk_token_size: Optional[int] = None, mode='openai', model=None, tokenizer=None, collection_name=None,
+        text_chunks: Optional[List[Optional[List[str]]]] = None,
     ) -> List[str]:
         """
         Takes in a list of documents and inserts them into the database.
         First deletes all the existing vectors with the document id (if necessary, depends on the vector db), then inserts the new ones.
+        Documents whose text is already split can pass the text chunks in text_chunks, in the same order as documents.
         Return a list of document ids.
         """
-        # Delete any existing vectors for documents with the input document ids
-        await asyncio.gather(
-            *[
-                self.delete(
-                    filter=DocumentMetadataFilter(
-                        document_id=document.id,
-                    ),
-                    delete_all=False,
-                )
-                for document in documents
-                if document.id
-            ]
-        )
+        # Delete any existing vectors for documents with the input document ids, in a single call
+        document_ids = [document.id for document in documents if document.id]
+        if document_ids:
+            await self.delete(ids=document_ids, delete_all=False, collection_name=collection_name)
 
-        chunks = get_document_chunks(documents, chunk_token_size, mode, model, tokenizer)
+        chunks = get_document_chunks(documents, chunk_token_size, mode, model, tokenizer, text_chunks)
 
         return await self._upsert(chunks, collection_name=collection_name, mode=mode)
 
@@ -51,9 +59,91 @@ class DataStore(ABC):
 
         raise NotImplementedError
 
-    async def query(self, queries: List[Query], mode='openai', model=None, tokenizer=None, collection_name=None) -> List[QueryResult]:
+    async def query(
+        self, queries: List[Query], mode='openai', model=None, tokenizer=None, collection_name=None, session_token: Optional[str] = None,
+    ) -> List[QueryResult]:
         """
         Takes in a list of queries and filters and returns a list of query results with matching document chunks and scores.
+        A session token from get_session_token makes the queries see the writes made before it was issued.
+        """
+        queries_with_embeddings = self._embed_queries(queries, mode, model, tokenizer)
+        return await self._query(queries_with_embeddings, collection_name=collection_name, mode=mode, session_token=session_token)
+
+    async def query_collections(
+        self,
+        queries: List[Query],
+        collections: Dict[str, str],
+        model=None,
+        tokenizer=None,
+        timeout: Optional[float] = None,
+    ) -> Tuple[List[MultiCollectionQueryResult], List[str]]:
+        """
+        Runs the queries against several collections concurrently and merges the results of each query into a top_k
+        per embedding method.
+        Each query is embedded once per embedding method, and a collection that errors or does not answer within the timeout is skipped.
+        The providers return similarity scores, higher is better, which are only comparable between collections that
+        share an embedding method, so the collections of each embedding method are ranked on their own.
+        Takes a dict from collection name to its embedding method.
+        Returns the merged query results, one per query and embedding method in the order of the queries, and the names
+        of the collections that were skipped.
+        """
+        if timeout is None:
+            timeout = COLLECTION_QUERY_TIMEOUT
+
+        # embed the queries once for every embedding method in use
+        embedded_queries = {
+            mode: self._embed_queries(queries, mode, model, tokenizer)
+            for mode in set(collections.values())
+        }
+
+        collection_names = list(collections.keys())
+        collection_results = await asyncio.gather(
+            *[
+                asyncio.wait_for(
+                    self._query(embedded_queries[mode], collection_name=collection_name, mode=mode),
+                    timeout,
+                )
+                for collection_name, mode in collections.items()
+            ],
+            return_exceptions=True,
+        )
+
+        failed_collections: List[str] = []
+        answered: Dict[str, List[Tuple[str, List[QueryResult]]]] = {mode: [] for mode in embedded_queries}
+        for collection_name, result in zip(collection_names, collection_results):
+            if isinstance(result, BaseException):
+                print(f"Error querying collection {collection_name}: {result!r}")
+                failed_collections.append(collection_name)
+            else:
+                answered[collections[collection_name]].append((collection_name, result))
+
+        results: List[MultiCollectionQueryResult] = []
+        for i, query in enumerate(queries):
+            for mode in sorted(answered):
+                # merge the per-collection top_k lists of the embedding method into its top_k, keeping track of where
+                # each chunk came from
+                candidates = (
+                    (chunk, collection_name)
+                    for collection_name, query_results in answered[mode]
+                    for chunk in query_results[i].results
+                )
+                top_chunks = heapq.nlargest(query.top_k, candidates, key=lambda candidate: candidate[0].score)
+                results.append(
+                    MultiCollectionQueryResult(
+                        query=query.query,
+                        embedding_method=mode,
+                        results=[
+                            DocumentChunkWithCollection(**chunk.dict(), collection_name=collection_name)
+                            for chunk, collection_name in top_chunks
+                        ],
+                    )
+                )
+
+        return results, failed_collections
+
+    def _embed_queries(self, queries: List[Query], mode='openai', model=None, tokenizer=None) -> List[QueryWithEmbedding]:
+        """
+        Takes in a list of queries and returns them hydrated with the embeddings of the given embedding method.
         """
         # get a list of of just the queries from the Query list
         query_texts = [query.query for query in queries]
@@ -64,19 +154,47 @@ class DataStore(ABC):
         else:
             raise ValueError('Invalid mode')
         # hydrate the queries with embeddings
-        queries_with_embeddings = [
+        return [
             QueryWithEmbedding(**query.dict(), embedding=embedding)
             for query, embedding in zip(queries, query_embeddings)
         ]
-        return await self._query(queries_with_embeddings, collection_name=collection_name, mode=mode)
 
     @abstractmethod
-    async def _query(self, queries: List[QueryWithEmbedding], collection_name=None, mode='mpnet') -> List[QueryResult]:
+    async def _query(self, queries: List[QueryWithEmbedding], collection_name=None, mode='mpnet', session_token: Optional[str] = None) -> List[QueryResult]:
         """
         Takes in a list of queries with embeddings and filters and returns a list of query results with matching document chunks and scores.
+        Scores are similarities, a better match has a higher score, and a failing search raises instead of returning no results.
         """
         raise NotImplementedError
 
+    async def _run_io(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        Runs a blocking client call in the provider's I/O thread pool and awaits its result,
+        so the event loop keeps serving requests and concurrent calls overlap on the network.
+        """
+        if self._io_executor is None:
+            self._io_executor = ThreadPoolExecutor(
+                max_workers=self.io_workers, thread_name_prefix=type(self).__name__
+            )
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._io_executor, functools.partial(fn, *args, **kwargs))
+
+    def get_session_token(self, collection_name=None) -> Optional[str]:
+        """
+        Returns a token for the writes made so far to the collection, to pass to query for read-your-writes.
+        Providers whose reads always see the earlier writes return None.
+        """
+        return None
+
+    def get_metrics(self, collections: Optional[Dict[str, str]] = None) -> Dict[str, Dict]:
+        """
+        Returns the provider metrics of each collection, keyed by collection name.
+        Takes an optional dict from collection name to its embedding method, for the providers that store several
+        collections together to report the metrics of their storage under each of them.
+        Providers without per collection metrics return an empty dict.
+        """
+        return {}
+
     @abstractmethod
     async def delete(
         self,
@@ -1,8 +1,13 @@
 import json
 import os
+import re
 import asyncio
+import bisect
+import threading
+import time
+import numpy as np
 
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Set, Tuple
 from pymilvus import (
     Collection,
     connections,
@@ -12,11 +17,12 @@ from pymilvus import (
     CollectionSchema,
     MilvusException,
 )
+from pymilvus.client.types import LoadState
 from uuid import uuid4
 
 
 from services.date import to_unix_timestamp
-from datastore.datastore import DataStore
+from datastore.datastore import DataStore, DATASTORE_IO_WORKERS
 from models.models import (
     DocumentChunk,
     DocumentChunkMetadata,
@@ -37,11 +43,43 @@ MILVUS_USE_SECURITY = False if MILVUS_PASSWORD is None else True
 MILVUS_INDEX_PARAMS = os.environ.get("MILVUS_INDEX_PARAMS")
 MILVUS_SEARCH_PARAMS = os.environ.get("MILVUS_SEARCH_PARAMS")
 MILVUS_CONSISTENCY_LEVEL = os.environ.get("MILVUS_CONSISTENCY_LEVEL")
+# The consistency level of the searches without a session token, Bounded or Eventually keep them from waiting on
+# the timestamp sync Strong needs
+MILVUS_QUERY_CONSISTENCY_LEVEL = os.environ.get("MILVUS_QUERY_CONSISTENCY_LEVEL", "Bounded")
+# Loaded collections that have not been used for this many seconds are released from Milvus memory, 0 to never release
+MILVUS_COLLECTION_IDLE_TTL = int(os.environ.get("MILVUS_COLLECTION_IDLE_TTL", 3600))
+# The estimated vector memory (in MB) of the loaded collections above which the least recently used ones are released, 0 for no budget
+MILVUS_LOAD_MEMORY_BUDGET_MB = int(os.environ.get("MILVUS_LOAD_MEMORY_BUDGET_MB", 0))
+# The index type of the scalar indexes on the filter fields, by default Trie for strings and STL_SORT for numbers
+# (Milvus 2.4 and above also support INVERTED)
+MILVUS_SCALAR_INDEX_TYPE = os.environ.get("MILVUS_SCALAR_INDEX_TYPE")
+# Store the collections as partitions of one shared collection per embedding method, scoped by a partition key
+MILVUS_PARTITION_KEY_MODE = os.environ.get("MILVUS_PARTITION_KEY_MODE", "false").lower() == "true"
+# The shared collections are named <prefix>_<embedding method>
+MILVUS_SHARED_COLLECTION_PREFIX = os.environ.get("MILVUS_SHARED_COLLECTION_PREFIX", "shared")
+# The number of physical partitions the partition key hashes the collections into
+MILVUS_NUM_PARTITIONS = int(os.environ.get("MILVUS_NUM_PARTITIONS", 64))
+# The number of threads running the blocking Milvus client calls
+MILVUS_IO_WORKERS = int(os.environ.get("MILVUS_IO_WORKERS", DATASTORE_IO_WORKERS))
 
-UPSERT_BATCH_SIZE = 100
+# The most rows and the most bytes sent in one insert request, Milvus rejects gRPC messages above its size limit
+UPSERT_BATCH_SIZE = int(os.environ.get("MILVUS_UPSERT_BATCH_SIZE", 1000))
+UPSERT_BATCH_BYTES = int(os.environ.get("MILVUS_UPSERT_BATCH_BYTES", 16 * 1024 * 1024))
+# The number of insert requests in flight at once
+UPSERT_CONCURRENCY = int(os.environ.get("MILVUS_UPSERT_CONCURRENCY", 4))
+# The number of times a failed insert request is retried before its documents are given up on
+UPSERT_RETRIES = int(os.environ.get("MILVUS_UPSERT_RETRIES", 3))
+SEARCH_BATCH_SIZE = 100  # The most query vectors sent in one search request
+DELETE_EXPR_MAX_LENGTH = 64 * 1024  # The longest `document_id in [...]` expression sent in one delete request
 OUTPUT_DIM_OPENAI = 1536
 OUTPUT_DIM_MPNET = 768
 EMBEDDING_FIELD = "embedding"
+# The fields that filters and deletes match on, they get a scalar index
+SCALAR_INDEX_FIELDS = ["document_id", "source", "source_id", "author", "created_at"]
+# The field of the shared collections holding the name of the collection an entity belongs to
+PARTITION_KEY_FIELD = "collection_name"
+# The upper bounds (in ms) of the buckets of the search latency histograms
+SEARCH_LATENCY_BUCKETS_MS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000]
 
 
 class Required:
@@ -155,7 +193,244 @@ SCHEMA_V2_MPNET = SCHEMA_V1_MPNET[1:]
 SCHEMA_V2_MPNET[4][1].is_primary = True
 
 
+# The partition key field, appended to the schema of the shared collections
+PARTITION_KEY_SCHEMA = (
+    PARTITION_KEY_FIELD,
+    FieldSchema(name=PARTITION_KEY_FIELD, dtype=DataType.VARCHAR, max_length=512, is_partition_key=True),
+    Required,
+)
+
+
+class LatencyHistogram:
+    """Counts latencies into the SEARCH_LATENCY_BUCKETS_MS buckets, the last bucket holding everything above."""
+
+    def __init__(self):
+        self.counts = [0] * (len(SEARCH_LATENCY_BUCKETS_MS) + 1)
+        self.total_ms = 0.0
+
+    def observe(self, seconds: float):
+        ms = seconds * 1000
+        self.counts[bisect.bisect_left(SEARCH_LATENCY_BUCKETS_MS, ms)] += 1
+        self.total_ms += ms
+
+    def snapshot(self) -> Dict:
+        count = sum(self.counts)
+        labels = ["<={}".format(bound) for bound in SEARCH_LATENCY_BUCKETS_MS] + [">{}".format(SEARCH_LATENCY_BUCKETS_MS[-1])]
+        return {
+            "count": count,
+            "mean_ms": self.total_ms / count if count else None,
+            "buckets": dict(zip(labels, self.counts)),
+        }
+
+
+class MilvusCollectionManager:
+    """Caches the Collection handles, loads collections on first use and releases the idle ones.
+
+    Building a Collection costs a describe RPC, so the handles are kept by name. A collection is only loaded into
+    Milvus memory when it is first searched, queried or deleted from, and it is released again once it has been idle
+    for longer than the idle TTL, or once the loaded collections exceed the memory budget (least recently used first).
+    The idle collections are checked on every acquire, and by a background thread while any collection is loaded, so
+    they are released when no request comes in either. Every acquire is paired with a done, and a collection is never
+    released by the manager while it is in use.
+    """
+
+    # How often, in seconds, the loaded collections are checked for idleness
+    RELEASE_CHECK_INTERVAL = 60
+
+    def __init__(self, alias: str, idle_ttl: int = MILVUS_COLLECTION_IDLE_TTL, memory_budget_mb: int = MILVUS_LOAD_MEMORY_BUDGET_MB):
+        self.alias = alias
+        self.idle_ttl = idle_ttl
+        self.memory_budget = memory_budget_mb * 1024 * 1024
+        self._lock = threading.RLock()
+        self._handles: Dict[str, Collection] = {}
+        # Per collection load state and metrics
+        self._stats: Dict[str, Dict] = {}
+        # One lock per collection, so concurrent first queries load it once
+        self._load_locks: Dict[str, threading.Lock] = {}
+        self._last_release_check = time.monotonic()
+        # The thread releasing the idle collections, running while any collection is loaded
+        self._release_thread: Optional[threading.Thread] = None
+
+    def get(self, collection_name: str) -> Collection:
+        """Return the cached handle of a collection, without loading it."""
+        with self._lock:
+            col = self._handles.get(collection_name)
+            if col is None:
+                col = Collection(collection_name, using=self.alias)
+                self._handles[collection_name] = col
+            return col
+
+    def acquire(self, collection_name: str) -> Collection:
+        """Return the handle of a collection, loading it into Milvus memory if it is not loaded yet.
+
+        The collection counts as in use, and is not released when idle or over the memory budget, until done is called.
+        """
+        col = self.get(collection_name)
+        with self._lock:
+            stats = self._get_stats(collection_name)
+            stats["last_access"] = time.time()
+            stats["users"] += 1
+            loaded = stats["loaded"]
+            load_lock = self._load_locks.setdefault(collection_name, threading.Lock())
+        try:
+            if not loaded:
+                # Also waits for a release of the collection that is still running
+                with load_lock:
+                    if not self._get_stats(collection_name)["loaded"]:
+                        self._load(col)
+            self._maybe_release_idle()
+        except BaseException:
+            self.done(collection_name)
+            raise
+        return col
+
+    def done(self, collection_name: str):
+        """End a use of a collection returned by acquire."""
+        with self._lock:
+            stats = self._stats.get(collection_name)
+            if stats is not None and stats["users"] > 0:
+                stats["users"] -= 1
+
+    def forget(self, collection_name: str):
+        """Drop the handle and load state of a collection, e.g. after it was dropped."""
+        with self._lock:
+            self._handles.pop(collection_name, None)
+            self._stats.pop(collection_name, None)
+            self._load_locks.pop(collection_name, None)
+
+    def release(self, collection_name: str, unused_only: bool = False) -> bool:
+        """Release a collection from Milvus memory.
+
+        Args:
+            collection_name (str): The collection to release.
+            unused_only (bool): Only release the collection if no acquire of it is waiting for its done.
+
+        Returns:
+            bool: Whether the collection was released.
+        """
+        col = self.get(collection_name)
+        with self._lock:
+            stats = self._get_stats(collection_name)
+            if unused_only and stats["users"] > 0:
+                return False
+            # Marked as released first, so an acquire from now on loads it again once the release is done
+            stats["loaded"] = False
+            stats["estimated_bytes"] = 0
+            load_lock = self._load_locks.setdefault(collection_name, threading.Lock())
+        with load_lock:
+            col.release()
+        with self._lock:
+            stats["releases"] += 1
+            stats["last_release"] = time.time()
+        return True
+
+    def metrics(self) -> Dict[str, Dict]:
+        """Return the load and release metrics of every collection seen by this manager."""
+        with self._lock:
+            return {name: dict(stats) for name, stats in self._stats.items()}
+
+    def _load(self, col: Collection):
+        start = time.monotonic()
+        col.load()
+        load_seconds = time.monotonic() - start
+        # Estimate the memory the vectors take in Milvus, for the memory budget
+        dim = next(
+            (field.params.get("dim", 0) for field in col.schema.fields if field.name == EMBEDDING_FIELD), 0
+        )
+        estimated_bytes = col.num_entities * int(dim) * 4
+        with self._lock:
+            stats = self._get_stats(col.name)
+            stats["loaded"] = True
+            stats["estimated_bytes"] = estimated_bytes
+            stats["loads"] += 1
+            stats["last_load"] = time.time()
+            stats["last_load_seconds"] = load_seconds
+        self._print_info("Loaded Milvus collection '{}' in {:.2f}s".format(col.name, load_seconds))
+        self._start_release_thread()
+
+    def _start_release_thread(self):
+        with self._lock:
+            if self.idle_ttl <= 0 or self._release_thread is not None:
+                return
+            self._release_thread = threading.Thread(
+                target=self._release_loop, name="MilvusCollectionRelease", daemon=True
+            )
+            self._release_thread.start()
+
+    def _release_loop(self):
+        while True:
+            time.sleep(self.RELEASE_CHECK_INTERVAL)
+            try:
+                self._release_idle()
+            except Exception as e:
+                print("Failed to release the idle Milvus collections, error: {}".format(e))
+            with self._lock:
+                # Started again by the next load
+                if not any(stats["loaded"] for stats in self._stats.values()):
+                    self._release_thread = None
+                    return
+
+    def _maybe_release_idle(self):
+        with self._lock:
+            if time.monotonic() - self._last_release_check < self.RELEASE_CHECK_INTERVAL and not self._over_budget():
+                return
+        self._release_idle()
+
+    def _release_idle(self):
+        with self._lock:
+            self._last_release_check = time.monotonic()
+            loaded = sorted(
+                (stats["last_access"], name)
+                for name, stats in self._stats.items()
+                if stats["loaded"] and stats["users"] == 0
+            )
+        to_release = []
+        if self.idle_ttl > 0:
+            to_release = [name for last_access, name in loaded if time.time() - last_access > self.idle_ttl]
+        for name in to_release:
+            self._release_quietly(name, "idle")
+        # Release the least recently used collections that are not in use until under the memory budget, the
+        # collection being acquired is in use
+        remaining = [name for _, name in loaded if name not in to_release]
+        while remaining and self._over_budget():
+            self._release_quietly(remaining.pop(0), "over memory budget")
+
+    def _over_budget(self) -> bool:
+        if self.memory_budget <= 0:
+            return False
+        return sum(stats["estimated_bytes"] for stats in self._stats.values() if stats["loaded"]) > self.memory_budget
+
+    def _release_quietly(self, collection_name: str, reason: str):
+        try:
+            # The collection may have been acquired since it was picked
+            if self.release(collection_name, unused_only=True):
+                self._print_info("Released Milvus collection '{}' ({})".format(collection_name, reason))
+        except Exception as e:
+            print("Failed to release Milvus collection '{}', error: {}".format(collection_name, e))
+
+    def _get_stats(self, collection_name: str) -> Dict:
+        if collection_name not in self._stats:
+            self._stats[collection_name] = {
+                "loaded": False,
+                "users": 0,
+                "loads": 0,
+                "releases": 0,
+                "last_access": None,
+                "last_load": None,
+                "last_load_seconds": None,
+                "last_release": None,
+                "estimated_bytes": 0,
+            }
+        return self._stats[collection_name]
+
+    def _print_info(self, msg):
+        # TODO: logger
+        print(msg)
+
+
 class MilvusDataStore(DataStore):
+    io_workers = MILVUS_IO_WORKERS
+
     def __init__(
         self,
         consistency_level: str = "Bounded",
@@ -172,6 +447,7 @@ class MilvusDataStore(DataStore):
         """
         # Overwrite the default consistency level by MILVUS_CONSISTENCY_LEVEL
         self._consistency_level = MILVUS_CONSISTENCY_LEVEL or consistency_level
+        self._partition_key_mode = MILVUS_PARTITION_KEY_MODE
         self._schema_ver = "V2"
         self.index_params = MILVUS_INDEX_PARAMS or None
         self.search_params = MILVUS_SEARCH_PARAMS or None
@@ -191,6 +467,18 @@ class MilvusDataStore(DataStore):
         # Set the search params
         self.search_params = default_search_params["HNSW"]
         self._create_connection()
+        # Cached collection handles, loaded on first use and released when idle
+        self._collections = MilvusCollectionManager(self.alias)
+        # The collections created for a bulk load, until their indexes are built and they are loaded
+        self._bulk_loads: Dict[str, Dict] = {}
+        # The collections known to have their vector index, so the server is only asked once
+        self._indexed: Set[str] = set()
+        # The timestamp of the last insert or delete in each collection, handed out as session tokens
+        self._write_ts: Dict[str, int] = {}
+        # The search latency histograms of each collection, by consistency level
+        self._search_latencies: Dict[str, Dict[str, LatencyHistogram]] = {}
+        # The major and minor version of the Milvus server, found when first needed
+        self._server_version: Optional[Tuple[int, int]] = None
 
     def _print_info(self, msg):
         # TODO: logger
@@ -200,7 +488,7 @@ class MilvusDataStore(DataStore):
         # TODO: logger
         print(msg)
 
-    def _get_schema(self, embedding_method: str):
+    def _get_schema(self, embedding_method: str, shared: bool = False):
         if embedding_method == "openai":
             SCHEMA_V1 = SCHEMA_V1_OPENAI
             SCHEMA_V2 = SCHEMA_V2_OPENAI
@@ -209,7 +497,35 @@ class MilvusDataStore(DataStore):
             SCHEMA_V2 = SCHEMA_V2_MPNET
         else:
             raise Exception("Invalid embedding method")
-        return SCHEMA_V1 if self._schema_ver == "V1" else SCHEMA_V2
+        schema = SCHEMA_V1 if self._schema_ver == "V1" else SCHEMA_V2
+        # The shared collections also hold the collection name of each entity
+        return schema + [PARTITION_KEY_SCHEMA] if shared else schema
+
+    def _get_physical_collection_name(self, collection_name: str, embedding_method: str) -> str:
+        # The Milvus collection the entities of a collection are stored in
+        if self._partition_key_mode:
+            return "{}_{}".format(MILVUS_SHARED_COLLECTION_PREFIX, embedding_method)
+        return collection_name
+
+    def _get_shared_collection_names(self) -> List[str]:
+        # The shared collections that exist, a collection lives in the one of its embedding method
+        names = [self._get_physical_collection_name("", embedding_method) for embedding_method in ("openai", "mpnet")]
+        return [name for name in names if utility.has_collection(name, using=self.alias)]
+
+    def _scope_expr(self, collection_name: str, expr: Optional[str]) -> Optional[str]:
+        """Restrict an expression to the entities of a collection, in partition key mode.
+
+        Args:
+            collection_name (str): The collection the expression applies to.
+            expr (Optional[str]): The expression, or None to match the whole collection.
+
+        Returns:
+            Optional[str]: The scoped expression, or the expression itself when every collection has its own.
+        """
+        if not self._partition_key_mode:
+            return expr
+        partition_expr = "{} == {}".format(PARTITION_KEY_FIELD, json.dumps(collection_name))
+        return "{} and ({})".format(partition_expr, expr) if expr else partition_expr
 
     def _create_connection(self):
         try:
@@ -240,14 +556,15 @@ class MilvusDataStore(DataStore):
             self._print_err("Failed to create connection to Milvus server '{}:{}', error: {}"
                             .format(MILVUS_HOST, MILVUS_PORT, e))
 
-    def _create_collection(self, collection_name, embedding_method, create_new: bool = False) -> None:
+    def _create_collection(self, collection_name, embedding_method, create_new: bool = False, shared: bool = False) -> None:
         """Create a collection based on environment and passed in variables.
 
         Args:
             create_new (bool): Whether to overwrite if collection already exists.
+            shared (bool): Whether to create a shared collection, partitioned by the collection name of its entities.
         """
         try:
-            SCHEMA_V2 = self._get_schema(embedding_method)
+            SCHEMA_V2 = self._get_schema(embedding_method, shared=shared)
             # If the collection exists and create_new is True, drop the existing collection
             if utility.has_collection(collection_name, using=self.alias) and create_new:
                 utility.drop_collection(collection_name, using=self.alias)
@@ -258,11 +575,14 @@ class MilvusDataStore(DataStore):
                 schema = [field[1] for field in SCHEMA_V2]
                 schema = CollectionSchema(schema)
                 # Use the schema to create a new collection
+                # A shared collection hashes the collection names into a fixed number of partitions
+                partitions = {"num_partitions": MILVUS_NUM_PARTITIONS} if shared else {}
                 col = Collection(
                     collection_name,
                     schema=schema,
                     using=self.alias,
                     consistency_level=self._consistency_level,
+                    **partitions,
                 )
                 self._print_info("Create Milvus collection '{}' with schema {} and consistency level {}"
                                  .format(collection_name, self._schema_ver, self._consistency_level))
@@ -283,16 +603,72 @@ class MilvusDataStore(DataStore):
             self._print_err("Failed to create collection '{}', error: {}".format(collection_name, e))
 
     def _get_collection(self, collection_name):
-        return Collection(
-                    collection_name, using=self.alias
-                )
+        return self._collections.get(collection_name)
+
+    def _get_embedding_method(self, col: Collection) -> str:
+        # The embedding method of an existing collection, from the dimension of its embedding field
+        for field in col.schema.fields:
+            if field.name == EMBEDDING_FIELD:
+                return "openai" if field.params.get("dim") == OUTPUT_DIM_OPENAI else "mpnet"
+        raise Exception("Collection '{}' has no embedding field".format(col.name))
+
+    def get_metrics(self, collections: Optional[Dict[str, str]] = None) -> Dict[str, Dict]:
+        metrics = self._collections.metrics()
+        if self._partition_key_mode and collections:
+            # The collections are loaded and released with the shared collection of their embedding method
+            shared_metrics = metrics
+            metrics = {}
+            for collection_name, embedding_method in collections.items():
+                shared_name = self._get_physical_collection_name(collection_name, embedding_method)
+                if shared_name in shared_metrics:
+                    metrics[collection_name] = dict(shared_metrics[shared_name], shared_collection=shared_name)
+        for collection_name, histograms in self._search_latencies.items():
+            metrics.setdefault(collection_name, {})["search_latency_ms"] = {
+                level: histogram.snapshot() for level, histogram in histograms.items()
+            }
+        return metrics
+
+    def get_session_token(self, collection_name=None) -> Optional[str]:
+        ts = self._write_ts.get(collection_name)
+        return str(ts) if ts is not None else None
+
+    def _record_write(self, collection_name: str, ts: int):
+        # Session tokens only move forward, a read with the latest one sees every earlier write
+        if ts > self._write_ts.get(collection_name, 0):
+            self._write_ts[collection_name] = ts
 
-    def _create_index(self, collection_name):
+    def _get_consistency(self, session_token: Optional[str]) -> Dict:
+        """Return the consistency arguments of a search.
+
+        Without a session token, the search uses MILVUS_QUERY_CONSISTENCY_LEVEL. With one, it waits until Milvus has
+        caught up with the writes the token was issued after, and no longer.
+
+        Args:
+            session_token (Optional[str]): A token from get_session_token.
+
+        Returns:
+            Dict: The consistency_level and guarantee_timestamp keyword arguments of the search.
+        """
+        if session_token:
+            try:
+                return {"consistency_level": "Customized", "guarantee_timestamp": int(session_token)}
+            except ValueError:
+                self._print_err("Invalid session token '{}', using the default consistency level".format(session_token))
+        return {"consistency_level": MILVUS_QUERY_CONSISTENCY_LEVEL}
+
+    def _create_index(self, collection_name, index_params: Optional[Dict] = None):
         # TODO: verify index/search params passed by os.environ
         col = self._get_collection(collection_name)
+        # The HNSW parameters of the collection, from the index params of /create-collection
+        hnsw_params = {"M": 8, "efConstruction": 64}
+        if index_params:
+            if "M" in index_params:
+                hnsw_params["M"] = int(index_params["M"])
+            if "EF_CONSTRUCTION" in index_params:
+                hnsw_params["efConstruction"] = int(index_params["EF_CONSTRUCTION"])
         try:
-            # If no index on the collection, create one
-            if len(col.indexes) == 0:
+            # If no index on the embedding field of the collection, create one
+            if not any(index.field_name == EMBEDDING_FIELD for index in col.indexes):
                 # if self.index_params is not None:
                 #     # Convert the string format to JSON format parameters passed by MILVUS_INDEX_PARAMS
                 #     self.index_params = json.loads(self.index_params)
@@ -305,17 +681,17 @@ class MilvusDataStore(DataStore):
                     i_p = {
                         "metric_type": "IP",
                         "index_type": "HNSW",
-                        "params": {"M": 8, "efConstruction": 64},
+                        "params": hnsw_params,
                     }
                     self._print_info("Attempting creation of Milvus '{}' index".format(i_p["index_type"]))
-                    col.create_index(EMBEDDING_FIELD, index_params=i_p)
+                    col.create_index(EMBEDDING_FIELD, index_params=i_p, index_name=EMBEDDING_FIELD)
                     self.index_params = i_p
                     self._print_info("Creation of Milvus '{}' index successful".format(i_p["index_type"]))
                 # If create fails, most likely due to being Zilliz Cloud instance, try to create an AutoIndex
                 except MilvusException:
                     self._print_info("Attempting creation of Milvus default index")
                     i_p = {"metric_type": "IP", "index_type": "AUTOINDEX", "params": {}}
-                    col.create_index(EMBEDDING_FIELD, index_params=i_p)
+                    col.create_index(EMBEDDING_FIELD, index_params=i_p, index_name=EMBEDDING_FIELD)
                     self.index_params = i_p
                     self._print_info("Creation of Milvus default index successful")
             # If an index already exists, grab its params
@@ -328,7 +704,7 @@ class MilvusDataStore(DataStore):
                         self.index_params = idx['index_param']
                         break
 
-            col.load()
+            # The collection is loaded on its first search, see MilvusCollectionManager
 
             # if self.search_params is not None:
             #     # Convert the string format to JSON format parameters passed by MILVUS_SEARCH_PARAMS
@@ -353,80 +729,270 @@ class MilvusDataStore(DataStore):
             # Set the search params
             self.search_params = default_search_params[self.index_params["index_type"]]
             self._print_info("Milvus search parameters: {}".format(self.search_params))
+
+            # Index the fields that filters and deletes match on
+            self._create_scalar_indexes(collection_name)
             return True
         except Exception as e:
             self._print_err("Failed to create index, error: {}".format(e))
 
+    def _create_scalar_indexes(self, collection_name: str) -> List[str]:
+        """Create the missing scalar indexes on the filter fields of a collection.
+
+        Args:
+            collection_name (str): The collection to index.
+
+        Returns:
+            List[str]: The fields that were indexed.
+        """
+        col = self._get_collection(collection_name)
+        indexed = {index.field_name for index in col.indexes}
+        created = []
+        for field in col.schema.fields:
+            if field.name not in SCALAR_INDEX_FIELDS or field.name in indexed:
+                continue
+            index_type = MILVUS_SCALAR_INDEX_TYPE or ("Trie" if field.dtype == DataType.VARCHAR else "STL_SORT")
+            # Every index after the first one needs its own name
+            col.create_index(field.name, index_params={"index_type": index_type}, index_name=field.name + "_idx")
+            self._print_info("Created Milvus '{}' scalar index on '{}.{}'".format(index_type, collection_name, field.name))
+            created.append(field.name)
+        return created
+
+    async def create_scalar_indexes(self, collection_name: str) -> List[str]:
+        """Add the scalar indexes on the filter fields to a collection created before they existed.
+
+        The collection is released first if it is loaded, and loaded again with its new indexes on its next use.
+
+        Args:
+            collection_name (str): The collection to migrate.
+
+        Returns:
+            List[str]: The fields that were indexed.
+        """
+        col = await self._run_io(self._get_collection, collection_name)
+        indexed = {index.field_name for index in col.indexes}
+        if all(field.name in indexed for field in col.schema.fields if field.name in SCALAR_INDEX_FIELDS):
+            return []
+        if await self._run_io(utility.load_state, collection_name, using=self.alias) == LoadState.Loaded:
+            await self._run_io(self._collections.release, collection_name)
+        return await self._run_io(self._create_scalar_indexes, collection_name)
+
+    async def migrate_to_shared_collection(self, collection_name: str, drop: bool = False) -> int:
+        """Copy the entities of a collection into the shared collection of its embedding method.
+
+        The entities keep the collection name as their partition key, so the collection is used the same way once
+        partition key mode is enabled. Running it again replaces the entities copied before.
+
+        Args:
+            collection_name (str): The collection to migrate.
+            drop (bool): Whether to drop the collection once all its entities were copied.
+
+        Returns:
+            int: The number of entities copied.
+        """
+        if not self._partition_key_mode:
+            raise Exception("Set MILVUS_PARTITION_KEY_MODE=true to migrate collections to the shared collections")
+        await self._run_io(self._check_partition_key_support)
+        col = await self._run_io(self._collections.acquire, collection_name)
+        try:
+            embedding_method = self._get_embedding_method(col)
+            shared_name = self._get_physical_collection_name(collection_name, embedding_method)
+            await self.create_collection(collection_name, embedding_method, create_new=True)
+            shared_col = await self._run_io(self._collections.acquire, shared_name)
+            try:
+                copied = await self._copy_to_shared_collection(col, shared_col, collection_name, embedding_method)
+                if drop:
+                    await self._drop_migrated_collection(col, shared_col, collection_name)
+            finally:
+                self._collections.done(shared_name)
+        finally:
+            self._collections.done(collection_name)
+        return copied
+
+    async def _copy_to_shared_collection(
+        self, col: Collection, shared_col: Collection, collection_name: str, embedding_method: str
+    ) -> int:
+        # Copy the entities a batch at a time, with the collection name as their partition key
+        field_names = self._get_field_names(embedding_method)
+        iterator = await self._run_io(
+            col.query_iterator, batch_size=UPSERT_BATCH_SIZE, expr="", output_fields=field_names
+        )
+        copied = 0
+        while True:
+            entities = await self._run_io(iterator.next)
+            if not entities:
+                break
+            rows = [[entity[name] for name in field_names] + [collection_name] for entity in entities]
+            await self._run_io(shared_col.insert, self._get_insert_columns(rows, embedding_method))
+            copied += len(rows)
+        iterator.close()
+        await self._run_io(shared_col.flush)
+        self._print_info("Copied {:d} entities of '{}' to '{}'".format(copied, collection_name, shared_col.name))
+        return copied
+
+    async def _drop_migrated_collection(self, col: Collection, shared_col: Collection, collection_name: str):
+        # Only drop the collection if the shared collection holds all its entities
+        count_expr = self._scope_expr(collection_name, None)
+        res = await self._run_io(
+            shared_col.query, expr=count_expr, output_fields=["count(*)"], consistency_level="Strong"
+        )
+        if res[0]["count(*)"] != col.num_entities:
+            raise Exception("Shared collection '{}' holds {} of the {} entities of '{}', not dropping it".format(
+                shared_col.name, res[0]["count(*)"], col.num_entities, collection_name))
+        await self._run_io(col.release)
+        await self._run_io(col.drop)
+        self._collections.forget(collection_name)
+        self._print_info("Dropped the migrated collection '{}'".format(collection_name))
+
     async def _upsert(self, chunks: Dict[str, List[DocumentChunk]], collection_name: str, mode: str = 'mpnet') -> List[str]:
         """Upsert chunks into the datastore.
 
+        The rows are split into batches bounded by UPSERT_BATCH_SIZE rows and UPSERT_BATCH_BYTES bytes, up to
+        UPSERT_CONCURRENCY batches are inserted at once, and a failed batch is retried on its own. If a batch still
+        fails, the chunks the other batches inserted for its documents are deleted, so no partial document is left,
+        and the upsert raises.
+
         Args:
             chunks (Dict[str, List[DocumentChunk]]): A list of DocumentChunks to insert
 
-        Raises:
-            e: Error in upserting data.
-
         Returns:
             List[str]: The document_id's that were inserted.
         """
-        try:
-            col = self._get_collection(collection_name)
-            # The doc id's to return for the upsert
-            doc_ids: List[str] = []
-            # List to collect all the insert data, skip the "pk" for schema V1
-            offset = 1 if self._schema_ver == "V1" else 0
-            insert_data = [[] for _ in range(len(self._get_schema(embedding_method=mode)) - offset)]
-
-            # Go through each document chunklist and grab the data
-            for doc_id, chunk_list in chunks.items():
-                # Append the doc_id to the list we are returning
-                doc_ids.append(doc_id)
-                # Examine each chunk in the chunklist
-                for chunk in chunk_list:
-                    # Extract data from the chunk
-                    list_of_data = self._get_values(chunk, mode)
-                    # Check if the data is valid
-                    if list_of_data is not None:
-                        # Append each field to the insert_data
-                        for x in range(len(insert_data)):
-                            insert_data[x].append(list_of_data[x])
-            # Slice up our insert data into batches
-            batches = [
-                insert_data[i : i + UPSERT_BATCH_SIZE]
-                for i in range(0, len(insert_data), UPSERT_BATCH_SIZE)
-            ]
-
-            # Attempt to insert each batch into our collection
-            # batch data can work with both V1 and V2 schema
-            for batch in batches:
-                if len(batch[0]) != 0:
+        col = await self._run_io(self._get_collection, self._get_physical_collection_name(collection_name, mode))
+        # In partition key mode, each row also holds the name of its collection
+        partition_key = collection_name if self._partition_key_mode else None
+        # The doc id's to return for the upsert
+        doc_ids: List[str] = []
+        # The rows to insert, their values aligned with the fields
+        rows = []
+
+        # Go through each document chunklist and grab the data
+        for doc_id, chunk_list in chunks.items():
+            # Append the doc_id to the list we are returning
+            doc_ids.append(doc_id)
+            # Examine each chunk in the chunklist
+            for chunk in chunk_list:
+                # Extract data from the chunk
+                list_of_data = self._get_values(chunk, mode, partition_key)
+                # Check if the data is valid
+                if list_of_data is not None:
+                    rows.append(list_of_data)
+
+        batches = self._get_insert_batches(rows)
+        semaphore = asyncio.Semaphore(UPSERT_CONCURRENCY)
+
+        async def _insert_batch(batch: List[List]):
+            async with semaphore:
+                # Build the columns only when the batch is sent, to bound the memory of a large upsert
+                columns = self._get_insert_columns(batch, mode)
+                for attempt in range(UPSERT_RETRIES + 1):
                     try:
-                        self._print_info(f"Upserting batch of size {len(batch[0])}")
-                        col.insert(batch)
-                        self._print_info(f"Upserted batch successfully")
+                        res = await self._run_io(col.insert, columns)
+                        self._record_write(collection_name, res.timestamp)
+                        return
                     except Exception as e:
-                        self._print_err(f"Failed to insert batch records, error: {e}")
-                        raise e
+                        if attempt == UPSERT_RETRIES:
+                            raise e
+                        self._print_err(f"Failed to insert batch of size {len(batch)}, retrying, error: {e}")
+                        await asyncio.sleep(0.5 * 2 ** attempt)
 
-            # This setting perfoms flushes after insert. Small insert == bad to use
-            # self.col.flush()
-            return doc_ids
-        except Exception as e:
-            self._print_err("Failed to insert records, error: {}".format(e))
-            return []
+        self._print_info(f"Upserting {len(rows)} records in {len(batches)} batches")
+        results = await asyncio.gather(*[_insert_batch(batch) for batch in batches], return_exceptions=True)
+
+        # The documents with rows in a batch that failed
+        document_id_index = self._get_field_names(mode).index("document_id")
+        failed_doc_ids = set()
+        for batch, result in zip(batches, results):
+            if isinstance(result, Exception):
+                self._print_err(f"Failed to insert batch records, error: {result}")
+                failed_doc_ids.update(row[document_id_index] for row in batch)
+        if failed_doc_ids:
+            message = "Failed to insert {:d} of the {:d} documents in collection '{}'".format(
+                len(failed_doc_ids), len(doc_ids), collection_name)
+            try:
+                await self._delete_failed_documents(col, collection_name, mode, rows, failed_doc_ids)
+            except Exception as e:
+                raise Exception("{}, and deleting the chunks they inserted failed: {}".format(message, e))
+            raise Exception("{}, the chunks they inserted were deleted".format(message))
+
+        # This setting perfoms flushes after insert. Small insert == bad to use
+        # self.col.flush()
+        return doc_ids
+
+    async def _delete_failed_documents(
+        self, col: Collection, collection_name: str, mode: str, rows: List[List], failed_doc_ids: Set[str]
+    ):
+        """Delete the chunks of the documents an upsert only inserted in part."""
+        field_names = self._get_field_names(mode)
+        if self._partition_key_mode or col.schema.primary_field.name != "id":
+            # The chunk ids are not the primary keys, or are shared between the collections of a shared collection
+            await self.delete(ids=sorted(failed_doc_ids), collection_name=collection_name)
+            return
+        # Delete the chunks by their primary keys, which needs neither a loaded collection nor Milvus 2.3
+        id_index = field_names.index("id")
+        document_id_index = field_names.index("document_id")
+        pks = [row[id_index] for row in rows if row[document_id_index] in failed_doc_ids]
+        for expr in self._get_in_expressions("id", pks):
+            _, timestamp = await self._run_io(self._delete_by_expr, col, expr)
+            self._record_write(collection_name, timestamp)
+
+    def _get_insert_batches(self, rows: List[List]) -> List[List[List]]:
+        """Split the rows into batches of at most UPSERT_BATCH_SIZE rows and about UPSERT_BATCH_BYTES bytes."""
+        batches = []
+        batch = []
+        batch_bytes = 0
+        for row in rows:
+            row_bytes = self._get_row_size(row)
+            if batch and (len(batch) >= UPSERT_BATCH_SIZE or batch_bytes + row_bytes > UPSERT_BATCH_BYTES):
+                batches.append(batch)
+                batch = []
+                batch_bytes = 0
+            batch.append(row)
+            batch_bytes += row_bytes
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def _get_row_size(self, row: List) -> int:
+        # The approximate size of the row in the insert request
+        size = 0
+        for value in row:
+            if isinstance(value, str):
+                size += len(value.encode("utf-8"))
+            elif isinstance(value, list):
+                # Vectors are sent as float32
+                size += 4 * len(value)
+            else:
+                size += 8
+        return size
 
+    def _get_insert_columns(self, batch: List[List], mode: str) -> List:
+        """Convert a batch of rows to the columns of an insert request, the embeddings as a float32 matrix."""
+        columns = [list(column) for column in zip(*batch)]
+        embedding_index = self._get_field_names(mode).index(EMBEDDING_FIELD)
+        columns[embedding_index] = np.asarray(columns[embedding_index], dtype=np.float32)
+        return columns
 
-    def _get_values(self, chunk: DocumentChunk, mode: str) -> List[any] | None:  # type: ignore
+    def _get_field_names(self, mode: str) -> List[str]:
+        # The names of the fields a row holds values for, skipping the hidden auto pk field for schema V1
+        offset = 1 if self._schema_ver == "V1" else 0
+        return [field[0] for field in self._get_schema(embedding_method=mode)[offset:]]
+
+    def _get_values(self, chunk: DocumentChunk, mode: str, partition_key: Optional[str] = None) -> List[any] | None:  # type: ignore
         """Convert the chunk into a list of values to insert whose indexes align with fields.
 
         Args:
             chunk (DocumentChunk): The chunk to convert.
+            partition_key (Optional[str]): The collection name of the chunk, for the rows of a shared collection.
 
         Returns:
             List (any): The values to insert.
         """
-        # Convert DocumentChunk and its sub models to dict
-        values = chunk.dict()
+        # Convert DocumentChunk and its sub models to dict, without copying the embedding
+        values = chunk.dict(exclude={"embedding"})
+        values["embedding"] = chunk.embedding
+        if partition_key is not None:
+            values[PARTITION_KEY_FIELD] = partition_key
         # Unpack the metadata into the same dict
         meta = values.pop("metadata")
         values.update(meta)
@@ -442,7 +1008,7 @@ class MilvusDataStore(DataStore):
         ret = []
         # Grab data responding to each field, excluding the hidden auto pk field for schema V1
         offset = 1 if self._schema_ver == "V1" else 0
-        for key, _, default in self._get_schema(embedding_method=mode)[offset:]:
+        for key, _, default in self._get_schema(embedding_method=mode, shared=partition_key is not None)[offset:]:
             # Grab the data at the key and default to our defaults set in init
             x = values.get(key) or default
             # If one of our required fields is missing, ignore the entire entry
@@ -458,91 +1024,266 @@ class MilvusDataStore(DataStore):
         queries: List[QueryWithEmbedding],
         collection_name: str,
         mode: str = "mpnet",
+        session_token: Optional[str] = None,
     ) -> List[QueryResult]:
         """Query the QueryWithEmbedding against the MilvusDocumentSearch
 
-        Search the embedding and its filter in the collection.
+        Search the embedding and its filter in the collection. Queries with the same filter and top_k are sent
+        together in one multi-vector search request, and the hits are split back per query.
 
         Args:
             queries (List[QueryWithEmbedding]): The list of searches to perform.
+            session_token (Optional[str]): A token from get_session_token, to see the writes made before it.
 
         Returns:
-            List[QueryResult]: Results for each search.
+            List[QueryResult]: Results for each search, in the order of the queries.
         """
-        # Async to perform the query, adapted from pinecone implementation
-        col = self._get_collection(collection_name)
-        async def _single_query(query: QueryWithEmbedding) -> QueryResult:
+        if await self._is_bulk_loading(collection_name):
+            raise Exception("Collection '{}' is bulk loading, it can be queried once it is finished".format(collection_name))
+        # The fields to return, ignoring pk and embedding
+        return_from = 2 if self._schema_ver == "V1" else 1
+        output_fields = [field[0] for field in self._get_schema(embedding_method=mode)[return_from:]]
+
+        # Group the queries that can share a search request by their filter expression and top_k
+        groups: Dict[Tuple[Optional[str], int], List[int]] = {}
+        for i, query in enumerate(queries):
+            # Set the filter to expression that is valid for Milvus
+            filter = self._get_filter(query.filter) if query.filter is not None else None
+            groups.setdefault((self._scope_expr(collection_name, filter or None), query.top_k), []).append(i)
+
+        results: List[Optional[QueryResult]] = [None] * len(queries)
+        consistency = self._get_consistency(session_token)
+        # Searches with a session token are reported as Session, the consistency they give
+        level = "Session" if consistency["consistency_level"] == "Customized" else consistency["consistency_level"]
+        histogram = self._search_latencies.setdefault(collection_name, {}).setdefault(level, LatencyHistogram())
+
+        async def _search_batch(batch: List[int], filter: Optional[str], top_k: int):
             try:
-                filter = None
-                # Set the filter to expression that is valid for Milvus
-                if query.filter is not None:
-                    # Either a valid filter or None will be returned
-                    filter = self._get_filter(query.filter)
-
-                # Perform our search
-                return_from = 2 if self._schema_ver == "V1" else 1
-                res = col.search(
-                    data=[query.embedding],
+                start = time.perf_counter()
+                res = await self._run_io(
+                    col.search,
+                    data=[queries[i].embedding for i in batch],
                     anns_field=EMBEDDING_FIELD,
                     param=self.search_params,
-                    limit=query.top_k,
+                    limit=top_k,
                     expr=filter,
-                    output_fields=[
-                        field[0] for field in self._get_schema(embedding_method=mode)[return_from:]
-                    ],  # Ignoring pk, embedding
+                    output_fields=output_fields,
+                    **consistency,
                 )
-                # Results that will hold our DocumentChunkWithScores
-                results = []
-                # Parse every result for our search
-                for hit in res[0]:  # type: ignore
-                    # The distance score for the search result, falls under DocumentChunkWithScore
-                    score = hit.score
-                    # Our metadata info, falls under DocumentChunkMetadata
-                    metadata = {}
-                    # Grab the values that correspond to our fields, ignore pk and embedding.
-                    for x in [field[0] for field in self._get_schema(embedding_method=mode)[return_from:]]:
-                        metadata[x] = hit.entity.get(x)
-                    # If the source isn't valid, convert to None
-                    if metadata["source"] not in Source.__members__:
-                        metadata["source"] = None
-                    # Text falls under the DocumentChunk
-                    text = metadata.pop("text")
-                    # Id falls under the DocumentChunk
-                    ids = metadata.pop("id")
-                    chunk = DocumentChunkWithScore(
-                        id=ids,
-                        score=score,
-                        text=text,
-                        metadata=DocumentChunkMetadata(**metadata),
+                histogram.observe(time.perf_counter() - start)
+                # The hits of each search vector, in the order of the data
+                for i, hits in zip(batch, res):  # type: ignore
+                    results[i] = QueryResult(
+                        query=queries[i].query,
+                        results=[self._get_chunk(hit, output_fields) for hit in hits],
                     )
-                    results.append(chunk)
-
-                # TODO: decide on doing queries to grab the embedding itself, slows down performance as double query occurs
-
-                return QueryResult(query=query.query, results=results)
             except Exception as e:
                 self._print_err("Failed to query, error: {}".format(e))
-                return QueryResult(query=query.query, results=[])
+                raise e
+
+        # The search requests run concurrently in the I/O thread pool, the collection stays loaded until they are done
+        physical_name = self._get_physical_collection_name(collection_name, mode)
+        col = await self._run_io(self._collections.acquire, physical_name)
+        try:
+            await asyncio.gather(
+                *[
+                    _search_batch(indexes[start : start + SEARCH_BATCH_SIZE], filter, top_k)
+                    for (filter, top_k), indexes in groups.items()
+                    for start in range(0, len(indexes), SEARCH_BATCH_SIZE)
+                ]
+            )
+        finally:
+            self._collections.done(physical_name)
+
+        # TODO: decide on doing queries to grab the embedding itself, slows down performance as double query occurs
+
+        return results  # type: ignore
+
+    def _get_chunk(self, hit, output_fields: List[str]) -> DocumentChunkWithScore:
+        """Convert a search hit into a DocumentChunkWithScore.
 
-        results: List[QueryResult] = await asyncio.gather(
-            *[_single_query(query) for query in queries]
+        Args:
+            hit (Hit): The search hit, with the output fields as entity.
+            output_fields (List[str]): The fields returned with the hit.
+
+        Returns:
+            DocumentChunkWithScore: The chunk, scored by the similarity of the hit.
+        """
+        # Our metadata info, falls under DocumentChunkMetadata
+        metadata = {}
+        # Grab the values that correspond to our fields, ignore pk and embedding.
+        for x in output_fields:
+            metadata[x] = hit.entity.get(x)
+        # If the source isn't valid, convert to None
+        if metadata["source"] not in Source.__members__:
+            metadata["source"] = None
+        # Text falls under the DocumentChunk
+        text = metadata.pop("text")
+        # Id falls under the DocumentChunk
+        ids = metadata.pop("id")
+        # The L2 metric returns a distance, turned into a similarity so higher is better like the other providers
+        score = 1 - hit.score if self.search_params["metric_type"] == "L2" else hit.score
+        return DocumentChunkWithScore(
+            id=ids,
+            score=score,
+            text=text,
+            metadata=DocumentChunkMetadata(**metadata),
         )
-        return results
-    
-    async def create_collection(self, collection_name: str, embedding_method: str, create_new: bool = False) -> None:
-        collection_response = self._create_collection(collection_name, embedding_method, create_new=create_new)
-        index_response = self._create_index(collection_name)
+
+    async def create_collection(
+        self,
+        collection_name: str,
+        embedding_method: str,
+        create_new: bool = False,
+        bulk_load: bool = False,
+        index_params: Optional[Dict] = None,
+    ) -> None:
+        if bulk_load:
+            return await self._create_bulk_load_collection(collection_name, embedding_method, create_new, index_params)
+        if self._partition_key_mode:
+            # The collection is a partition key value of the shared collection, which is created once
+            # and keeps its own index params
+            shared_name = self._get_physical_collection_name(collection_name, embedding_method)
+            await self._run_io(self._check_partition_key_support)
+            collection_response = await self._run_io(self._create_collection, shared_name, embedding_method, shared=True)
+            index_response = await self._run_io(self._create_index, shared_name)
+            if create_new:
+                await self.delete(delete_all=True, collection_name=collection_name)
+            return collection_response == True and index_response == True
+        collection_response = await self._run_io(self._create_collection, collection_name, embedding_method, create_new=create_new)
+        index_response = await self._run_io(self._create_index, collection_name, index_params)
         return collection_response == True and index_response == True
     
     
+    async def _create_bulk_load_collection(
+        self, collection_name: str, embedding_method: str, create_new: bool, index_params: Optional[Dict] = None
+    ) -> bool:
+        """Create a collection without its indexes, for a large initial load.
+
+        The rows are inserted without any index to maintain, and the indexes are built once by finish_bulk_load.
+        Until then the collection can not be queried, and deletes, including those of upserts of documents with an id, are
+        rejected.
+        """
+        if self._partition_key_mode:
+            raise Exception("Bulk loads are not supported in partition key mode, the shared collections are indexed")
+        collection_response = await self._run_io(self._create_collection, collection_name, embedding_method, create_new=create_new)
+        if collection_response != True:
+            return False
+        col = await self._run_io(self._get_collection, collection_name)
+        if await self._run_io(self._get_vector_index_name, col) is not None:
+            self._print_err("Milvus collection '{}' is already indexed, not bulk loading it".format(collection_name))
+            return False
+        # A collection of the same name may have been dropped and created again without its indexes
+        self._indexed.discard(collection_name)
+        self._bulk_loads[collection_name] = {"state": "ingesting", "error": None, "index_params": index_params}
+        self._print_info("Bulk loading Milvus collection '{}', its indexes are built once it is finished".format(collection_name))
+        return True
+
+    async def finish_bulk_load(self, collection_name: str) -> Dict:
+        """Flush a bulk loaded collection, then build its indexes and load it, in the background.
+
+        Args:
+            collection_name (str): The collection to finish.
+
+        Returns:
+            Dict: The bulk load status of the collection, see get_bulk_load_status.
+        """
+        status = await self.get_bulk_load_status(collection_name)
+        if status["state"] in ("ingesting", "failed"):
+            index_params = self._bulk_loads.get(collection_name, {}).get("index_params")
+            self._bulk_loads[collection_name] = {"state": "flushing", "error": None, "index_params": index_params}
+            # Keep a reference to the task so it is not garbage collected while it runs
+            self._bulk_loads[collection_name]["task"] = asyncio.create_task(self._finish_bulk_load(collection_name))
+            status = await self.get_bulk_load_status(collection_name)
+        return status
+
+    async def _finish_bulk_load(self, collection_name: str):
+        bulk_load = self._bulk_loads[collection_name]
+        try:
+            col = await self._run_io(self._get_collection, collection_name)
+            start = time.monotonic()
+            await self._run_io(col.flush)
+            bulk_load["state"] = "indexing"
+            # create_index waits for the index to be built over all the flushed segments
+            if await self._run_io(self._create_index, collection_name, bulk_load.get("index_params")) != True:
+                raise Exception("Failed to create the indexes")
+            bulk_load["state"] = "loading"
+            await self._run_io(self._collections.acquire, collection_name)
+            self._collections.done(collection_name)
+            self._print_info("Finished bulk load of Milvus collection '{}' in {:.2f}s"
+                             .format(collection_name, time.monotonic() - start))
+            # The collection is like any other one from now on
+            self._bulk_loads.pop(collection_name, None)
+        except Exception as e:
+            self._print_err("Failed to finish bulk load of collection '{}', error: {}".format(collection_name, e))
+            bulk_load["state"] = "failed"
+            bulk_load["error"] = str(e)
+
+    async def get_bulk_load_status(self, collection_name: str) -> Dict:
+        """Return the progress of the bulk load of a collection.
+
+        Args:
+            collection_name (str): The collection to report.
+
+        Returns:
+            Dict: The state, one of "ingesting", "flushing", "indexing", "loading", "failed" or "ready", the rows of
+                the collection, the rows indexed so far, and the error of a failed bulk load.
+        """
+        col = await self._run_io(self._get_collection, collection_name)
+        await self._is_bulk_loading(collection_name)
+        bulk_load = self._bulk_loads.get(collection_name)
+        index_name = await self._run_io(self._get_vector_index_name, col)
+        state = bulk_load["state"] if bulk_load is not None else "ready"
+        status = {"state": state, "total_rows": col.num_entities, "indexed_rows": 0, "error": None}
+        if bulk_load is not None:
+            status["error"] = bulk_load["error"]
+        if index_name is not None:
+            progress = await self._run_io(
+                utility.index_building_progress, collection_name, index_name=index_name, using=self.alias
+            )
+            status["total_rows"] = progress["total_rows"]
+            status["indexed_rows"] = progress["indexed_rows"]
+        return status
+
+    def _get_vector_index_name(self, col: Collection) -> Optional[str]:
+        # The vector index is named after its field, but collections indexed before that have the default name
+        for index in col.indexes:
+            if index.field_name == EMBEDDING_FIELD:
+                return index.index_name
+        return None
+
+    async def _is_bulk_loading(self, collection_name: str) -> bool:
+        """Return whether a collection is bulk loading, that is it has no vector index yet.
+
+        The state is kept in memory, but a collection created for a bulk load before the server restarted is found
+        from its missing vector index, and tracked again.
+        """
+        if self._partition_key_mode or collection_name in self._indexed:
+            return False
+        if collection_name in self._bulk_loads:
+            return True
+        col = await self._run_io(self._get_collection, collection_name)
+        if await self._run_io(self._get_vector_index_name, col) is not None:
+            self._indexed.add(collection_name)
+            return False
+        self._bulk_loads[collection_name] = {"state": "ingesting", "error": None}
+        return True
+
     async def delete_collection(self, collection_name: str) -> None:
+        if self._partition_key_mode:
+            # Delete the entities of the collection, the shared collection stays
+            return await self.delete(delete_all=True, collection_name=collection_name)
         try:
-            col = self._get_collection(collection_name)
+            col = await self._run_io(self._get_collection, collection_name)
             self._print_info("Delete the entire collection {}".format(col.name))
             # Release the collection from memory
-            col.release()
+            await self._run_io(col.release)
             # Drop the collection
-            col.drop()
+            await self._run_io(col.drop)
+            self._collections.forget(collection_name)
+            self._bulk_loads.pop(collection_name, None)
+            self._indexed.discard(collection_name)
+            self._search_latencies.pop(collection_name, None)
             return True
         except Exception as e:
             self._print_err("Failed to delete collection, error: {}".format(e))
@@ -561,85 +1302,161 @@ class MilvusDataStore(DataStore):
         Args:
             ids (Optional[List[str]], optional): The document_ids to delete. Defaults to None.
             filter (Optional[DocumentMetadataFilter], optional): The filter to delete by. Defaults to None.
-            delete_all (Optional[bool], optional): Whether to drop the collection and recreate it. Defaults to None.
+            delete_all (Optional[bool], optional): Whether to drop the collection and recreate it, or to delete all
+                its entities in partition key mode. Defaults to None.
         """
+        if not delete_all and await self._is_bulk_loading(collection_name):
+            # A collection without its indexes can not be loaded to find the entities to delete, and skipping the
+            # delete would leave the earlier chunks of upserted documents next to their new ones
+            raise Exception("Collection '{}' is bulk loading, its entities can be deleted once it is finished"
+                            .format(collection_name))
+        if self._partition_key_mode:
+            # The collection may live in any of the shared collections, delete its entities from them
+            physical_names = await self._run_io(self._get_shared_collection_names)
         # If deleting all, drop and create the new collection
-        col = self._get_collection(collection_name)
-        if delete_all:
+        elif delete_all:
+            col = await self._run_io(self._get_collection, collection_name)
             coll_name = col.name
+            embedding_method = self._get_embedding_method(col)
             self._print_info("Delete the entire collection {} and create new one".format(coll_name))
             # Release the collection from memory
-            col.release()
+            await self._run_io(col.release)
             # Drop the collection
-            col.drop()
+            await self._run_io(col.drop)
+            self._collections.forget(coll_name)
+            self._bulk_loads.pop(coll_name, None)
+            self._indexed.discard(coll_name)
             # Recreate the new collection
-            self._create_collection(coll_name, True)
-            self._create_index()
+            await self._run_io(self._create_collection, coll_name, embedding_method, True)
+            await self._run_io(self._create_index, coll_name)
             return True
+        else:
+            physical_names = [collection_name]
+
+        exprs = []
+        if delete_all:
+            # Only in partition key mode, all the entities of the collection
+            exprs.append(self._scope_expr(collection_name, None))
+        # Delete the chunks of the documents directly by their document_id, batch by batch to keep each
+        # expression short
+        if (ids is not None) and len(ids) > 0:
+            id_exprs = self._get_in_expressions("document_id", ids)
+            self._print_info("Delete {:d} documents in {:d} batches".format(len(ids), len(id_exprs)))
+            exprs.extend(self._scope_expr(collection_name, expr) for expr in id_exprs)
+        # Convert filter to milvus expression, and delete the entries that match it if there is anything to filter
+        if filter is not None:
+            filter_expr = self._get_filter(filter)
+            if filter_expr:
+                exprs.append(self._scope_expr(collection_name, filter_expr))
+
+        # Milvus only deletes by an expression on other fields than the primary key from 2.3 on
+        deletes_by_expr = await self._run_io(self._get_server_version) >= (2, 3)
+        delete_fn = self._delete_by_expr if deletes_by_expr else self._delete_by_pks
 
         # Keep track of how many we have deleted for later printing
         delete_count = 0
-        batch_size = 100
-        pk_name = "pk" if self._schema_ver == "V1" else "id"
-        try:
-            # According to the api design, the ids is a list of document_id,
-            # document_id is not primary key, use query+delete to workaround,
-            # in future version we can delete by expression
-            if (ids is not None) and len(ids) > 0:
-                # Add quotation marks around the string format id
-                ids = ['"' + str(id) + '"' for id in ids]
-                # Query for the pk's of entries that match id's
-                ids = col.query(f"document_id in [{','.join(ids)}]")
-                # Convert to list of pks
-                pks = [str(entry[pk_name]) for entry in ids]  # type: ignore
-                # for schema V2, the "id" is varchar, rewrite the expression
-                if self._schema_ver != "V1":
-                    pks = ['"' + pk + '"' for pk in pks]
-
-                # Delete by ids batch by batch(avoid too long expression)
-                self._print_info("Apply {:d} deletions to schema {:s}".format(len(pks), self._schema_ver))
-                while len(pks) > 0:
-                    batch_pks = pks[:batch_size]
-                    pks = pks[batch_size:]
-                    # Delete the entries batch by batch
-                    res = col.delete(f"{pk_name} in [{','.join(batch_pks)}]")
+        failed = 0
+        for physical_name in physical_names:
+            col = await self._run_io(self._collections.acquire, physical_name)
+            try:
+                results = await asyncio.gather(
+                    *[self._run_io(delete_fn, col, expr) for expr in exprs], return_exceptions=True
+                )
+            finally:
+                self._collections.done(physical_name)
+            for res in results:
+                if isinstance(res, Exception):
+                    self._print_err("Failed to delete, error: {}".format(res))
+                    failed += 1
+                else:
                     # Increment our deleted count
-                    delete_count += int(res.delete_count)  # type: ignore
-        except Exception as e:
-            self._print_err("Failed to delete by ids, error: {}".format(e))
-
-        try:
-            # Check if empty filter
-            if filter is not None:
-                # Convert filter to milvus expression
-                filter = self._get_filter(filter)  # type: ignore
-                # Check if there is anything to filter
-                if len(filter) != 0:  # type: ignore
-                    # Query for the pk's of entries that match filter
-                    res = col.query(filter)  # type: ignore
-                    # Convert to list of pks
-                    pks = [str(entry[pk_name]) for entry in res]  # type: ignore
-                    # for schema V2, the "id" is varchar, rewrite the expression
-                    if self._schema_ver != "V1":
-                        pks = ['"' + pk + '"' for pk in pks]
-                    # Check to see if there are valid pk's to delete, delete batch by batch(avoid too long expression)
-                    while len(pks) > 0:  # type: ignore
-                        batch_pks = pks[:batch_size]
-                        pks = pks[batch_size:]
-                        # Delete the entries batch by batch
-                        res = col.delete(f"{pk_name} in [{','.join(batch_pks)}]")  # type: ignore
-                        # Increment our delete count
-                        delete_count += int(res.delete_count)  # type: ignore
-        except Exception as e:
-            self._print_err("Failed to delete by filter, error: {}".format(e))
+                    count, timestamp = res  # type: ignore
+                    delete_count += count
+                    self._record_write(collection_name, timestamp)
 
         self._print_info("{:d} records deleted".format(delete_count))
+        if failed:
+            # The entities left behind would be duplicated by the upsert that deletes them
+            raise Exception("Failed {:d} of the {:d} deletes in collection '{}'".format(
+                failed, len(exprs) * len(physical_names), collection_name))
 
         # This setting performs flushes after delete. Small delete == bad to use
         # self.col.flush()
 
         return True
 
+    def _get_server_version(self) -> Tuple[int, int]:
+        # The major and minor version of the server, (0, 0) if it is unknown so only the oldest features are used
+        if self._server_version is None:
+            try:
+                version = utility.get_server_version(using=self.alias)
+                self._server_version = tuple(int(number) for number in re.findall(r"\d+", version)[:2])  # type: ignore
+                self._print_info("Milvus server version {}".format(version))
+            except Exception as e:
+                self._print_err("Failed to get the Milvus server version, error: {}".format(e))
+                return (0, 0)
+        return self._server_version  # type: ignore
+
+    def _check_partition_key_support(self):
+        # Partition keys, query iterators and count(*) queries need Milvus 2.3
+        version = self._get_server_version()
+        if version < (2, 3):
+            raise Exception("Partition key mode needs Milvus 2.3 or above, the server is {}".format(
+                ".".join(str(number) for number in version) if version != (0, 0) else "of an unknown version"))
+
+    def _delete_by_expr(self, col: Collection, expr: str) -> Tuple[int, int]:
+        """Delete the entities matching an expression in one request.
+
+        Returns:
+            Tuple[int, int]: The number of entities deleted and the timestamp of the delete.
+        """
+        res = col.delete(expr)
+        return int(res.delete_count), res.timestamp
+
+    def _delete_by_pks(self, col: Collection, expr: str) -> Tuple[int, int]:
+        """Delete the entities matching an expression by their primary keys, for servers before Milvus 2.3.
+
+        Returns:
+            Tuple[int, int]: The number of entities deleted and the timestamp of the last delete.
+        """
+        pk_name = col.schema.primary_field.name
+        # Query for the pks of the entities that match the expression
+        pks = [entry[pk_name] for entry in col.query(expr, output_fields=[pk_name])]
+        delete_count = 0
+        timestamp = 0
+        # Delete by pks batch by batch, to keep each expression short
+        for pk_expr in self._get_in_expressions(pk_name, pks):
+            res = col.delete(pk_expr)
+            delete_count += int(res.delete_count)
+            timestamp = res.timestamp
+        return delete_count, timestamp
+
+    def _get_in_expressions(self, field: str, values: List) -> List[str]:
+        """Build the `field in [...]` expressions matching the values, each at most DELETE_EXPR_MAX_LENGTH long.
+
+        Args:
+            field (str): The field to match.
+            values (List): The string or integer values to match.
+
+        Returns:
+            List[str]: The expressions, which together match all the values.
+        """
+        exprs = []
+        batch: List[str] = []
+        length = 0
+        for value in values:
+            # Quote and escape a string value as a string literal
+            literal = json.dumps(value)
+            if batch and length + len(literal) + 1 > DELETE_EXPR_MAX_LENGTH:
+                exprs.append(f"{field} in [{','.join(batch)}]")
+                batch = []
+                length = 0
+            batch.append(literal)
+            length += len(literal) + 1
+        if batch:
+            exprs.append(f"{field} in [{','.join(batch)}]")
+        return exprs
+
     def _get_filter(self, filter: DocumentMetadataFilter) -> Optional[str]:
         """Converts a DocumentMetdataFilter to the expression that Milvus takes.
 
@@ -3,8 +3,9 @@ from typing import Any, Dict, List, Optional
 import pinecone
 from tenacity import retry, wait_random_exponential, stop_after_attempt
 import asyncio
+import random
 
-from datastore.datastore import DataStore
+from datastore.datastore import DataStore, DATASTORE_IO_WORKERS
 from models.models import (
     DocumentChunk,
     DocumentChunkMetadata,
@@ -28,10 +29,22 @@ assert PINECONE_INDEX is not None
 pinecone.init(api_key=PINECONE_API_KEY, environment=PINECONE_ENVIRONMENT)
 
 # Set the batch size for upserting vectors to Pinecone
-UPSERT_BATCH_SIZE = 100
+UPSERT_BATCH_SIZE = int(os.environ.get("PINECONE_UPSERT_BATCH_SIZE", 100))
+# The number of upsert requests in flight at once
+UPSERT_CONCURRENCY = int(os.environ.get("PINECONE_UPSERT_CONCURRENCY", 4))
+# The number of times a failed upsert request is retried before its documents are given up on
+UPSERT_RETRIES = int(os.environ.get("PINECONE_UPSERT_RETRIES", 3))
+# The most vector ids Pinecone deletes in one request
+DELETE_IDS_BATCH_SIZE = 1000
+# The dimension of the index, the OpenAI ada v2 embeddings
+PINECONE_DIMENSION = 1536
+# The number of threads running the blocking Pinecone client calls
+PINECONE_IO_WORKERS = int(os.environ.get("PINECONE_IO_WORKERS", DATASTORE_IO_WORKERS))
 
 
 class PineconeDataStore(DataStore):
+    io_workers = PINECONE_IO_WORKERS
+
     def __init__(self):
         # Check if the index name is specified and exists in Pinecone
         if PINECONE_INDEX and PINECONE_INDEX not in pinecone.list_indexes():
@@ -46,7 +59,7 @@ class PineconeDataStore(DataStore):
                 )
                 pinecone.create_index(
                     PINECONE_INDEX,
-                    dimension=1536,  # dimensionality of OpenAI ada v2 embeddings
+                    dimension=PINECONE_DIMENSION,  # dimensionality of OpenAI ada v2 embeddings
                     metadata_config={"indexed": fields_to_index},
                 )
                 self.index = pinecone.Index(PINECONE_INDEX)
@@ -64,11 +77,44 @@ class PineconeDataStore(DataStore):
                 print(f"Error connecting to index {PINECONE_INDEX}: {e}")
                 raise e
 
-    @retry(wait=wait_random_exponential(min=1, max=20), stop=stop_after_attempt(3))
-    async def _upsert(self, chunks: Dict[str, List[DocumentChunk]]) -> List[str]:
+    async def create_collection(
+        self,
+        collection_name: str,
+        embedding_method: str,
+        create_new: bool = False,
+        bulk_load: bool = False,
+        index_params: Optional[Dict[str, Any]] = None,
+    ) -> bool:
+        """
+        Each collection is a namespace of the index, which Pinecone creates on its first upsert.
+        """
+        if embedding_method != "openai":
+            print(
+                f"Error creating collection {collection_name}: the index stores {PINECONE_DIMENSION}-dim "
+                f"openai embeddings, not {embedding_method} ones"
+            )
+            return False
+        if create_new:
+            await self.delete_collection(collection_name)
+        return True
+
+    async def delete_collection(self, collection_name: str) -> bool:
+        try:
+            await self._run_io(self.index.delete, delete_all=True, namespace=collection_name)
+            return True
+        except Exception as e:
+            print(f"Error deleting collection {collection_name}: {e}")
+            return False
+
+    async def _upsert(self, chunks: Dict[str, List[DocumentChunk]], collection_name=None, mode='openai') -> List[str]:
         """
         Takes in a dict from document id to list of document chunks and inserts them into the index.
         Return a list of document ids.
+
+        The vectors are upserted into the namespace of the collection in batches of UPSERT_BATCH_SIZE, with up to
+        UPSERT_CONCURRENCY batches in flight at once, and a failed batch is retried on its own. If a batch still fails,
+        the vectors of its documents are deleted from the namespace, so no partial document is left, and the upsert
+        raises.
         """
         # Initialize a list of ids to return
         doc_ids: List[str] = []
@@ -78,7 +124,6 @@ class PineconeDataStore(DataStore):
         for doc_id, chunk_list in chunks.items():
             # Append the id to the ids list
             doc_ids.append(doc_id)
-            print(f"Upserting document_id: {doc_id}")
             for chunk in chunk_list:
                 # Create a vector tuple of (id, embedding, metadata)
                 # Convert the metadata object to a dict with unix timestamps for dates
@@ -94,15 +139,41 @@ class PineconeDataStore(DataStore):
             vectors[i : i + UPSERT_BATCH_SIZE]
             for i in range(0, len(vectors), UPSERT_BATCH_SIZE)
         ]
-        # Upsert each batch to Pinecone
-        for batch in batches:
+        semaphore = asyncio.Semaphore(UPSERT_CONCURRENCY)
+
+        async def _upsert_batch(batch: List):
+            async with semaphore:
+                for attempt in range(UPSERT_RETRIES + 1):
+                    try:
+                        await self._run_io(self.index.upsert, vectors=batch, namespace=collection_name)
+                        return
+                    except Exception as e:
+                        if attempt == UPSERT_RETRIES:
+                            raise e
+                        print(f"Error upserting batch of size {len(batch)}, retrying: {e}")
+                        await asyncio.sleep(random.uniform(0.5, 1) * 2**attempt)
+
+        print(f"Upserting {len(vectors)} vectors in {len(batches)} batches")
+        results = await asyncio.gather(*[_upsert_batch(batch) for batch in batches], return_exceptions=True)
+
+        # The documents with vectors in a batch that failed
+        failed_doc_ids = set()
+        for batch, result in zip(batches, results):
+            if isinstance(result, Exception):
+                print(f"Error upserting batch: {result}")
+                failed_doc_ids.update(metadata["document_id"] for _, _, metadata in batch)
+        if failed_doc_ids:
+            message = f"Failed to upsert {len(failed_doc_ids)} of {len(doc_ids)} documents"
+            # Delete the vectors the other batches upserted for these documents, by their ids
+            failed_ids = [id for id, _, metadata in vectors if metadata["document_id"] in failed_doc_ids]
             try:
-                print(f"Upserting batch of size {len(batch)}")
-                self.index.upsert(vectors=batch)
-                print(f"Upserted batch successfully")
+                for i in range(0, len(failed_ids), DELETE_IDS_BATCH_SIZE):
+                    await self._run_io(
+                        self.index.delete, ids=failed_ids[i : i + DELETE_IDS_BATCH_SIZE], namespace=collection_name
+                    )
             except Exception as e:
-                print(f"Error upserting batch: {e}")
-                raise e
+                raise Exception(f"{message}, and deleting the vectors they upserted failed: {e}")
+            raise Exception(f"{message}, the vectors they upserted were deleted")
 
         return doc_ids
 
@@ -110,9 +181,14 @@ class PineconeDataStore(DataStore):
     async def _query(
         self,
         queries: List[QueryWithEmbedding],
+        collection_name=None,
+        mode='openai',
+        session_token: Optional[str] = None,
     ) -> List[QueryResult]:
         """
         Takes in a list of queries with embeddings and filters and returns a list of query results with matching document chunks and scores.
+
+        The queries run concurrently in the I/O thread pool, against the namespace of the collection.
         """
 
         # Define a helper coroutine that performs a single query and returns a QueryResult
@@ -124,8 +200,9 @@ class PineconeDataStore(DataStore):
 
             try:
                 # Query the index with the query embedding, filter, and top_k
-                query_response = self.index.query(
-                    # namespace=namespace,
+                query_response = await self._run_io(
+                    self.index.query,
+                    namespace=collection_name,
                     top_k=query.top_k,
                     vector=query.embedding,
                     filter=pinecone_filter,
@@ -177,15 +254,16 @@ class PineconeDataStore(DataStore):
         ids: Optional[List[str]] = None,
         filter: Optional[DocumentMetadataFilter] = None,
         delete_all: Optional[bool] = None,
+        collection_name: Optional[str] = None,
     ) -> bool:
         """
-        Removes vectors by ids, filter, or everything from the index.
+        Removes vectors by ids, filter, or everything from the namespace of the collection.
         """
         # Delete all vectors from the index if delete_all is True
         if delete_all:
             try:
                 print(f"Deleting all vectors from index")
-                self.index.delete(delete_all=True)
+                await self._run_io(self.index.delete, delete_all=True, namespace=collection_name)
                 print(f"Deleted all vectors successfully")
                 return True
             except Exception as e:
@@ -198,7 +276,7 @@ class PineconeDataStore(DataStore):
         if pinecone_filter != {}:
             try:
                 print(f"Deleting vectors with filter {pinecone_filter}")
-                self.index.delete(filter=pinecone_filter)
+                await self._run_io(self.index.delete, filter=pinecone_filter, namespace=collection_name)
                 print(f"Deleted vectors with filter successfully")
             except Exception as e:
                 print(f"Error deleting vectors with filter: {e}")
@@ -209,7 +287,7 @@ class PineconeDataStore(DataStore):
             try:
                 print(f"Deleting vectors with ids {ids}")
                 pinecone_filter = {"document_id": {"$in": ids}}
-                self.index.delete(filter=pinecone_filter)  # type: ignore
+                await self._run_io(self.index.delete, filter=pinecone_filter, namespace=collection_name)  # type: ignore
                 print(f"Deleted vectors with ids successfully")
             except Exception as e:
                 print(f"Error deleting vectors with ids: {e}")
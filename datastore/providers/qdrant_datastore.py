@@ -1,18 +1,23 @@
+import asyncio
 import os
 import uuid
-from typing import Dict, List, Optional
+from typing import Any, Dict, List, Optional
 
+import numpy as np
 from grpc._channel import _InactiveRpcError
+from qdrant_client import grpc
+from qdrant_client.conversions.conversion import RestToGrpc
 from qdrant_client.http.exceptions import UnexpectedResponse
 from qdrant_client.http.models import PayloadSchemaType
 
-from datastore.datastore import DataStore
+from datastore.datastore import DataStore, DATASTORE_IO_WORKERS
 from models.models import (
     DocumentChunk,
     DocumentMetadataFilter,
     QueryResult,
     QueryWithEmbedding,
     DocumentChunkWithScore,
+    Source,
 )
 from qdrant_client.http import models as rest
 
@@ -25,10 +30,68 @@ QDRANT_PORT = os.environ.get("QDRANT_PORT", "6333")
 QDRANT_GRPC_PORT = os.environ.get("QDRANT_GRPC_PORT", "6334")
 QDRANT_API_KEY = os.environ.get("QDRANT_API_KEY")
 QDRANT_COLLECTION = os.environ.get("QDRANT_COLLECTION", "document_chunks")
+# Whether the clients talk gRPC, with the points built as gRPC messages, or REST, where gRPC is not reachable
+QDRANT_PREFER_GRPC = os.environ.get("QDRANT_PREFER_GRPC", "true").lower() == "true"
+# The number of threads running the blocking Qdrant client calls
+QDRANT_IO_WORKERS = int(os.environ.get("QDRANT_IO_WORKERS", DATASTORE_IO_WORKERS))
+# The most points, and the approximate most bytes, sent in one upsert request
+QDRANT_UPSERT_BATCH_SIZE = int(os.environ.get("QDRANT_UPSERT_BATCH_SIZE", 256))
+QDRANT_UPSERT_BATCH_BYTES = int(os.environ.get("QDRANT_UPSERT_BATCH_BYTES", 8 * 1024 * 1024))
+# The number of upsert requests in flight at once
+QDRANT_UPSERT_CONCURRENCY = int(os.environ.get("QDRANT_UPSERT_CONCURRENCY", 4))
+# Whether an upsert returns only once its points are applied and searchable
+QDRANT_UPSERT_WAIT = os.environ.get("QDRANT_UPSERT_WAIT", "true").lower() == "true"
+# The performance profile of the collections, one of QDRANT_PROFILES
+QDRANT_PROFILE = os.environ.get("QDRANT_PROFILE", "default")
+# The HNSW parameters of the collections, the Qdrant defaults if not set
+QDRANT_HNSW_M = os.environ.get("QDRANT_HNSW_M")
+QDRANT_HNSW_EF_CONSTRUCT = os.environ.get("QDRANT_HNSW_EF_CONSTRUCT")
+# The default search parameters, a query can override them with its search_params
+QDRANT_SEARCH_HNSW_EF = os.environ.get("QDRANT_SEARCH_HNSW_EF")
+QDRANT_SEARCH_OVERSAMPLING = os.environ.get("QDRANT_SEARCH_OVERSAMPLING")
+QDRANT_SEARCH_RESCORE = os.environ.get("QDRANT_SEARCH_RESCORE", "true").lower() == "true"
+
+# The vector storage of each profile
+QDRANT_PROFILES = {
+    # float32 vectors in RAM
+    "default": {"on_disk": False, "quantization": None},
+    # int8 vectors in RAM and the float32 vectors on disk, for rescoring, about 4x less RAM
+    "scalar": {"on_disk": True, "quantization": "scalar"},
+    # product quantized vectors in RAM and the float32 vectors on disk, up to 16x less RAM at some recall cost
+    "product": {"on_disk": True, "quantization": "product"},
+}
+
+# The vector size of each embedding method
+VECTOR_SIZES = {"openai": 1536, "mpnet": 768}
+
+# The top-level payload key of the unix timestamp the date range filters match on
+CREATED_AT_KEY = "created_at"
+
+
+def _get_filter_keys() -> Dict[str, str]:
+    """Map each equality field of DocumentMetadataFilter to the payload key it matches on."""
+    return {
+        field: f"metadata.{field}"
+        for field in DocumentMetadataFilter.__fields__
+        if field not in ("start_date", "end_date")
+    }
+
+
+def _get_payload_indexes() -> Dict[str, PayloadSchemaType]:
+    """Derive the payload indexes from the fields of DocumentMetadataFilter, one per payload key filters match on."""
+    indexes = {key: PayloadSchemaType.KEYWORD for key in _get_filter_keys().values()}
+    indexes[CREATED_AT_KEY] = PayloadSchemaType.INTEGER
+    return indexes
+
+
+# The payload key of each filter field, and the index of each of these keys
+FILTER_KEYS = _get_filter_keys()
+PAYLOAD_INDEXES = _get_payload_indexes()
 
 
 class QdrantDataStore(DataStore):
     UUID_NAMESPACE = uuid.UUID("3896d314-1e95-4a3a-b45a-945f9f0b541d")
+    io_workers = QDRANT_IO_WORKERS
 
     def __init__(
         self,
@@ -36,6 +99,7 @@ class QdrantDataStore(DataStore):
         vector_size: int = 1536,
         distance: str = "Cosine",
         recreate_collection: bool = False,
+        profile: Optional[str] = None,
     ):
         """
         Args:
@@ -44,49 +108,193 @@ class QdrantDataStore(DataStore):
             distance:
                 Any of "Cosine" / "Euclid" / "Dot". Distance function to measure
                 similarity
+            profile:
+                Any of QDRANT_PROFILES, how the vectors of a new collection are
+                stored. Defaults to QDRANT_PROFILE
         """
         self.client = qdrant_client.QdrantClient(
             url=QDRANT_URL,
             port=int(QDRANT_PORT),
             grpc_port=int(QDRANT_GRPC_PORT),
             api_key=QDRANT_API_KEY,
-            prefer_grpc=True,
+            prefer_grpc=QDRANT_PREFER_GRPC,
             timeout=10,
         )
+        # The writes go through the async client, so batches are in flight without holding I/O threads
+        self.async_client = qdrant_client.AsyncQdrantClient(
+            url=QDRANT_URL,
+            port=int(QDRANT_PORT),
+            grpc_port=int(QDRANT_GRPC_PORT),
+            api_key=QDRANT_API_KEY,
+            prefer_grpc=QDRANT_PREFER_GRPC,
+            timeout=10,
+        )
+        # Whether the points are built as gRPC messages, straight from the NumPy vectors, or as REST models
+        self._grpc_points = QDRANT_PREFER_GRPC
+        # The collection of the calls made without a collection name
         self.collection_name = collection_name or QDRANT_COLLECTION
+        self.distance = rest.Distance[distance.upper()]
+        self.profile = profile or QDRANT_PROFILE
+        self._check_profile(self.profile)
+        # The vector size and quantization of each collection, from Qdrant
+        self._collection_configs: Dict[str, Dict[str, Any]] = {}
 
         # Set up the collection so the points might be inserted or queried
-        self._set_up_collection(vector_size, distance, recreate_collection)
+        self._set_up_collection(self.collection_name, vector_size, recreate_collection)
+
+    @staticmethod
+    def _check_profile(profile: str):
+        if profile not in QDRANT_PROFILES:
+            raise ValueError(
+                f"Unknown Qdrant profile '{profile}', use one of {list(QDRANT_PROFILES)}"
+            )
 
-    async def _upsert(self, chunks: Dict[str, List[DocumentChunk]]) -> List[str]:
+    async def create_collection(
+        self,
+        collection_name: str,
+        embedding_method: str,
+        create_new: bool = False,
+        bulk_load: bool = False,
+        index_params: Optional[Dict[str, Any]] = None,
+    ) -> bool:
+        """
+        Create a collection for the vector size of its embedding method.
+
+        Args:
+            collection_name: Name of the collection
+            embedding_method: "openai" or "mpnet"
+            create_new: Whether to recreate the collection if it exists
+            bulk_load: Not used, Qdrant indexes the points in the background
+            index_params:
+                "profile", one of QDRANT_PROFILES, and the HNSW "M" and
+                "EF_CONSTRUCTION" of the collection, over the environment defaults
+        """
+        index_params = index_params or {}
+        profile = index_params.get("profile", self.profile)
+        self._check_profile(profile)
+        await self._run_io(
+            self._set_up_collection,
+            collection_name,
+            VECTOR_SIZES[embedding_method],
+            create_new,
+            profile,
+            index_params,
+        )
+        return True
+
+    async def delete_collection(self, collection_name: str) -> bool:
+        self._collection_configs.pop(collection_name, None)
+        return await self._run_io(self.client.delete_collection, collection_name)
+
+    async def _get_collection_config(self, collection_name: str) -> Dict[str, Any]:
+        # Cached, the vector size, quantization and shards of a collection do not change
+        if collection_name not in self._collection_configs:
+            collection_info = await self._run_io(self.client.get_collection, collection_name)
+            self._cache_collection_config(collection_name, collection_info)
+        return self._collection_configs[collection_name]
+
+    def _cache_collection_config(self, collection_name: str, collection_info: rest.CollectionInfo):
+        self._collection_configs[collection_name] = {
+            "vector_size": collection_info.config.params.vectors.size,  # type: ignore
+            "quantized": collection_info.config.quantization_config is not None,
+            "shard_number": collection_info.config.params.shard_number or 1,
+        }
+
+    async def _route(self, collection_name: Optional[str], mode: Optional[str] = None) -> str:
+        """
+        Return the Qdrant collection of a call, checking that it stores the
+        vectors of the embedding method.
+        """
+        collection_name = collection_name or self.collection_name
+        if mode is not None and collection_name != self.collection_name:
+            vector_size = (await self._get_collection_config(collection_name))["vector_size"]
+            if vector_size != VECTOR_SIZES[mode]:
+                raise ValueError(
+                    f"Collection '{collection_name}' stores vectors of size {vector_size}, "
+                    f"not the {VECTOR_SIZES[mode]} of the {mode} embeddings."
+                )
+        return collection_name
+
+    async def _upsert(
+        self,
+        chunks: Dict[str, List[DocumentChunk]],
+        collection_name: Optional[str] = None,
+        mode: str = "mpnet",
+    ) -> List[str]:
         """
         Takes in a list of document chunks and inserts them into the database.
         Return a list of document ids.
+
+        The chunks are split into batches of at most QDRANT_UPSERT_BATCH_SIZE points and about
+        QDRANT_UPSERT_BATCH_BYTES bytes, and up to QDRANT_UPSERT_CONCURRENCY batches are in flight at once, each
+        returning as soon as Qdrant has it in its write-ahead log. The last batch is sent once all the others are
+        acknowledged, and waits for the points to be applied if QDRANT_UPSERT_WAIT is set: Qdrant applies the
+        operations of a shard in order, so the earlier batches are searchable too when it returns. That only holds
+        with a single shard, the last batch may not touch every shard of a collection with several, whose batches
+        all wait instead.
         """
-        points = [
-            self._convert_document_chunk_to_point(chunk)
-            for _, chunks in chunks.items()
-            for chunk in chunks
-        ]
-        self.client.upsert(
-            collection_name=self.collection_name,
-            points=points,  # type: ignore
-            wait=True,
+        collection_name = await self._route(collection_name, mode)
+        batches = self._get_upsert_batches(
+            [chunk for chunk_list in chunks.values() for chunk in chunk_list]
         )
+        semaphore = asyncio.Semaphore(QDRANT_UPSERT_CONCURRENCY)
+
+        async def _upsert_batch(batch: List[DocumentChunk], wait: bool):
+            async with semaphore:
+                # Build the points only when the batch is sent, to bound the memory of a large upsert
+                await self.async_client.upsert(
+                    collection_name=collection_name,
+                    points=self._convert_document_chunks_to_points(batch),  # type: ignore
+                    wait=wait,
+                )
+
+        if not batches:
+            return list(chunks.keys())
+        if (await self._get_collection_config(collection_name))["shard_number"] > 1:
+            await asyncio.gather(*[_upsert_batch(batch, QDRANT_UPSERT_WAIT) for batch in batches])
+        else:
+            await asyncio.gather(*[_upsert_batch(batch, False) for batch in batches[:-1]])
+            await _upsert_batch(batches[-1], QDRANT_UPSERT_WAIT)
         return list(chunks.keys())
 
+    def _get_upsert_batches(self, chunks: List[DocumentChunk]) -> List[List[DocumentChunk]]:
+        """Split the chunks into batches of at most QDRANT_UPSERT_BATCH_SIZE points and about QDRANT_UPSERT_BATCH_BYTES bytes."""
+        batches = []
+        batch = []
+        batch_bytes = 0
+        for chunk in chunks:
+            # float32 vector, and the text twice, in the payload and its metadata overhead
+            chunk_bytes = 4 * len(chunk.embedding or []) + 2 * len(chunk.text)
+            if batch and (len(batch) >= QDRANT_UPSERT_BATCH_SIZE or batch_bytes + chunk_bytes > QDRANT_UPSERT_BATCH_BYTES):
+                batches.append(batch)
+                batch = []
+                batch_bytes = 0
+            batch.append(chunk)
+            batch_bytes += chunk_bytes
+        if batch:
+            batches.append(batch)
+        return batches
+
     async def _query(
         self,
         queries: List[QueryWithEmbedding],
+        collection_name: Optional[str] = None,
+        mode: str = "mpnet",
+        session_token: Optional[str] = None,
     ) -> List[QueryResult]:
         """
         Takes in a list of queries with embeddings and filters and returns a list of query results with matching document chunks and scores.
+
+        All the queries, whatever their filters, are sent in one search_batch request, a single round-trip.
         """
+        collection_name = await self._route(collection_name, mode)
+        quantized = (await self._get_collection_config(collection_name))["quantized"]
         search_requests = [
-            self._convert_query_to_search_request(query) for query in queries
+            self._convert_query_to_search_request(query, quantized) for query in queries
         ]
-        results = self.client.search_batch(
-            collection_name=self.collection_name,
+        results = await self._run_io(
+            self.client.search_batch,
+            collection_name=collection_name,
             requests=search_requests,
         )
         return [
@@ -105,11 +313,13 @@ class QdrantDataStore(DataStore):
         ids: Optional[List[str]] = None,
         filter: Optional[DocumentMetadataFilter] = None,
         delete_all: Optional[bool] = None,
+        collection_name: Optional[str] = None,
     ) -> bool:
         """
         Removes vectors by ids, filter, or everything in the datastore.
         Returns whether the operation was successful.
         """
+        collection_name = await self._route(collection_name)
         if ids is None and filter is None and delete_all is None:
             raise ValueError(
                 "Please provide one of the parameters: ids, filter or delete_all."
@@ -122,30 +332,51 @@ class QdrantDataStore(DataStore):
                 filter, ids
             )
 
-        response = self.client.delete(
-            collection_name=self.collection_name,
+        response = await self._run_io(
+            self.client.delete,
+            collection_name=collection_name,
             points_selector=points_selector,  # type: ignore
         )
-        return "COMPLETED" == response.status
+        return response.status == rest.UpdateStatus.COMPLETED
+
+    def _convert_document_chunks_to_points(self, document_chunks: List[DocumentChunk]) -> List:
+        """Convert a batch of chunks into points, with the vectors of the batch in one float32 array.
 
-    def _convert_document_chunk_to_point(
-        self, document_chunk: DocumentChunk
-    ) -> rest.PointStruct:
+        Over gRPC, the points are built as protobuf messages straight from the array, without validating a list of
+        floats per vector in a REST model first.
+        """
+        vectors = np.asarray([chunk.embedding for chunk in document_chunks], dtype=np.float32)
+        if not self._grpc_points:
+            # The REST client, and the local mode of the client, take the REST models
+            return [
+                rest.PointStruct(
+                    id=self._create_document_chunk_id(chunk.id),
+                    vector=vector.tolist(),
+                    payload=self._get_payload(chunk),
+                )
+                for chunk, vector in zip(document_chunks, vectors)
+            ]
+        return [
+            grpc.PointStruct(
+                id=grpc.PointId(uuid=self._create_document_chunk_id(chunk.id)),
+                vectors=grpc.Vectors(vector=grpc.Vector(data=vector)),
+                payload=RestToGrpc.convert_payload(self._get_payload(chunk)),
+            )
+            for chunk, vector in zip(document_chunks, vectors)
+        ]
+
+    def _get_payload(self, document_chunk: DocumentChunk) -> Dict:
         created_at = (
             to_unix_timestamp(document_chunk.metadata.created_at)
             if document_chunk.metadata.created_at is not None
             else None
         )
-        return rest.PointStruct(
-            id=self._create_document_chunk_id(document_chunk.id),
-            vector=document_chunk.embedding,  # type: ignore
-            payload={
-                "id": document_chunk.id,
-                "text": document_chunk.text,
-                "metadata": document_chunk.metadata.dict(),
-                "created_at": created_at,
-            },
-        )
+        return {
+            "id": document_chunk.id,
+            "text": document_chunk.text,
+            "metadata": document_chunk.metadata.dict(),
+            "created_at": created_at,
+        }
 
     def _create_document_chunk_id(self, external_id: Optional[str]) -> str:
         if external_id is None:
@@ -153,16 +384,50 @@ class QdrantDataStore(DataStore):
         return uuid.uuid5(self.UUID_NAMESPACE, external_id).hex
 
     def _convert_query_to_search_request(
-        self, query: QueryWithEmbedding
+        self, query: QueryWithEmbedding, quantized: bool = False
     ) -> rest.SearchRequest:
         return rest.SearchRequest(
             vector=query.embedding,
             filter=self._convert_metadata_filter_to_qdrant_filter(query.filter),
             limit=query.top_k,  # type: ignore
+            params=self._get_search_params(query.search_params, quantized),
             with_payload=True,
             with_vector=False,
         )
 
+    def _get_search_params(
+        self, search_params: Optional[Dict[str, Any]] = None, quantized: bool = False
+    ) -> Optional[rest.SearchParams]:
+        """
+        Build the search parameters of a query, from its search_params over the
+        QDRANT_SEARCH_* defaults.
+
+        Args:
+            search_params: "hnsw_ef", the candidates kept by the HNSW search,
+                "exact", to search without the index, and "oversampling" and
+                "rescore", how many more candidates are fetched from the quantized
+                vectors and whether they are rescored with the original vectors.
+            quantized: Whether the searched collection has quantized vectors.
+        """
+        search_params = search_params or {}
+        hnsw_ef = search_params.get("hnsw_ef", QDRANT_SEARCH_HNSW_EF)
+        exact = bool(search_params.get("exact", False))
+        oversampling = search_params.get("oversampling", QDRANT_SEARCH_OVERSAMPLING)
+        rescore = search_params.get("rescore", QDRANT_SEARCH_RESCORE)
+        quantization = None
+        if quantized:
+            quantization = rest.QuantizationSearchParams(
+                rescore=bool(rescore),
+                oversampling=float(oversampling) if oversampling is not None else None,
+            )
+        if hnsw_ef is None and not exact and quantization is None:
+            return None
+        return rest.SearchParams(
+            hnsw_ef=int(hnsw_ef) if hnsw_ef is not None else None,
+            exact=exact,
+            quantization=quantization,
+        )
+
     def _convert_metadata_filter_to_qdrant_filter(
         self,
         metadata_filter: Optional[DocumentMetadataFilter] = None,
@@ -185,17 +450,13 @@ class QdrantDataStore(DataStore):
 
         # Equality filters for the payload attributes
         if metadata_filter:
-            meta_attributes_keys = {
-                "document_id": "metadata.document_id",
-                "source": "metadata.source",
-                "source_id": "metadata.source_id",
-                "author": "metadata.author",
-            }
-
-            for meta_attr_name, payload_key in meta_attributes_keys.items():
+            for meta_attr_name, payload_key in FILTER_KEYS.items():
                 attr_value = getattr(metadata_filter, meta_attr_name)
                 if attr_value is None:
                     continue
+                # The source enum is stored as its value
+                if isinstance(attr_value, Source):
+                    attr_value = attr_value.value
 
                 must_conditions.append(
                     rest.FieldCondition(
@@ -215,7 +476,7 @@ class QdrantDataStore(DataStore):
                 )
                 must_conditions.append(
                     rest.FieldCondition(
-                        key="created_at",
+                        key=CREATED_AT_KEY,
                         range=rest.Range(
                             gte=gte_filter,
                             lte=lte_filter,
@@ -226,7 +487,8 @@ class QdrantDataStore(DataStore):
         if 0 == len(must_conditions) and 0 == len(should_conditions):
             return None
 
-        return rest.Filter(must=must_conditions, should=should_conditions)
+        # An empty should list matches no point, leave it out
+        return rest.Filter(must=must_conditions or None, should=should_conditions or None)
 
     def _convert_scored_point_to_document_chunk_with_score(
         self, scored_point: rest.ScoredPoint
@@ -241,21 +503,25 @@ class QdrantDataStore(DataStore):
         )
 
     def _set_up_collection(
-        self, vector_size: int, distance: str, recreate_collection: bool
+        self,
+        collection_name: str,
+        vector_size: int,
+        recreate_collection: bool,
+        profile: Optional[str] = None,
+        index_params: Optional[Dict[str, Any]] = None,
     ):
-        distance = rest.Distance[distance.upper()]
-
         if recreate_collection:
-            self._recreate_collection(distance, vector_size)
+            self._recreate_collection(collection_name, vector_size, profile, index_params)
+            return
 
         try:
-            collection_info = self.client.get_collection(self.collection_name)
+            collection_info = self.client.get_collection(collection_name)
             current_distance = collection_info.config.params.vectors.distance  # type: ignore
             current_vector_size = collection_info.config.params.vectors.size  # type: ignore
 
-            if current_distance != distance:
+            if current_distance != self.distance:
                 raise ValueError(
-                    f"Collection '{self.collection_name}' already exists in Qdrant, "
+                    f"Collection '{collection_name}' already exists in Qdrant, "
                     f"but it is configured with a similarity '{current_distance.name}'. "
                     f"If you want to use that collection, but with a different "
                     f"similarity, please set `recreate_collection=True` argument."
@@ -263,35 +529,98 @@ class QdrantDataStore(DataStore):
 
             if current_vector_size != vector_size:
                 raise ValueError(
-                    f"Collection '{self.collection_name}' already exists in Qdrant, "
+                    f"Collection '{collection_name}' already exists in Qdrant, "
                     f"but it is configured with a vector size '{current_vector_size}'. "
                     f"If you want to use that collection, but with a different "
                     f"vector size, please set `recreate_collection=True` argument."
                 )
+
+            # Index the filter fields the collection was created without
+            self._create_payload_indexes(collection_name, collection_info.payload_schema)
+            self._cache_collection_config(collection_name, collection_info)
         except (UnexpectedResponse, _InactiveRpcError):
-            self._recreate_collection(distance, vector_size)
+            self._recreate_collection(collection_name, vector_size, profile, index_params)
 
-    def _recreate_collection(self, distance: rest.Distance, vector_size: int):
+    def _recreate_collection(
+        self,
+        collection_name: str,
+        vector_size: int,
+        profile: Optional[str] = None,
+        index_params: Optional[Dict[str, Any]] = None,
+    ):
+        profile_config = QDRANT_PROFILES[profile or self.profile]
         self.client.recreate_collection(
-            self.collection_name,
+            collection_name,
             vectors_config=rest.VectorParams(
                 size=vector_size,
-                distance=distance,
+                distance=self.distance,
+                on_disk=profile_config["on_disk"],
             ),
+            hnsw_config=self._get_hnsw_config(index_params),
+            quantization_config=self._get_quantization_config(profile_config["quantization"]),
         )
+        # The shard number defaults to the number of nodes of a cluster, read it back from Qdrant
+        self._cache_collection_config(collection_name, self.client.get_collection(collection_name))
 
-        # Create the payload index for the document_id metadata attribute, as it is
-        # used to delete the document related entries
-        self.client.create_payload_index(
-            self.collection_name,
-            field_name="metadata.document_id",
-            field_type=PayloadSchemaType.KEYWORD,
-        )
+        # Index every payload key the filters and deletes match on
+        self._create_payload_indexes(collection_name)
+
+    def _create_payload_indexes(
+        self, collection_name: str, payload_schema: Optional[Dict[str, Any]] = None
+    ) -> List[str]:
+        """
+        Create the missing payload indexes of PAYLOAD_INDEXES on a collection.
+
+        Args:
+            collection_name: The collection to index.
+            payload_schema: The payload indexes the collection already has, by key.
 
-        # Create the payload index for the created_at attribute, to make the lookup
-        # by range filters faster
-        self.client.create_payload_index(
-            self.collection_name,
-            field_name="created_at",
-            field_schema=PayloadSchemaType.INTEGER,
+        Returns:
+            The payload keys indexed.
+        """
+        payload_schema = payload_schema or {}
+        created = []
+        for field_name, field_schema in PAYLOAD_INDEXES.items():
+            if field_name in payload_schema:
+                continue
+            self.client.create_payload_index(
+                collection_name,
+                field_name=field_name,
+                field_schema=field_schema,
+            )
+            created.append(field_name)
+        return created
+
+    def _get_hnsw_config(
+        self, index_params: Optional[Dict[str, Any]] = None
+    ) -> Optional[rest.HnswConfigDiff]:
+        index_params = index_params or {}
+        m = index_params.get("M", QDRANT_HNSW_M)
+        ef_construct = index_params.get("EF_CONSTRUCTION", QDRANT_HNSW_EF_CONSTRUCT)
+        if m is None and ef_construct is None:
+            return None
+        return rest.HnswConfigDiff(
+            m=int(m) if m is not None else None,
+            ef_construct=int(ef_construct) if ef_construct is not None else None,
         )
+
+    def _get_quantization_config(
+        self, quantization: Optional[str]
+    ) -> Optional[rest.QuantizationConfig]:
+        # The quantized vectors are always kept in RAM, the original ones are only read to rescore
+        if quantization == "scalar":
+            return rest.ScalarQuantization(
+                scalar=rest.ScalarQuantizationConfig(
+                    type=rest.ScalarType.INT8,
+                    quantile=0.99,
+                    always_ram=True,
+                )
+            )
+        if quantization == "product":
+            return rest.ProductQuantization(
+                product=rest.ProductQuantizationConfig(
+                    compression=rest.CompressionRatio.X16,
+                    always_ram=True,
+                )
+            )
+        return None
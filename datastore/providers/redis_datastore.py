@@ -7,6 +7,7 @@ import redis.asyncio as redis
 import numpy as np
 
 from redis.commands.search.query import Query as RediSearchQuery
+from redis.commands.search.result import Result
 from redis.commands.search.indexDefinition import IndexDefinition, IndexType
 from redis.commands.search.field import (
     TagField,
@@ -14,15 +15,17 @@ from redis.commands.search.field import (
     NumericField,
     VectorField,
 )
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 from datastore.datastore import DataStore
 from models.models import (
     DocumentChunk,
+    DocumentChunkMetadata,
     DocumentMetadataFilter,
     DocumentChunkWithScore,
     DocumentMetadataFilter,
     QueryResult,
     QueryWithEmbedding,
+    Source,
 )
 from services.date import to_unix_timestamp
 
@@ -35,9 +38,26 @@ REDIS_DOC_PREFIX = os.environ.get("REDIS_DOC_PREFIX", "doc")
 REDIS_DISTANCE_METRIC = os.environ.get("REDIS_DISTANCE_METRIC", "COSINE")
 REDIS_INDEX_TYPE = os.environ.get("REDIS_INDEX_TYPE", "FLAT")
 assert REDIS_INDEX_TYPE in ("FLAT", "HNSW")
+# How the chunks are stored: "json" documents with FLOAT64 vectors, or "hash" with flat metadata fields and
+# FLOAT32 vector blobs, which takes half the vector memory and skips the JSON parsing
+REDIS_STORAGE_TYPE = os.environ.get("REDIS_STORAGE_TYPE", "json")
+assert REDIS_STORAGE_TYPE in ("json", "hash")
+# The most keys found and unlinked per round-trip of a delete, and the most document ids matched by one query
+REDIS_DELETE_BATCH_SIZE = int(os.environ.get("REDIS_DELETE_BATCH_SIZE", 1000))
+REDIS_DELETE_IDS_PER_QUERY = 100
+# The keys of a collection are stored under <prefix>:<collection name>:, apart from the REDIS_DOC_PREFIX index
+REDIS_COLLECTION_PREFIX = os.environ.get("REDIS_COLLECTION_PREFIX", "collection")
+# The HNSW parameters of the indexes, a collection can override them with its index params
+REDIS_HNSW_M = int(os.environ.get("REDIS_HNSW_M", 16))
+REDIS_HNSW_EF_CONSTRUCTION = int(os.environ.get("REDIS_HNSW_EF_CONSTRUCTION", 200))
+REDIS_HNSW_EF_RUNTIME = int(os.environ.get("REDIS_HNSW_EF_RUNTIME", 10))
+# The most chunks written per pipeline of an upsert
+REDIS_UPSERT_BATCH_SIZE = int(os.environ.get("REDIS_UPSERT_BATCH_SIZE", 500))
 
 # OpenAI Ada Embeddings Dimension
 VECTOR_DIMENSION = 1536
+# The embedding dimension of each embedding method
+VECTOR_DIMENSIONS = {"openai": 1536, "mpnet": 768}
 
 # RediSearch constants
 REDIS_REQUIRED_MODULES = [
@@ -45,8 +65,36 @@ REDIS_REQUIRED_MODULES = [
     {"name": "ReJSON", "ver": 20404}
 ]
 REDIS_DEFAULT_ESCAPED_CHARS = re.compile(r"[,.<>{}\[\]\\\"\':;!@#$%^&*()\-+=~\/ ]")
+# The fields of a chunk stored as a hash, besides the embedding
+REDIS_HASH_FIELDS = ["chunk_id", "text"] + list(DocumentChunkMetadata.__fields__.keys())
 
 # Helper functions
+def _get_index_key_type(info: dict) -> Optional[str]:
+    # The key type ("JSON" or "HASH") from the FT.INFO index definition, a flat list of names and values
+    definition = info.get("index_definition") or []
+    definition = [value.decode() if isinstance(value, bytes) else value for value in definition]
+    for name, value in zip(definition[::2], definition[1::2]):
+        if name == "key_type":
+            return value
+    return None
+
+def _get_index_params(info: dict) -> Optional[dict]:
+    # The params of the vector field from the FT.INFO attributes, None when the server does not report them
+    for attribute in info.get("attributes") or []:
+        attribute = [value.decode() if isinstance(value, bytes) else value for value in attribute]
+        values = {str(name).lower(): value for name, value in zip(attribute[::2], attribute[1::2])}
+        if str(values.get("type")).upper() != "VECTOR":
+            continue
+        index_type = str(values.get("algorithm")).upper()
+        if index_type not in ("FLAT", "HNSW"):
+            return None
+        index_params = {"index_type": index_type}
+        for name in ("M", "EF_CONSTRUCTION", "EF_RUNTIME"):
+            if name.lower() in values:
+                index_params[name] = int(values[name.lower()])
+        return index_params
+    return None
+
 def unpack_schema(d: dict):
     for v in d.values():
         if isinstance(v, dict):
@@ -66,11 +114,82 @@ async def _check_redis_module_exist(client: redis.Redis, modules: List[dict]):
             raise AttributeError(error_message)
 
 
+def _get_vector_index(dim: int, vector_type: str, index_params: Optional[dict] = None) -> Tuple[str, dict]:
+    """
+    Build the algorithm and attributes of a vector field.
+
+    Args:
+        dim (int): Dimension of the embeddings.
+        vector_type (str): "FLOAT32" or "FLOAT64".
+        index_params (Optional[dict]): Overrides of "index_type", "M", "EF_CONSTRUCTION" and "EF_RUNTIME".
+
+    Returns:
+        Tuple[str, dict]: The algorithm, FLAT or HNSW, and its attributes.
+    """
+    index_params = index_params or {}
+    index_type = index_params.get("index_type", REDIS_INDEX_TYPE)
+    assert index_type in ("FLAT", "HNSW")
+    attributes = {
+        "TYPE": vector_type,
+        "DIM": dim,
+        "DISTANCE_METRIC": REDIS_DISTANCE_METRIC,
+    }
+    if index_type == "HNSW":
+        attributes["M"] = index_params.get("M", REDIS_HNSW_M)
+        attributes["EF_CONSTRUCTION"] = index_params.get("EF_CONSTRUCTION", REDIS_HNSW_EF_CONSTRUCTION)
+        attributes["EF_RUNTIME"] = index_params.get("EF_RUNTIME", REDIS_HNSW_EF_RUNTIME)
+    return index_type, attributes
+
+
+def _get_redisearch_schema(dim: int, storage_type: str, index_params: Optional[dict] = None) -> dict:
+    """
+    Build the RediSearch schema of the chunks, for JSON documents or hashes.
+
+    Args:
+        dim (int): Dimension of the embeddings.
+        storage_type (str): "json" or "hash".
+        index_params (Optional[dict]): Vector index overrides, see _get_vector_index.
+
+    Returns:
+        dict: The RediSearch fields, with the metadata fields under "metadata".
+    """
+    if storage_type == "hash":
+        # The hash fields are flat, and the vector is a FLOAT32 blob
+        return {
+            "document_id": TagField("document_id"),
+            "metadata": {
+                "source_id": TagField("source_id"),
+                "source": TagField("source"),
+                "author": TextField("author"),
+                "created_at": NumericField("created_at"),
+            },
+            "embedding": VectorField("embedding", *_get_vector_index(dim, "FLOAT32", index_params)),
+        }
+    return {
+        "document_id": TagField("$.document_id", as_name="document_id"),
+        "metadata": {
+            "source_id": TagField("$.metadata.source_id", as_name="source_id"),
+            "source": TagField("$.metadata.source", as_name="source"),
+            "author": TextField("$.metadata.author", as_name="author"),
+            "created_at": NumericField("$.metadata.created_at", as_name="created_at"),
+        },
+        "embedding": VectorField(
+            "$.embedding",
+            *_get_vector_index(dim, "FLOAT64", index_params),
+            as_name="embedding",
+        ),
+    }
+
+
 
 class RedisDataStore(DataStore):
-    def __init__(self, client: redis.Redis, redisearch_schema):
+    def __init__(self, client: redis.Redis, redisearch_schema, storage_type: str = REDIS_STORAGE_TYPE):
         self.client = client
         self._schema = redisearch_schema
+        # The storage type of new collections, and of the REDIS_INDEX_NAME index
+        self._storage_type = storage_type
+        # The storage type of each collection, from its index
+        self._storage_types: Dict[Optional[str], str] = {None: storage_type}
         # Init default metadata with sentinel values in case the document written has no metadata
         self._default_metadata = {
             field: "_null_" for field in redisearch_schema["metadata"]
@@ -96,55 +215,135 @@ class RedisDataStore(DataStore):
         await _check_redis_module_exist(client, modules=REDIS_REQUIRED_MODULES)
        
         dim = kwargs.get("dim", VECTOR_DIMENSION)
-        redisearch_schema = {
-            "document_id": TagField("$.document_id", as_name="document_id"),
-            "metadata": {
-                "source_id": TagField("$.metadata.source_id", as_name="source_id"),
-                "source": TagField("$.metadata.source", as_name="source"),
-                "author": TextField("$.metadata.author", as_name="author"),
-                "created_at": NumericField("$.metadata.created_at", as_name="created_at"),
-            },
-            "embedding": VectorField(
-                "$.embedding",
-                REDIS_INDEX_TYPE,
-                {
-                    "TYPE": "FLOAT64",
-                    "DIM": dim,
-                    "DISTANCE_METRIC": REDIS_DISTANCE_METRIC,
-                },
-                as_name="embedding",
-            ),
-        }
+        storage_type = kwargs.get("storage_type", REDIS_STORAGE_TYPE)
+        redisearch_schema = _get_redisearch_schema(dim, storage_type)
+        datastore = cls(client, redisearch_schema, storage_type)
+        # The index of the chunks written without a collection, which keeps its storage type if it exists
+        datastore._storage_types[None] = await datastore._create_index(
+            REDIS_INDEX_NAME, REDIS_DOC_PREFIX, redisearch_schema, storage_type
+        )
+        return datastore
+
+    async def _create_index(self, index_name: str, prefix: str, redisearch_schema: dict, storage_type: str) -> str:
+        """
+        Create a RediSearch index if it does not exist.
+
+        Args:
+            index_name (str): Name of the index.
+            prefix (str): Key prefix of the chunks the index covers.
+            redisearch_schema (dict): Fields of the index.
+            storage_type (str): "json" or "hash", the type of the keys the index covers.
+
+        Returns:
+            str: The storage type of the index, which is the existing one if the index exists.
+        """
         try:
             # Check for existence of RediSearch Index
-            await client.ft(REDIS_INDEX_NAME).info()
-            logging.info(f"RediSearch index {REDIS_INDEX_NAME} already exists")
+            info = await self.client.ft(index_name).info()
+            logging.info(f"RediSearch index {index_name} already exists")
+            key_type = _get_index_key_type(info)
+            if key_type and key_type.lower() != storage_type:
+                logging.warning(
+                    f"RediSearch index {index_name} indexes {key_type} keys, not {storage_type}. "
+                    "Migrate it with scripts/redis_hash_migration"
+                )
+                return key_type.lower()
         except:
             # Create the RediSearch Index
-            logging.info(f"Creating new RediSearch index {REDIS_INDEX_NAME}")
+            logging.info(f"Creating new RediSearch index {index_name}")
             definition = IndexDefinition(
-                prefix=[REDIS_DOC_PREFIX], index_type=IndexType.JSON
+                prefix=[prefix],
+                index_type=IndexType.HASH if storage_type == "hash" else IndexType.JSON,
             )
             fields = list(unpack_schema(redisearch_schema))
             logging.info(f"Creating index with fields: {fields}")
-            await client.ft(REDIS_INDEX_NAME).create_index(
+            await self.client.ft(index_name).create_index(
                 fields=fields, definition=definition
             )
-        return cls(client, redisearch_schema)
+        return storage_type
 
     @staticmethod
-    def _redis_key(document_id: str, chunk_id: str) -> str:
+    def _get_index_name(collection_name: Optional[str]) -> str:
+        # The index of a collection, or the REDIS_INDEX_NAME index for the chunks written without a collection
+        return f"{REDIS_INDEX_NAME}_{collection_name}" if collection_name else REDIS_INDEX_NAME
+
+    @staticmethod
+    def _get_key_prefix(collection_name: Optional[str]) -> str:
+        # The prefix of the keys of a collection, ending with a separator so no collection covers another one's keys
+        return f"{REDIS_COLLECTION_PREFIX}:{collection_name}:" if collection_name else f"{REDIS_DOC_PREFIX}:"
+
+    async def _get_storage_type(self, collection_name: Optional[str]) -> str:
+        # The storage type of a collection, from the key type of its index
+        if collection_name not in self._storage_types:
+            info = await self.client.ft(self._get_index_name(collection_name)).info()
+            self._storage_types[collection_name] = (_get_index_key_type(info) or "JSON").lower()
+        return self._storage_types[collection_name]
+
+    async def create_collection(
+        self,
+        collection_name: str,
+        embedding_method: str,
+        create_new: bool = False,
+        bulk_load: bool = False,
+        index_params: Optional[dict] = None,
+    ) -> bool:
         """
-        Create the JSON key for document chunks in Redis.
+        Create the index of a collection, for the embedding dimension of its embedding method.
 
         Args:
+            collection_name (str): Name of the collection.
+            embedding_method (str): "openai" or "mpnet".
+            create_new (bool): Whether to delete the collection first if it exists.
+            bulk_load (bool): Not used, Redis indexes the chunks as they are written.
+            index_params (Optional[dict]): Vector index overrides, e.g. {"index_type": "HNSW", "M": 32}.
+
+        Returns:
+            bool: Whether the collection was created.
+        """
+        if create_new:
+            await self.delete_collection(collection_name)
+        storage_type = self._storage_type
+        redisearch_schema = _get_redisearch_schema(VECTOR_DIMENSIONS[embedding_method], storage_type, index_params)
+        self._storage_types[collection_name] = await self._create_index(
+            self._get_index_name(collection_name),
+            self._get_key_prefix(collection_name),
+            redisearch_schema,
+            storage_type,
+        )
+        return True
+
+    async def delete_collection(self, collection_name: str) -> bool:
+        """
+        Drop the index of a collection and its chunks.
+
+        Args:
+            collection_name (str): Name of the collection.
+
+        Returns:
+            bool: Whether the collection was deleted.
+        """
+        try:
+            await self.client.ft(self._get_index_name(collection_name)).dropindex(delete_documents=True)
+            self._storage_types.pop(collection_name, None)
+            logging.info(f"Deleted collection {collection_name} successfully")
+            return True
+        except Exception as e:
+            logging.info(f"Error deleting collection {collection_name}: {e}")
+            return False
+
+    def _redis_key(self, collection_name: Optional[str], document_id: str, chunk_id: str) -> str:
+        """
+        Create the key for document chunks in Redis.
+
+        Args:
+            collection_name (Optional[str]): Collection of the chunk.
             document_id (str): Document Identifier
             chunk_id (str): Chunk Identifier
 
         Returns:
-            str: JSON key string.
+            str: Key string.
         """
-        return f"doc:{document_id}:chunk:{chunk_id}"
+        return f"{self._get_key_prefix(collection_name)}{document_id}:chunk:{chunk_id}"
 
     @staticmethod
     def _escape(value: str) -> str:
@@ -190,17 +389,60 @@ class RedisDataStore(DataStore):
                     else:
                         redis_metadata[field] = value
         data["metadata"] = redis_metadata
+        # The document_id tag of the index is at the top level
+        data["document_id"] = metadata.get("document_id") or "_null_"
         return data
 
-    def _get_redis_query(self, query: QueryWithEmbedding) -> RediSearchQuery:
+    @staticmethod
+    def _get_redis_hash(chunk_id: str, text: str, embedding: List[float], metadata: dict) -> dict:
         """
-        Convert a QueryWithEmbedding into a RediSearchQuery.
+        Convert the values of a chunk into the fields of its Redis hash.
 
         Args:
-            query (QueryWithEmbedding): Search query.
+            chunk_id (str): Chunk Identifier
+            text (str): Text of the chunk.
+            embedding (List[float]): Embedding of the chunk, stored as a FLOAT32 blob.
+            metadata (dict): Metadata of the chunk, created_at as a unix timestamp.
 
         Returns:
-            RediSearchQuery: Query for RediSearch.
+            dict: Hash fields for storage in Redis, without the missing values.
+        """
+        mapping = {
+            "chunk_id": chunk_id,
+            "text": text,
+            "embedding": np.asarray(embedding, dtype=np.float32).tobytes(),
+        }
+        for field, value in metadata.items():
+            # Missing values are left out of the hash, and of the index
+            if value is None or value == "_null_":
+                continue
+            mapping[field] = value.value if isinstance(value, Source) else value
+        return mapping
+
+    def _get_redis_chunk_hash(self, chunk: DocumentChunk) -> dict:
+        """
+        Convert DocumentChunk into the fields of a Redis hash.
+
+        Args:
+            chunk (DocumentChunk): Chunk of a Document.
+
+        Returns:
+            dict: Hash fields for storage in Redis.
+        """
+        metadata = chunk.metadata.dict()
+        if metadata["created_at"]:
+            metadata["created_at"] = to_unix_timestamp(metadata["created_at"])
+        return self._get_redis_hash(chunk.id, chunk.text, chunk.embedding, metadata)
+
+    def _get_redis_filter(self, filter: Optional[DocumentMetadataFilter]) -> str:
+        """
+        Convert a DocumentMetadataFilter into a RediSearch query string.
+
+        Args:
+            filter (Optional[DocumentMetadataFilter]): Metadata filter.
+
+        Returns:
+            str: Query string matching the filter, "*" for no filter.
         """
         filter_str: str = ""
 
@@ -211,17 +453,18 @@ class RedisDataStore(DataStore):
             elif isinstance(typ, TextField):
                 return f"@{field}:{self._escape(value)} "
             elif isinstance(typ, NumericField):
+                # Date ranges match on the created_at field
                 num = to_unix_timestamp(value)
                 match field:
                     case "start_date":
-                        return f"@{field}:[{num} +inf] "
+                        return f"@created_at:[{num} +inf] "
                     case "end_date":
-                        return f"@{field}:[-inf {num}] "
+                        return f"@created_at:[-inf {num}] "
 
         # Build filter
-        if query.filter:
+        if filter:
             redisearch_schema = self._schema
-            for field, value in query.filter.__dict__.items():
+            for field, value in filter.__dict__.items():
                 if not value:
                     continue
                 if field in redisearch_schema:
@@ -239,51 +482,97 @@ class RedisDataStore(DataStore):
 
         # Postprocess filter string
         filter_str = filter_str.strip()
-        filter_str = filter_str if filter_str else "*"
+        return filter_str if filter_str else "*"
+
+    def _get_redis_query(self, query: QueryWithEmbedding, storage_type: str) -> RediSearchQuery:
+        """
+        Convert a QueryWithEmbedding into a RediSearchQuery.
+
+        Args:
+            query (QueryWithEmbedding): Search query.
+            storage_type (str): "json" or "hash", the storage type of the searched index.
+
+        Returns:
+            RediSearchQuery: Query for RediSearch.
+        """
+        filter_str = self._get_redis_filter(query.filter)
 
         # Prepare query string
         query_str = (
             f"({filter_str})=>[KNN {query.top_k} @embedding $embedding as score]"
         )
-        return (
+        redis_query = (
             RediSearchQuery(query_str)
             .sort_by("score")
             .paging(0, query.top_k)
             .dialect(2)
         )
+        # Only return the fields of the results, not the embedding
+        if storage_type == "hash":
+            redis_query = redis_query.return_fields(*REDIS_HASH_FIELDS, "score")
+        else:
+            redis_query = (
+                redis_query.return_field("$.text", as_field="text")
+                .return_field("$.metadata", as_field="metadata")
+                .return_field("score")
+            )
+        return redis_query
 
-    async def _redis_delete(self, keys: List[str]):
+    async def _redis_delete(self, filter_str: str, collection_name: Optional[str] = None) -> int:
         """
-        Delete a list of keys from Redis.
+        Delete the chunks matching a query string, found through the index.
+
+        The matching keys are fetched a batch at a time, without their content, and unlinked with one command per
+        batch, until the query matches nothing.
 
         Args:
-            keys (List[str]): List of keys to delete.
+            filter_str (str): RediSearch query string of the chunks to delete.
+            collection_name (Optional[str]): Collection of the chunks.
+
+        Returns:
+            int: Number of keys deleted.
         """
-        # Delete the keys
-        await asyncio.gather(*[self.client.delete(key) for key in keys])
+        index = self.client.ft(self._get_index_name(collection_name))
+        deleted = 0
+        while True:
+            query = RediSearchQuery(filter_str).no_content().paging(0, REDIS_DELETE_BATCH_SIZE).dialect(2)
+            response = await index.search(query)
+            keys = [doc.id for doc in response.docs]
+            if not keys:
+                break
+            # UNLINK frees the memory in the background, the keys leave the index right away
+            await self.client.unlink(*keys)
+            deleted += len(keys)
+            if len(keys) < REDIS_DELETE_BATCH_SIZE:
+                break
+        return deleted
 
     #######
 
-    async def _upsert(self, chunks: Dict[str, List[DocumentChunk]]) -> List[str]:
+    async def _upsert(self, chunks: Dict[str, List[DocumentChunk]], collection_name=None, mode='mpnet') -> List[str]:
         """
         Takes in a list of list of document chunks and inserts them into the database.
         Return a list of document ids.
         """
-        # Initialize a list of ids to return
-        doc_ids: List[str] = []
-
-        # Loop through the dict items
-        for doc_id, chunk_list in chunks.items():
+        storage_type = await self._get_storage_type(collection_name)
 
-            # Append the id to the ids list
-            doc_ids.append(doc_id)
-
-            # Write chunks in a pipelines
+        # Initialize a list of ids to return
+        doc_ids: List[str] = list(chunks.keys())
+
+        # Write the chunks of all the documents in pipelines of at most REDIS_UPSERT_BATCH_SIZE chunks
+        keyed_chunks = [
+            (self._redis_key(collection_name, doc_id, chunk.id), chunk)
+            for doc_id, chunk_list in chunks.items()
+            for chunk in chunk_list
+        ]
+        for i in range(0, len(keyed_chunks), REDIS_UPSERT_BATCH_SIZE):
             async with self.client.pipeline(transaction=False) as pipe:
-                for chunk in chunk_list:
-                    key = self._redis_key(doc_id, chunk.id)
-                    data = self._get_redis_chunk(chunk)
-                    await pipe.json().set(key, "$", data)
+                for key, chunk in keyed_chunks[i : i + REDIS_UPSERT_BATCH_SIZE]:
+                    if storage_type == "hash":
+                        await pipe.hset(key, mapping=self._get_redis_chunk_hash(chunk))
+                    else:
+                        data = self._get_redis_chunk(chunk)
+                        await pipe.json().set(key, "$", data)
                 await pipe.execute()
 
         return doc_ids
@@ -291,100 +580,224 @@ class RedisDataStore(DataStore):
     async def _query(
         self,
         queries: List[QueryWithEmbedding],
+        collection_name=None,
+        mode='mpnet',
+        session_token: Optional[str] = None,
     ) -> List[QueryResult]:
         """
         Takes in a list of queries with embeddings and filters and
         returns a list of query results with matching document chunks and scores.
         """
-        # Prepare query responses and results object
+        storage_type = await self._get_storage_type(collection_name)
+        # The query vectors are encoded like the stored vectors
+        dtype = np.float32 if storage_type == "hash" else np.float64
+
+        # Send all the searches in one pipeline, a single round-trip
+        logging.info(f"Gathering {len(queries)} query results")
+        async with self.client.ft(self._get_index_name(collection_name)).pipeline(transaction=False) as pipe:
+            for query in queries:
+                logging.info(f"Query: {query.query}")
+                embedding = np.array(query.embedding, dtype=dtype).tobytes()
+                await pipe.search(self._get_redis_query(query, storage_type), {"embedding": embedding})
+            responses = await pipe.execute()
+
         results: List[QueryResult] = []
+        for query, response in zip(queries, responses):
+            # The pipeline returns the raw replies, the fields of each document follow its key
+            query_response = Result(response, True)
+            query_results = [self._get_chunk_with_score(doc, storage_type) for doc in query_response.docs]
+            results.append(QueryResult(query=query.query, results=query_results))
+
+        return results
 
-        # Gather query results in a pipeline
-        logging.info(f"Gathering {len(queries)} query results", flush=True)
-        for query in queries:
+    def _get_chunk_with_score(self, doc, storage_type: str) -> DocumentChunkWithScore:
+        """
+        Convert a search result document into a DocumentChunkWithScore.
 
-            logging.info(f"Query: {query.query}")
-            query_results: List[DocumentChunkWithScore] = []
+        Args:
+            doc (Document): Search result, with the fields returned by the query as attributes.
+            storage_type (str): "json" or "hash", the storage type of the searched index.
 
-            # Extract Redis query
-            redis_query: RediSearchQuery = self._get_redis_query(query)
-            embedding = np.array(query.embedding, dtype=np.float64).tobytes()
+        Returns:
+            DocumentChunkWithScore: Chunk with the similarity score of the search.
+        """
+        if storage_type == "hash":
+            # The hash fields are attributes of the document
+            metadata = {
+                field: getattr(doc, field)
+                for field in DocumentChunkMetadata.__fields__
+                if hasattr(doc, field)
+            }
+        else:
+            # Only the metadata object is returned as JSON, not the whole document and its embedding
+            metadata = {
+                field: value
+                for field, value in json.loads(doc.metadata).items()
+                if value != "_null_"
+            }
+        return DocumentChunkWithScore(
+            id=metadata.get("document_id"),
+            # Redis returns the distance of the hit, turned into a similarity so higher is better like the other providers
+            score=1 - float(doc.score),
+            text=doc.text,
+            metadata=metadata,
+        )
 
-            # Perform vector search
-            query_response = await self.client.ft(REDIS_INDEX_NAME).search(
-                redis_query, {"embedding": embedding}
-            )
+    async def convert_json_to_hash(
+        self, collection_name: Optional[str] = None, dim: int = VECTOR_DIMENSION, batch_size: int = 500
+    ) -> int:
+        """
+        Convert the chunks of a collection stored as JSON documents into hashes, in place.
+
+        The JSON index is dropped (without its documents) and replaced by a hash index with the same vector index
+        params first, so the converted keys are indexed as they are written. Converting a collection whose index is already a hash index picks up the
+        JSON keys an interrupted conversion left behind.
+
+        Args:
+            collection_name (Optional[str]): Collection to convert, None for the chunks written without a collection.
+            dim (int): Dimension of the embeddings of the collection.
+            batch_size (int): Number of keys converted per pipeline.
 
-            # Iterate through the most similar documents
-            for doc in query_response.docs:
-                # Load JSON data
-                doc_json = json.loads(doc.json)
-                # Create document chunk object with score
-                result = DocumentChunkWithScore(
-                    id=doc_json["metadata"]["document_id"],
-                    score=doc.score,
-                    text=doc_json["text"],
-                    metadata=doc_json["metadata"]
+        Returns:
+            int: Number of keys converted.
+        """
+        index_name = self._get_index_name(collection_name)
+        prefix = self._get_key_prefix(collection_name)
+        info = await self.client.ft(index_name).info()
+        if (_get_index_key_type(info) or "JSON").lower() == "json":
+            # Keep the index type and HNSW params of the collection, rather than the defaults of the environment
+            index_params = _get_index_params(info)
+            if index_params is None:
+                logging.warning(
+                    f"RediSearch does not report the vector index params of {index_name}, "
+                    "the hash index uses the REDIS_INDEX_TYPE and REDIS_HNSW_* defaults"
+                )
+            logging.info(f"Replacing the JSON index {index_name} with a hash index, vector index params {index_params}")
+            await self.client.ft(index_name).dropindex(delete_documents=False)
+            await self._create_index(index_name, prefix, _get_redisearch_schema(dim, "hash", index_params), "hash")
+        self._storage_types[collection_name] = "hash"
+
+        converted = 0
+        keys = []
+        async for key in self.client.scan_iter(match=f"{prefix}*", count=batch_size, _type="ReJSON-RL"):
+            keys.append(key)
+            if len(keys) >= batch_size:
+                converted += await self._convert_json_keys(keys)
+                keys = []
+        if keys:
+            converted += await self._convert_json_keys(keys)
+        return converted
+
+    async def _convert_json_keys(self, keys: List[str]) -> int:
+        docs = await self.client.json().mget(keys, "$")
+        converted = 0
+        # Each key is replaced atomically, so it is never missing from the index
+        async with self.client.pipeline(transaction=True) as pipe:
+            for key, doc in zip(keys, docs):
+                if not doc:
+                    continue
+                doc = doc[0]
+                pipe.delete(key)
+                pipe.hset(
+                    key,
+                    mapping=self._get_redis_hash(doc["chunk_id"], doc["text"], doc["embedding"], doc["metadata"]),
                 )
-                query_results.append(result)
+                converted += 1
+            await pipe.execute()
+        return converted
 
-            # Add to overall results
-            results.append(QueryResult(query=query.query, results=query_results))
+    async def backfill_document_ids(self, collection_name: Optional[str] = None, batch_size: int = 500) -> int:
+        """
+        Set the top-level document_id of the JSON chunks written before it was stored, so deletes find them.
 
-        return results
+        Args:
+            collection_name (Optional[str]): Collection to backfill, None for the chunks written without a collection.
+            batch_size (int): Number of keys updated per pipeline.
 
-    async def _find_keys(self, pattern: str) -> List[str]:
-        return [key async for key in self.client.scan_iter(pattern)]
+        Returns:
+            int: Number of keys updated.
+        """
+        prefix = self._get_key_prefix(collection_name)
+        updated = 0
+        keys = []
+        async for key in self.client.scan_iter(match=f"{prefix}*", count=batch_size, _type="ReJSON-RL"):
+            keys.append(key)
+            if len(keys) >= batch_size:
+                updated += await self._backfill_document_id_keys(keys)
+                keys = []
+        if keys:
+            updated += await self._backfill_document_id_keys(keys)
+        return updated
+
+    async def _backfill_document_id_keys(self, keys: List[str]) -> int:
+        document_ids = await self.client.json().mget(keys, "$.document_id")
+        metadata_document_ids = await self.client.json().mget(keys, "$.metadata.document_id")
+        updated = 0
+        async with self.client.pipeline(transaction=False) as pipe:
+            for key, document_id, metadata_document_id in zip(keys, document_ids, metadata_document_ids):
+                # Skip the keys deleted since the scan, and the chunks that already have it
+                if document_id is None or document_id:
+                    continue
+                # Like _get_redis_chunk, a chunk without a document id is tagged _null_
+                value = metadata_document_id[0] if metadata_document_id and metadata_document_id[0] else "_null_"
+                await pipe.json().set(key, "$.document_id", value)
+                updated += 1
+            await pipe.execute()
+        return updated
 
     async def delete(
         self,
         ids: Optional[List[str]] = None,
         filter: Optional[DocumentMetadataFilter] = None,
         delete_all: Optional[bool] = None,
+        collection_name: Optional[str] = None,
     ) -> bool:
         """
         Removes vectors by ids, filter, or everything in the datastore.
         Returns whether the operation was successful.
         """
-        # Delete all vectors from the index if delete_all is True
+        # Delete all vectors of the collection if delete_all is True, the index stays
         if delete_all:
             try:
                 logging.info(f"Deleting all documents from index")
-                await self.client.ft(REDIS_INDEX_NAME).dropindex(True)
-                logging.info(f"Deleted all documents successfully")
+                deleted = await self._redis_delete("*", collection_name)
+                logging.info(f"Deleted all {deleted} chunks successfully")
                 return True
             except Exception as e:
                 logging.info(f"Error deleting all documents: {e}")
                 raise e
 
-        # Delete by filter
+        # Delete by filter, through the index
         if filter:
-            # TODO - extend this to work with other metadata filters?
-            if filter.document_id:
+            filter_str = self._get_redis_filter(filter)
+            # An empty filter matches every chunk, it is not a delete all
+            if filter_str != "*":
                 try:
-                    keys = await self._find_keys(
-                        f"{REDIS_DOC_PREFIX}:{filter.document_id}:*"
-                    )
-                    await self._redis_delete(keys)
-                    logging.info(f"Deleted document {filter.document_id} successfully")
+                    deleted = await self._redis_delete(filter_str, collection_name)
+                    logging.info(f"Deleted {deleted} chunks matching {filter_str}")
                 except Exception as e:
-                    logging.info(f"Error deleting document {filter.document_id}: {e}")
+                    logging.info(f"Error deleting by filter {filter_str}: {e}")
                     raise e
 
-        # Delete by explicit ids (Redis keys)
+        # Delete by explicit ids, the document ids of the chunks
         if ids:
             try:
                 logging.info(f"Deleting document ids {ids}")
-                keys = []
-                # find all keys associated with the document ids
-                for document_id in ids:
-                    doc_keys = await self._find_keys(
-                        pattern=f"{REDIS_DOC_PREFIX}:{document_id}:*"
-                    )
-                    keys.extend(doc_keys)
-                # delete all keys
-                logging.info(f"Deleting {len(keys)} keys from Redis")
-                await self._redis_delete(keys)
+                # One query per batch of document ids, matching any of them
+                batches = [
+                    ids[i : i + REDIS_DELETE_IDS_PER_QUERY]
+                    for i in range(0, len(ids), REDIS_DELETE_IDS_PER_QUERY)
+                ]
+                deleted = await asyncio.gather(
+                    *[
+                        self._redis_delete(
+                            "@document_id:{" + " | ".join(self._escape(document_id) for document_id in batch) + "}",
+                            collection_name,
+                        )
+                        for batch in batches
+                    ]
+                )
+                logging.info(f"Deleted {sum(deleted)} keys from Redis")
             except Exception as e:
                 logging.info(f"Error deleting ids: {e}")
                 raise e
@@ -1,5 +1,5 @@
 # TODO
-import asyncio
+import threading
 from typing import Dict, List, Optional
 from loguru import logger
 from weaviate import Client
@@ -9,7 +9,7 @@ import uuid
 
 from weaviate.util import generate_uuid5
 
-from datastore.datastore import DataStore
+from datastore.datastore import DataStore, DATASTORE_IO_WORKERS
 from models.models import (
     DocumentChunk,
     DocumentChunkMetadata,
@@ -32,6 +32,8 @@ WEAVIATE_BATCH_SIZE = int(os.environ.get("WEAVIATE_BATCH_SIZE", 20))
 WEAVIATE_BATCH_DYNAMIC = os.environ.get("WEAVIATE_BATCH_DYNAMIC", False)
 WEAVIATE_BATCH_TIMEOUT_RETRIES = int(os.environ.get("WEAVIATE_TIMEOUT_RETRIES", 3))
 WEAVIATE_BATCH_NUM_WORKERS = int(os.environ.get("WEAVIATE_BATCH_NUM_WORKERS", 1))
+# The number of threads running the blocking Weaviate client calls
+WEAVIATE_IO_WORKERS = int(os.environ.get("WEAVIATE_IO_WORKERS", DATASTORE_IO_WORKERS))
 
 SCHEMA = {
     "class": WEAVIATE_INDEX,
@@ -88,6 +90,8 @@ def extract_schema_properties(schema):
 
 
 class WeaviateDataStore(DataStore):
+    io_workers = WEAVIATE_IO_WORKERS
+
     def handle_errors(self, results: Optional[List[dict]]) -> List[str]:
         if not self or not results:
             return []
@@ -108,6 +112,8 @@ class WeaviateDataStore(DataStore):
 
     def __init__(self):
         auth_credentials = self._build_auth_credentials()
+        # The client batch is shared, upserts running in the I/O threads take turns filling it
+        self._batch_lock = threading.Lock()
 
         url = f"{WEAVIATE_HOST}:{WEAVIATE_PORT}"
 
@@ -152,9 +158,12 @@ class WeaviateDataStore(DataStore):
         Takes in a list of list of document chunks and inserts them into the database.
         Return a list of document ids.
         """
+        return await self._run_io(self._batch_upsert, chunks)
+
+    def _batch_upsert(self, chunks: Dict[str, List[DocumentChunk]]) -> List[str]:
         doc_ids = []
 
-        with self.client.batch as batch:
+        with self._batch_lock, self.client.batch as batch:
             for doc_id, doc_chunks in chunks.items():
                 logger.debug(f"Upserting {doc_id} with {len(doc_chunks)} chunks")
                 for doc_chunk in doc_chunks:
@@ -192,75 +201,73 @@ class WeaviateDataStore(DataStore):
     ) -> List[QueryResult]:
         """
         Takes in a list of queries with embeddings and filters and returns a list of query results with matching document chunks and scores.
-        """
 
-        async def _single_query(query: QueryWithEmbedding) -> QueryResult:
+        All the queries are sent in one GraphQL request, each under its own alias.
+        """
+        # A request without any query would be an empty, invalid Get
+        if not queries:
+            return []
+        for query in queries:
             logger.debug(f"Query: {query.query}")
-            if not hasattr(query, "filter") or not query.filter:
-                result = (
-                    self.client.query.get(
-                        WEAVIATE_INDEX,
-                        [
-                            "chunk_id",
-                            "document_id",
-                            "text",
-                            "source",
-                            "source_id",
-                            "url",
-                            "created_at",
-                            "author",
-                        ],
-                    )
-                    .with_hybrid(query=query.query, alpha=0.5, vector=query.embedding)
-                    .with_limit(query.top_k)  # type: ignore
-                    .with_additional(["score", "vector"])
-                    .do()
-                )
-            else:
-                filters_ = self.build_filters(query.filter)
-                result = (
-                    self.client.query.get(
-                        WEAVIATE_INDEX,
-                        [
-                            "chunk_id",
-                            "document_id",
-                            "text",
-                            "source",
-                            "source_id",
-                            "url",
-                            "created_at",
-                            "author",
-                        ],
-                    )
-                    .with_hybrid(query=query.query, alpha=0.5, vector=query.embedding)
-                    .with_where(filters_)
-                    .with_limit(query.top_k)  # type: ignore
-                    .with_additional(["score", "vector"])
-                    .do()
-                )
-
-            query_results: List[DocumentChunkWithScore] = []
-            response = result["data"]["Get"][WEAVIATE_INDEX]
-
-            for resp in response:
-                result = DocumentChunkWithScore(
-                    id=resp["chunk_id"],
-                    text=resp["text"],
-                    embedding=resp["_additional"]["vector"],
-                    score=resp["_additional"]["score"],
-                    metadata=DocumentChunkMetadata(
-                        document_id=resp["document_id"] if resp["document_id"] else "",
-                        source=Source(resp["source"]),
-                        source_id=resp["source_id"],
-                        url=resp["url"],
-                        created_at=resp["created_at"],
-                        author=resp["author"],
-                    ),
+        builders = [
+            self._get_query_builder(query).with_alias(f"query_{i}")
+            for i, query in enumerate(queries)
+        ]
+        result = await self._run_io(self.client.query.multi_get(builders).do)
+        if "errors" in result:
+            raise Exception(f"Error querying index {WEAVIATE_INDEX}: {result['errors']}")
+
+        query_results: List[QueryResult] = []
+        for i, query in enumerate(queries):
+            response = result["data"]["Get"][f"query_{i}"]
+            query_results.append(
+                QueryResult(
+                    query=query.query,
+                    results=[self._get_chunk_with_score(resp) for resp in response],
                 )
-                query_results.append(result)
-            return QueryResult(query=query.query, results=query_results)
+            )
+        return query_results
+
+    def _get_query_builder(self, query: QueryWithEmbedding):
+        builder = (
+            self.client.query.get(
+                WEAVIATE_INDEX,
+                [
+                    "chunk_id",
+                    "document_id",
+                    "text",
+                    "source",
+                    "source_id",
+                    "url",
+                    "created_at",
+                    "author",
+                ],
+            )
+            .with_hybrid(query=query.query, alpha=0.5, vector=query.embedding)
+            .with_limit(query.top_k)  # type: ignore
+        )
+        if hasattr(query, "filter") and query.filter:
+            builder = builder.with_where(self.build_filters(query.filter))
+        # The vectors of the results are only fetched when asked for, each is as large as the rest of the result
+        additional = ["score", "vector"] if query.include_embedding else ["score"]
+        return builder.with_additional(additional)
 
-        return await asyncio.gather(*[_single_query(query) for query in queries])
+    @staticmethod
+    def _get_chunk_with_score(resp: dict) -> DocumentChunkWithScore:
+        return DocumentChunkWithScore(
+            id=resp["chunk_id"],
+            text=resp["text"],
+            embedding=resp["_additional"].get("vector"),
+            score=resp["_additional"]["score"],
+            metadata=DocumentChunkMetadata(
+                document_id=resp["document_id"] if resp["document_id"] else "",
+                source=Source(resp["source"]),
+                source_id=resp["source_id"],
+                url=resp["url"],
+                created_at=resp["created_at"],
+                author=resp["author"],
+            ),
+        )
 
     async def delete(
         self,
@@ -275,7 +282,7 @@ class WeaviateDataStore(DataStore):
         """
         if delete_all:
             logger.debug(f"Deleting all vectors in index {WEAVIATE_INDEX}")
-            self.client.schema.delete_all()
+            await self._run_io(self.client.schema.delete_all)
             return True
 
         if ids:
@@ -287,8 +294,11 @@ class WeaviateDataStore(DataStore):
             where_clause = {"operator": "Or", "operands": operands}
 
             logger.debug(f"Deleting vectors from index {WEAVIATE_INDEX} with ids {ids}")
-            result = self.client.batch.delete_objects(
-                class_name=WEAVIATE_INDEX, where=where_clause, output="verbose"
+            result = await self._run_io(
+                self.client.batch.delete_objects,
+                class_name=WEAVIATE_INDEX,
+                where=where_clause,
+                output="verbose",
             )
 
             if not bool(result["results"]["successful"]):
@@ -302,8 +312,8 @@ class WeaviateDataStore(DataStore):
             logger.debug(
                 f"Deleting vectors from index {WEAVIATE_INDEX} with filter {where_clause}"
             )
-            result = self.client.batch.delete_objects(
-                class_name=WEAVIATE_INDEX, where=where_clause
+            result = await self._run_io(
+                self.client.batch.delete_objects, class_name=WEAVIATE_INDEX, where=where_clause
             )
 
             if not bool(result["results"]["successful"]):
@@ -3,11 +3,12 @@ from models.models import (
     DocumentMetadataFilter,
     Query,
     QueryResult,
+    MultiCollectionQueryResult,
     ActiveCollection,
     Collection,
 )
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 
 
 class UpsertRequest(BaseModel):
@@ -17,17 +18,30 @@ class UpsertRequest(BaseModel):
 
 class UpsertResponse(BaseModel):
     ids: List[str]
+    session_token: Optional[str] = None  # pass to /query to see these writes
 
 
 class QueryRequest(BaseModel):
     collection_name: str
     queries: List[Query]
+    session_token: Optional[str] = None  # from /upsert, for read-your-writes
 
 
 class QueryResponse(BaseModel):
     results: List[QueryResult]
 
 
+class MultiCollectionQueryRequest(BaseModel):
+    queries: List[Query]
+    collection_names: Optional[List[str]] = None  # defaults to all active collections
+    timeout: Optional[float] = None  # seconds to wait for each collection
+
+
+class MultiCollectionQueryResponse(BaseModel):
+    results: List[MultiCollectionQueryResult]
+    failed_collections: List[str] = []
+
+
 class DeleteRequest(BaseModel):
     collection_name: Optional[str] = None
     ids: Optional[List[str]] = None
@@ -49,6 +63,8 @@ class CreateCollectionRequest(BaseModel):
     overview: Optional[str] = None
     description: Optional[str] = None
     is_active: Optional[bool] = True
+    bulk_load: Optional[bool] = False  # create without indexes until /finish-bulk-load
+    index_params: Optional[Dict[str, Any]] = None  # HNSW overrides, e.g. {"M": 32, "EF_CONSTRUCTION": 200}
 
 
 class UpdateCollectionRequest(BaseModel):
@@ -73,3 +89,18 @@ class GetActiveCollectionsResponse(BaseModel):
 
 class GetAllCollectionsResponse(BaseModel):
     collections: List[Collection]
+
+
+class CollectionMetricsResponse(BaseModel):
+    metrics: Dict[str, Dict[str, Any]]
+
+
+class BulkLoadRequest(BaseModel):
+    collection_name: str
+
+
+class BulkLoadStatusResponse(BaseModel):
+    state: str
+    total_rows: int
+    indexed_rows: int
+    error: Optional[str] = None
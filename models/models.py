@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 from enum import Enum
 
 
@@ -55,6 +55,8 @@ class Query(BaseModel):
     query: str
     filter: Optional[DocumentMetadataFilter] = None
     top_k: Optional[int] = 3
+    search_params: Optional[Dict[str, Any]] = None  # provider search knobs, e.g. {"hnsw_ef": 128} on Qdrant
+    include_embedding: Optional[bool] = False  # return the embeddings of the results, Weaviate only
 
 
 class QueryWithEmbedding(Query):
@@ -66,6 +68,16 @@ class QueryResult(BaseModel):
     results: List[DocumentChunkWithScore]
 
 
+class DocumentChunkWithCollection(DocumentChunkWithScore):
+    collection_name: str
+
+
+class MultiCollectionQueryResult(BaseModel):
+    query: str
+    embedding_method: str  # the results of collections with different embedding methods are ranked apart
+    results: List[DocumentChunkWithCollection]
+
+
 class ActiveCollection(BaseModel):
     collection_name: str
     overview: Optional[str]
@@ -0,0 +1,63 @@
+import argparse
+import asyncio
+import time
+import uuid
+
+from pymilvus import utility
+
+from datastore.providers.milvus_datastore import EMBEDDING_FIELD, MilvusDataStore
+from scripts.benchmarks.milvus_scalar_indexes import build_chunks
+
+
+async def load(datastore: MilvusDataStore, collection_name: str, documents, bulk_load: bool, batch_size: int) -> float:
+    start = time.perf_counter()
+    await datastore.create_collection(collection_name, "mpnet", create_new=True, bulk_load=bulk_load)
+    document_ids = list(documents)
+    for i in range(0, len(document_ids), batch_size):
+        batch = {document_id: documents[document_id] for document_id in document_ids[i : i + batch_size]}
+        # What DataStore.upsert does with the chunks of a batch of documents
+        await datastore.delete(ids=list(batch), collection_name=collection_name)
+        await datastore._upsert(batch, collection_name=collection_name, mode="mpnet")
+    if bulk_load:
+        await datastore.finish_bulk_load(collection_name)
+        while (await datastore.get_bulk_load_status(collection_name))["state"] != "ready":
+            await asyncio.sleep(0.1)
+    else:
+        # Wait until the rows are flushed and indexed, like the end of a bulk load
+        col = datastore._get_collection(collection_name)
+        col.flush()
+        utility.wait_for_index_building_complete(collection_name, index_name=EMBEDDING_FIELD, using=datastore.alias)
+        datastore._collections.acquire(collection_name)
+        datastore._collections.done(collection_name)
+    return time.perf_counter() - start
+
+
+async def run(args):
+    datastore = MilvusDataStore()
+    documents = build_chunks(args.documents, args.chunks_per_document)
+    suffix = uuid.uuid4().hex[:8]
+    collection_names = [f"bench_upsert_{suffix}", f"bench_bulk_{suffix}"]
+    try:
+        print(f"{args.documents} documents of {args.chunks_per_document} chunks, upserted {args.batch_size} documents at a time")
+        upsert = await load(datastore, collection_names[0], documents, False, args.batch_size)
+        print(f"indexed collection:   {upsert:8.2f}s")
+        bulk = await load(datastore, collection_names[1], documents, True, args.batch_size)
+        print(f"bulk load collection: {bulk:8.2f}s ({upsert / bulk:.1f}x)")
+    finally:
+        for collection_name in collection_names:
+            await datastore.delete_collection(collection_name)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare loading a corpus into an indexed Milvus collection with a bulk load, whose indexes are built once at the end."
+    )
+    parser.add_argument("--documents", type=int, default=20000, help="Number of documents to insert")
+    parser.add_argument("--chunks-per-document", type=int, default=5, help="Number of chunks per document")
+    parser.add_argument("--batch-size", type=int, default=100, help="Number of documents per upsert")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
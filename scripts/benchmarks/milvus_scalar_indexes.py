@@ -0,0 +1,135 @@
+import argparse
+import asyncio
+import random
+import statistics
+import time
+import uuid
+
+from datastore.providers.milvus_datastore import (
+    MilvusDataStore,
+    OUTPUT_DIM_MPNET,
+    SCALAR_INDEX_FIELDS,
+)
+from models.models import (
+    DocumentChunk,
+    DocumentChunkMetadata,
+    DocumentMetadataFilter,
+    QueryWithEmbedding,
+    Source,
+)
+
+AUTHORS = [f"author_{i}" for i in range(50)]
+
+
+def build_chunks(num_documents: int, chunks_per_document: int):
+    chunks = {}
+    for d in range(num_documents):
+        document_id = f"doc_{d}"
+        chunks[document_id] = [
+            DocumentChunk(
+                id=f"{document_id}_{c}",
+                text="lorem ipsum dolor sit amet",
+                metadata=DocumentChunkMetadata(
+                    document_id=document_id,
+                    source=random.choice(list(Source)),
+                    source_id=f"source_{d % 100}",
+                    author=random.choice(AUTHORS),
+                    created_at=f"2023-{random.randint(1, 12):02d}-{random.randint(1, 28):02d}T12:00:00",
+                ),
+                embedding=[random.random() for _ in range(OUTPUT_DIM_MPNET)],
+            )
+            for c in range(chunks_per_document)
+        ]
+    return chunks
+
+
+def build_queries(num_queries: int, num_documents: int):
+    filters = [
+        lambda: DocumentMetadataFilter(document_id=f"doc_{random.randrange(num_documents)}"),
+        lambda: DocumentMetadataFilter(author=random.choice(AUTHORS), source=random.choice(list(Source))),
+        lambda: DocumentMetadataFilter(start_date="2023-03-01T00:00:00", end_date="2023-03-15T00:00:00"),
+    ]
+    return [
+        QueryWithEmbedding(
+            query="benchmark query",
+            embedding=[random.random() for _ in range(OUTPUT_DIM_MPNET)],
+            filter=random.choice(filters)(),
+            top_k=10,
+        )
+        for _ in range(num_queries)
+    ]
+
+
+async def create_collection(datastore: MilvusDataStore, collection_name: str, scalar_indexes: bool, chunks):
+    await datastore.create_collection(collection_name, "mpnet", create_new=True)
+    col = datastore._get_collection(collection_name)
+    if not scalar_indexes:
+        for field in SCALAR_INDEX_FIELDS:
+            col.drop_index(index_name=field + "_idx")
+    await datastore._upsert(chunks, collection_name=collection_name, mode="mpnet")
+    col.flush()
+
+
+async def time_queries(datastore: MilvusDataStore, collection_name: str, queries, num_documents: int):
+    col = datastore._collections.acquire(collection_name)
+    search_latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        await datastore._query([query], collection_name=collection_name, mode="mpnet")
+        search_latencies.append(time.perf_counter() - start)
+    # The lookup a delete by document ids does
+    lookup_latencies = []
+    for _ in range(len(queries)):
+        ids = ",".join(f'"doc_{random.randrange(num_documents)}"' for _ in range(20))
+        start = time.perf_counter()
+        col.query(f"document_id in [{ids}]", output_fields=["id"])
+        lookup_latencies.append(time.perf_counter() - start)
+    datastore._collections.done(collection_name)
+    return search_latencies, lookup_latencies
+
+
+def report(name: str, latencies):
+    latencies = sorted(latencies)
+    p50 = statistics.median(latencies) * 1000
+    p95 = latencies[int(len(latencies) * 0.95) - 1] * 1000
+    print(f"{name:44s} p50 {p50:7.2f}ms  p95 {p95:7.2f}ms")
+
+
+async def run(args):
+    # Bounded consistency, so the latencies do not include waiting for the Strong consistency timestamp
+    datastore = MilvusDataStore(consistency_level="Bounded")
+    chunks = build_chunks(args.documents, args.chunks_per_document)
+    queries = build_queries(args.queries, args.documents)
+    suffix = uuid.uuid4().hex[:8]
+    collections = {
+        "without scalar indexes": (f"bench_plain_{suffix}", False),
+        "with scalar indexes": (f"bench_indexed_{suffix}", True),
+    }
+    try:
+        for collection_name, scalar_indexes in collections.values():
+            await create_collection(datastore, collection_name, scalar_indexes, chunks)
+        print(f"{args.documents * args.chunks_per_document} entities, {args.queries} filtered searches")
+        for name, (collection_name, _) in collections.items():
+            search_latencies, lookup_latencies = await time_queries(
+                datastore, collection_name, queries, args.documents
+            )
+            report(f"filtered search, {name}", search_latencies)
+            report(f"document_id lookup, {name}", lookup_latencies)
+    finally:
+        for collection_name, _ in collections.values():
+            await datastore.delete_collection(collection_name)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare filtered-search and document_id lookup latency on Milvus collections with and without scalar indexes on the filter fields."
+    )
+    parser.add_argument("--documents", type=int, default=20000, help="Number of documents to insert")
+    parser.add_argument("--chunks-per-document", type=int, default=5, help="Number of chunks per document")
+    parser.add_argument("--queries", type=int, default=200, help="Number of filtered searches to time")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
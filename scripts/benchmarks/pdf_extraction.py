@@ -0,0 +1,110 @@
+import argparse
+import os
+import random
+import tempfile
+import time
+from typing import List
+
+from PyPDF2 import PdfReader
+
+from services import extraction_cache
+from services.chunks import get_text_chunks, get_text_chunks_from_segments
+from services.extraction_cache import ExtractionCache
+from services.file import extract_text_segments_from_file
+
+WORDS = "lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor incididunt ut labore".split()
+
+
+def write_sample_pdf(filepath: str, num_pages: int, lines_per_page: int = 45):
+    """Write a text-only PDF with num_pages pages of random sentences."""
+    random.seed(0)
+    objects: List[bytes] = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"",  # the page tree, filled in once the page object numbers are known
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    page_numbers = []
+    for _ in range(num_pages):
+        lines = []
+        for _ in range(lines_per_page):
+            sentence = " ".join(random.choice(WORDS) for _ in range(12)).capitalize() + "."
+            lines.append(f"({sentence}) Tj T*")
+        stream = ("BT /F1 10 Tf 12 TL 50 760 Td " + " ".join(lines) + " ET").encode()
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        content_number = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>"
+            % content_number
+        )
+        page_numbers.append(len(objects))
+    kids = " ".join(f"{number} 0 R" for number in page_numbers).encode()
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, num_pages)
+
+    with open(filepath, "wb") as f:
+        f.write(b"%PDF-1.4\n")
+        offsets = []
+        for number, obj in enumerate(objects, start=1):
+            offsets.append(f.tell())
+            f.write(b"%d 0 obj\n" % number + obj + b"\nendobj\n")
+        xref_offset = f.tell()
+        f.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+        for offset in offsets:
+            f.write(b"%010d 00000 n \n" % offset)
+        f.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref_offset))
+
+
+def serial(filepath: str) -> List[str]:
+    # What extract_text_from_file used to do: extract every page in order, join them, then chunk
+    with open(filepath, "rb") as f:
+        reader = PdfReader(f)
+        text = " ".join([page.extract_text() for page in reader.pages])
+    return get_text_chunks(text, None)
+
+
+def streamed(filepath: str) -> List[str]:
+    with open(filepath, "rb") as f:
+        return get_text_chunks_from_segments(
+            extract_text_segments_from_file(f, "application/pdf"), None
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num_pages", default=300, type=int, help="Number of pages of the generated PDF")
+    args = parser.parse_args()
+
+    # Parse the PDF on every run, a cached text would skip the extraction being timed
+    extraction_cache.EXTRACTION_CACHE_MAX_BYTES = 0
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        filepath = os.path.join(tmpdir, "sample.pdf")
+        write_sample_pdf(filepath, args.num_pages)
+        print(f"Generated a {args.num_pages} page PDF of {os.path.getsize(filepath) / 1024:.0f} KiB")
+
+        # Start the worker processes outside of the timed run
+        streamed(filepath)
+
+        start = time.perf_counter()
+        serial_chunks = serial(filepath)
+        serial_time = time.perf_counter() - start
+        print(f"serial extract, join, chunk      {serial_time:8.2f} s  {len(serial_chunks)} chunks")
+
+        start = time.perf_counter()
+        streamed_chunks = streamed(filepath)
+        streamed_time = time.perf_counter() - start
+        print(f"parallel pages streamed to chunk {streamed_time:8.2f} s  {len(streamed_chunks)} chunks")
+        print(f"speedup: {serial_time / streamed_time:.1f}x")
+
+        # The same file again with the extraction cache enabled, in its own directory: one miss, then a hit
+        cache_size = 256 * 1024 * 1024
+        extraction_cache.EXTRACTION_CACHE_MAX_BYTES = cache_size
+        extraction_cache._extraction_cache = ExtractionCache(os.path.join(tmpdir, "extraction_cache"), cache_size)
+        streamed(filepath)
+        start = time.perf_counter()
+        cached_chunks = streamed(filepath)
+        cached_time = time.perf_counter() - start
+        print(f"extraction cache hit, chunk      {cached_time:8.2f} s  {len(cached_chunks)} chunks")
+
+
+if __name__ == "__main__":
+    main()
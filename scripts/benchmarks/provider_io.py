@@ -0,0 +1,68 @@
+import argparse
+import asyncio
+import time
+
+from datastore.datastore import DATASTORE_IO_WORKERS
+from datastore.providers.qdrant_datastore import QDRANT_PROFILE, QdrantDataStore
+from models.models import QueryWithEmbedding
+
+
+class SlowQdrantClient:
+    """A stand-in for the synchronous Qdrant client that sleeps for a network round-trip per call."""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    def search_batch(self, collection_name, requests):
+        time.sleep(self.latency)
+        return [[] for _ in requests]
+
+
+class InlineQdrantDataStore(QdrantDataStore):
+    """The previous behaviour: the blocking client calls run on the event loop."""
+
+    async def _run_io(self, fn, *args, **kwargs):
+        return fn(*args, **kwargs)
+
+
+def build_datastore(cls, latency: float, io_workers: int) -> QdrantDataStore:
+    # Skip __init__, it connects to Qdrant and sets up the collection
+    datastore = cls.__new__(cls)
+    datastore.client = SlowQdrantClient(latency)
+    datastore.collection_name = "benchmark"
+    datastore.profile = QDRANT_PROFILE
+    datastore._collection_configs = {"benchmark": {"vector_size": 1536, "quantized": False}}
+    datastore.io_workers = io_workers
+    return datastore
+
+
+async def run_requests(datastore: QdrantDataStore, num_requests: int, dim: int) -> float:
+    queries = [QueryWithEmbedding(query="benchmark query", embedding=[0.1] * dim, top_k=3)]
+    start = time.perf_counter()
+    await asyncio.gather(*[datastore._query(queries) for _ in range(num_requests)])
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare concurrent datastore queries with the blocking client calls on the event loop and in the provider I/O thread pool."
+    )
+    parser.add_argument("--requests", type=int, default=64, help="Number of concurrent query requests")
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds of injected latency per client call")
+    parser.add_argument("--io-workers", type=int, default=DATASTORE_IO_WORKERS, help="Width of the I/O thread pool")
+    parser.add_argument("--dim", type=int, default=1536, help="Dimension of the query embeddings")
+    args = parser.parse_args()
+
+    print(f"{args.requests} concurrent queries, {args.latency * 1000:.0f}ms per client call")
+    inline = asyncio.run(
+        run_requests(build_datastore(InlineQdrantDataStore, args.latency, args.io_workers), args.requests, args.dim)
+    )
+    print(f"blocking calls on the event loop: {inline * 1000:8.1f}ms")
+    pooled = asyncio.run(
+        run_requests(build_datastore(QdrantDataStore, args.latency, args.io_workers), args.requests, args.dim)
+    )
+    print(f"I/O thread pool ({args.io_workers} workers):  {pooled * 1000:8.1f}ms ({inline / pooled:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+import argparse
+import asyncio
+import time
+import uuid
+
+from datastore.providers.qdrant_datastore import PAYLOAD_INDEXES, QdrantDataStore
+from datastore.providers.milvus_datastore import OUTPUT_DIM_MPNET
+from scripts.benchmarks.milvus_scalar_indexes import build_chunks, build_queries, report
+from scripts.benchmarks.qdrant_upsert import build_datastore
+
+
+async def time_queries(datastore: QdrantDataStore, queries):
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        await datastore._query([query])
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+async def run(args, datastores):
+    chunks = build_chunks(args.documents, args.chunks_per_document)
+    queries = build_queries(args.queries, args.documents)
+    for datastore in datastores.values():
+        await datastore._upsert(chunks)
+    print(f"{args.documents * args.chunks_per_document} points, {args.queries} filtered searches")
+    for name, datastore in datastores.items():
+        report(f"filtered search, {name}", await time_queries(datastore, queries))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare filtered-search latency on Qdrant collections with and without payload indexes on the filter fields."
+    )
+    parser.add_argument("--location", default="http://localhost", help="URL of a running Qdrant")
+    parser.add_argument("--documents", type=int, default=20000, help="Number of documents to insert")
+    parser.add_argument("--chunks-per-document", type=int, default=5, help="Number of chunks per document")
+    parser.add_argument("--queries", type=int, default=200, help="Number of filtered searches to time")
+    args = parser.parse_args()
+
+    suffix = uuid.uuid4().hex[:8]
+    datastores = {
+        "without payload indexes": build_datastore(args.location, f"bench_plain_{suffix}", OUTPUT_DIM_MPNET),
+        "with payload indexes": build_datastore(args.location, f"bench_indexed_{suffix}", OUTPUT_DIM_MPNET),
+    }
+    plain = datastores["without payload indexes"]
+    for field_name in PAYLOAD_INDEXES:
+        plain.client.delete_payload_index(plain.collection_name, field_name)
+    try:
+        asyncio.run(run(args, datastores))
+    finally:
+        for datastore in datastores.values():
+            datastore.client.delete_collection(datastore.collection_name)
+
+
+if __name__ == "__main__":
+    main()
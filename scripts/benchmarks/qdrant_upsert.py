@@ -0,0 +1,155 @@
+import argparse
+import asyncio
+import random
+import time
+import uuid
+
+import qdrant_client
+from qdrant_client.conversions.conversion import RestToGrpc
+from qdrant_client.http import models as rest
+
+from datastore.providers.qdrant_datastore import (
+    QDRANT_API_KEY,
+    QDRANT_GRPC_PORT,
+    QDRANT_PORT,
+    QDRANT_PROFILE,
+    QdrantDataStore,
+)
+from models.models import DocumentChunk, DocumentChunkMetadata
+
+
+def build_chunks(num_documents: int, chunks_per_document: int, dim: int):
+    return {
+        f"doc_{d}": [
+            DocumentChunk(
+                id=f"doc_{d}_{c}",
+                text="lorem ipsum dolor sit amet " * 40,
+                metadata=DocumentChunkMetadata(document_id=f"doc_{d}", source_id=f"source_{d % 100}"),
+                embedding=[random.random() for _ in range(dim)],
+            )
+            for c in range(chunks_per_document)
+        ]
+        for d in range(num_documents)
+    }
+
+
+def build_datastore(location: str, collection_name: str, dim: int) -> QdrantDataStore:
+    # Skip __init__, it connects to the configured Qdrant and sets up QDRANT_COLLECTION
+    datastore = QdrantDataStore.__new__(QdrantDataStore)
+    if location == ":memory:":
+        # The local mode takes the REST models, not gRPC messages
+        datastore.client = qdrant_client.QdrantClient(location)
+        datastore.async_client = qdrant_client.AsyncQdrantClient(location)
+        datastore._grpc_points = False
+    else:
+        connection = dict(
+            url=location,
+            port=int(QDRANT_PORT),
+            grpc_port=int(QDRANT_GRPC_PORT),
+            api_key=QDRANT_API_KEY,
+            prefer_grpc=True,
+            timeout=60,
+        )
+        datastore.client = qdrant_client.QdrantClient(**connection)
+        datastore.async_client = qdrant_client.AsyncQdrantClient(**connection)
+        datastore._grpc_points = True
+    datastore.collection_name = collection_name
+    datastore.distance = rest.Distance.COSINE
+    datastore.profile = QDRANT_PROFILE
+    datastore._collection_configs = {}
+    datastore._recreate_collection(collection_name, dim)
+    if location == ":memory:":
+        # Each local client keeps its own collections
+        asyncio.run(
+            datastore.async_client.create_collection(
+                collection_name, vectors_config=rest.VectorParams(size=dim, distance=rest.Distance.COSINE)
+            )
+        )
+    return datastore
+
+
+def upsert_single_request(datastore: QdrantDataStore, chunks) -> float:
+    # The previous behaviour: every point in one blocking request, waiting for it to be applied
+    start = time.perf_counter()
+    points = [
+        rest.PointStruct(
+            id=datastore._create_document_chunk_id(chunk.id),
+            vector=chunk.embedding,
+            payload=datastore._get_payload(chunk),
+        )
+        for chunk_list in chunks.values()
+        for chunk in chunk_list
+    ]
+    datastore.client.upsert(collection_name=datastore.collection_name, points=points, wait=True)
+    return time.perf_counter() - start
+
+
+def build_points(datastore: QdrantDataStore, chunks) -> float:
+    # The client side of a gRPC upsert: REST models converted to gRPC messages, or messages built from NumPy arrays
+    flat_chunks = [chunk for chunk_list in chunks.values() for chunk in chunk_list]
+    start = time.perf_counter()
+    if datastore._grpc_points:
+        datastore._convert_document_chunks_to_points(flat_chunks)
+    else:
+        for chunk in flat_chunks:
+            RestToGrpc.convert_point_struct(
+                rest.PointStruct(
+                    id=datastore._create_document_chunk_id(chunk.id),
+                    vector=chunk.embedding,
+                    payload=datastore._get_payload(chunk),
+                )
+            )
+    return time.perf_counter() - start
+
+
+async def upsert_batched(datastore: QdrantDataStore, chunks) -> float:
+    start = time.perf_counter()
+    await datastore._upsert(chunks)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare upserting chunks into Qdrant in one blocking request with the batched, concurrent async upserts."
+    )
+    parser.add_argument(
+        "--location",
+        default=":memory:",
+        help="URL of a running Qdrant, or :memory: for the in-process local mode of the client",
+    )
+    parser.add_argument("--documents", type=int, default=200, help="Number of documents per upsert")
+    parser.add_argument("--chunks-per-document", type=int, default=10, help="Number of chunks per document")
+    parser.add_argument("--dim", type=int, default=1536, help="Dimension of the embeddings")
+    args = parser.parse_args()
+
+    chunks = build_chunks(args.documents, args.chunks_per_document, args.dim)
+    num_points = args.documents * args.chunks_per_document
+    suffix = uuid.uuid4().hex[:8]
+    single = build_datastore(args.location, f"bench_single_{suffix}", args.dim)
+    batched = build_datastore(args.location, f"bench_batched_{suffix}", args.dim)
+    try:
+        print(f"{num_points} points of {args.dim} dimensions into {args.location}")
+        single_time = upsert_single_request(single, chunks)
+        print(f"one blocking request:     {single_time:8.2f}s ({num_points / single_time:8.0f} points/s)")
+        batched_time = asyncio.run(upsert_batched(batched, chunks))
+        print(
+            f"batched async upserts:    {batched_time:8.2f}s ({num_points / batched_time:8.0f} points/s, "
+            f"{single_time / batched_time:.1f}x)"
+        )
+
+        # Building the gRPC points, which the local mode skips
+        grpc_points = batched._grpc_points
+        batched._grpc_points = False
+        rest_build_time = build_points(batched, chunks)
+        batched._grpc_points = True
+        grpc_build_time = build_points(batched, chunks)
+        batched._grpc_points = grpc_points
+        print(f"gRPC points from REST models: {rest_build_time:8.2f}s")
+        print(f"gRPC points from NumPy:       {grpc_build_time:8.2f}s ({rest_build_time / grpc_build_time:.1f}x)")
+    finally:
+        for datastore in (single, batched):
+            datastore.client.delete_collection(datastore.collection_name)
+
+
+if __name__ == "__main__":
+    main()
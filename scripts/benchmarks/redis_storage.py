@@ -0,0 +1,110 @@
+import argparse
+import asyncio
+import random
+import statistics
+import time
+import uuid
+
+import numpy as np
+import redis.asyncio as redis
+from redis.commands.search.indexDefinition import IndexDefinition, IndexType
+
+from datastore.providers.redis_datastore import (
+    REDIS_HOST,
+    REDIS_PASSWORD,
+    REDIS_PORT,
+    RedisDataStore,
+    _get_redisearch_schema,
+    unpack_schema,
+)
+from models.models import DocumentChunk, DocumentChunkMetadata, QueryWithEmbedding, Source
+
+
+def build_chunks(num_chunks: int, dim: int):
+    return [
+        DocumentChunk(
+            id=f"chunk_{i}",
+            text="lorem ipsum dolor sit amet " * 40,
+            metadata=DocumentChunkMetadata(
+                document_id=f"doc_{i // 5}",
+                source=random.choice(list(Source)),
+                source_id=f"source_{i % 100}",
+                author=f"author_{i % 50}",
+                created_at="2023-03-01T12:00:00",
+            ),
+            embedding=[random.random() for _ in range(dim)],
+        )
+        for i in range(num_chunks)
+    ]
+
+
+async def load(client: redis.Redis, storage_type: str, chunks, dim: int, prefix: str, index_name: str):
+    schema = _get_redisearch_schema(dim, storage_type)
+    definition = IndexDefinition(
+        prefix=[prefix], index_type=IndexType.HASH if storage_type == "hash" else IndexType.JSON
+    )
+    await client.ft(index_name).create_index(fields=list(unpack_schema(schema)), definition=definition)
+    datastore = RedisDataStore(client, schema, storage_type)
+    async with client.pipeline(transaction=False) as pipe:
+        for chunk in chunks:
+            key = f"{prefix}:{chunk.id}"
+            if storage_type == "hash":
+                pipe.hset(key, mapping=datastore._get_redis_chunk_hash(chunk))
+            else:
+                pipe.json().set(key, "$", datastore._get_redis_chunk(chunk.copy(deep=True)))
+        await pipe.execute()
+    return datastore
+
+
+async def measure(client: redis.Redis, datastore: RedisDataStore, prefix: str, index_name: str, chunks, queries: int):
+    # wait for the index to catch up with the writes
+    while int((await client.ft(index_name).info())["indexing"]):
+        await asyncio.sleep(0.1)
+    sample = random.sample(chunks, min(200, len(chunks)))
+    key_bytes = statistics.mean([await client.memory_usage(f"{prefix}:{chunk.id}") for chunk in sample])
+    info = await client.ft(index_name).info()
+    index_bytes = float(info["vector_index_sz_mb"]) * 1024 * 1024 / len(chunks)
+    dtype = np.float32 if datastore._storage_type == "hash" else np.float64
+    latencies = []
+    for _ in range(queries):
+        query = QueryWithEmbedding(query="benchmark query", embedding=random.choice(chunks).embedding, top_k=10)
+        start = time.perf_counter()
+        await client.ft(index_name).search(
+            datastore._get_redis_query(query), {"embedding": np.array(query.embedding, dtype=dtype).tobytes()}
+        )
+        latencies.append(time.perf_counter() - start)
+    return key_bytes, index_bytes, statistics.median(latencies) * 1000
+
+
+async def run(args):
+    client = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, password=REDIS_PASSWORD)
+    chunks = build_chunks(args.chunks, args.dim)
+    suffix = uuid.uuid4().hex[:8]
+    print(f"{args.chunks} chunks of {args.dim} dimensions")
+    for storage_type in ("json", "hash"):
+        prefix = f"bench_{storage_type}_{suffix}"
+        index_name = f"bench_{storage_type}_{suffix}"
+        try:
+            datastore = await load(client, storage_type, chunks, args.dim, prefix, index_name)
+            key_bytes, index_bytes, p50 = await measure(client, datastore, prefix, index_name, chunks, args.queries)
+            print(
+                f"{storage_type:4s}: {key_bytes:9.0f} bytes per key, {index_bytes:9.0f} bytes of vector index per chunk, "
+                f"search p50 {p50:6.2f}ms"
+            )
+        finally:
+            await client.ft(index_name).dropindex(delete_documents=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare the memory per chunk and the search latency of the Redis JSON and hash storage types."
+    )
+    parser.add_argument("--chunks", type=int, default=10000, help="Number of chunks to store")
+    parser.add_argument("--dim", type=int, default=1536, help="Dimension of the embeddings")
+    parser.add_argument("--queries", type=int, default=200, help="Number of searches to time")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+import argparse
+import asyncio
+import gzip
+import random
+import time
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+from models.api import QueryResponse
+from models.models import (
+    DocumentChunkMetadata,
+    DocumentChunkWithScore,
+    QueryResult,
+    Source,
+)
+from server.responses import FastJSONResponse, RESPONSE_GZIP_COMPRESS_LEVEL
+
+
+def build_response(num_results: int, dim: int) -> QueryResponse:
+    results = [
+        DocumentChunkWithScore(
+            id=f"doc_{i}_0",
+            text="lorem ipsum dolor sit amet " * 40,
+            metadata=DocumentChunkMetadata(
+                document_id=f"doc_{i}",
+                source=Source.file,
+                source_id=f"file_{i}.pdf",
+                created_at="2023-04-01T12:00:00",
+                author="Jane Doe",
+            ),
+            embedding=[random.random() for _ in range(dim)],
+            score=random.random(),
+        )
+        for i in range(num_results)
+    ]
+    return QueryResponse(results=[QueryResult(query="benchmark query", results=results)])
+
+
+def timeit(name: str, fn, repeat: int):
+    # warm up
+    body = fn()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    elapsed = (time.perf_counter() - start) / repeat
+    print(f"{name:<40} {elapsed * 1000:8.2f} ms/response {len(body) / 1024:10.1f} KiB")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num_results", default=100, type=int, help="Number of results in the response")
+    parser.add_argument("--dim", default=1536, type=int, help="Embedding dimension")
+    parser.add_argument("--repeat", default=20, type=int, help="Number of timed iterations")
+    args = parser.parse_args()
+
+    response = build_response(args.num_results, args.dim)
+    field = create_response_field(name="Response_query", type_=QueryResponse)
+
+    def fastapi_default() -> bytes:
+        # What FastAPI does for a `response_model` route: re-validate, jsonable_encoder, json.dumps
+        content = asyncio.run(
+            serialize_response(field=field, response_content=response, is_coroutine=True)
+        )
+        return JSONResponse(content).body
+
+    def fast_path() -> bytes:
+        return FastJSONResponse(response).body
+
+    def fast_path_gzip() -> bytes:
+        return gzip.compress(FastJSONResponse(response).body, compresslevel=RESPONSE_GZIP_COMPRESS_LEVEL)
+
+    print(f"QueryResponse with {args.num_results} results of {args.dim}-dim embeddings")
+    baseline = timeit("response_model + json", fastapi_default, args.repeat)
+    fast = timeit("FastJSONResponse (orjson)", fast_path, args.repeat)
+    timeit("FastJSONResponse + gzip", fast_path_gzip, args.repeat)
+    print(f"speedup: {baseline / fast:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
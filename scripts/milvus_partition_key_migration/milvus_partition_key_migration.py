@@ -0,0 +1,48 @@
+import argparse
+import asyncio
+
+from pymilvus import utility
+
+from datastore.providers.milvus_datastore import MilvusDataStore
+
+
+async def migrate_collections(datastore: MilvusDataStore, collection_names: list, drop: bool):
+    # copy each collection into its shared collection, one collection at a time
+    for collection_name in collection_names:
+        try:
+            copied = await datastore.migrate_to_shared_collection(collection_name, drop=drop)
+            print(f"Migrated {copied} entities of collection {collection_name}")
+        except Exception as e:
+            # log the error and continue with the next collection
+            print(f"Error migrating collection {collection_name}: {e}")
+
+
+async def main():
+    # parse the command-line arguments
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--collection_names",
+        nargs="*",
+        default=None,
+        help="The Milvus collections to migrate, all the collections of the Milvus server but the shared ones by default",
+    )
+    parser.add_argument(
+        "--drop",
+        action="store_true",
+        help="Drop each collection once all its entities are in the shared collection",
+    )
+    args = parser.parse_args()
+
+    datastore = MilvusDataStore()
+    shared_names = [
+        datastore._get_physical_collection_name("", embedding_method) for embedding_method in ("openai", "mpnet")
+    ]
+    collection_names = args.collection_names or [
+        name for name in utility.list_collections(using=datastore.alias) if name not in shared_names
+    ]
+    print(f"Migrating {len(collection_names)} collections")
+    await migrate_collections(datastore, collection_names, args.drop)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,41 @@
+import argparse
+import asyncio
+
+from pymilvus import utility
+
+from datastore.providers.milvus_datastore import MilvusDataStore
+
+
+async def migrate_collections(datastore: MilvusDataStore, collection_names: list):
+    # add the missing scalar indexes to each collection, one collection at a time
+    for collection_name in collection_names:
+        try:
+            created = await datastore.create_scalar_indexes(collection_name)
+            if created:
+                print(f"Indexed {', '.join(created)} in collection {collection_name}")
+            else:
+                print(f"Collection {collection_name} is already indexed, skipping")
+        except Exception as e:
+            # log the error and continue with the next collection
+            print(f"Error indexing collection {collection_name}: {e}")
+
+
+async def main():
+    # parse the command-line arguments
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--collection_names",
+        nargs="*",
+        default=None,
+        help="The Milvus collections to migrate, all the collections of the Milvus server by default",
+    )
+    args = parser.parse_args()
+
+    datastore = MilvusDataStore()
+    collection_names = args.collection_names or utility.list_collections(using=datastore.alias)
+    print(f"Migrating {len(collection_names)} collections")
+    await migrate_collections(datastore, collection_names)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,71 @@
+import argparse
+import asyncio
+
+from datastore.providers.redis_datastore import (
+    VECTOR_DIMENSION,
+    VECTOR_DIMENSIONS,
+    RedisDataStore,
+)
+
+
+async def main():
+    # parse the command-line arguments
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--collection_names",
+        nargs="*",
+        default=None,
+        help="The collections to convert, the chunks written without a collection (the REDIS_INDEX_NAME index) by default",
+    )
+    parser.add_argument(
+        "--embedding_method",
+        default="mpnet",
+        choices=list(VECTOR_DIMENSIONS),
+        help="The embedding method of the collections, which sets the dimension of their embeddings",
+    )
+    parser.add_argument(
+        "--dim",
+        type=int,
+        default=VECTOR_DIMENSION,
+        help="The dimension of the embeddings of the REDIS_INDEX_NAME index",
+    )
+    parser.add_argument("--batch_size", type=int, default=500, help="The number of keys converted per pipeline")
+    parser.add_argument(
+        "--backfill_document_id",
+        action="store_true",
+        help="Keep the chunks as JSON, only set the top-level document_id of the chunks written before it was stored",
+    )
+    args = parser.parse_args()
+
+    if args.backfill_document_id:
+        datastore = await RedisDataStore.init(dim=args.dim, storage_type="json")
+        for collection_name in args.collection_names or [None]:
+            try:
+                updated = await datastore.backfill_document_ids(collection_name, args.batch_size)
+                chunks = f"chunks of collection {collection_name}" if collection_name else "chunks without a collection"
+                print(f"Set the document_id of {updated} {chunks}")
+            except Exception as e:
+                # log the error and continue with the next collection
+                print(f"Error backfilling collection {collection_name}: {e}")
+        return
+
+    datastore = await RedisDataStore.init(dim=args.dim, storage_type="hash")
+    if not args.collection_names:
+        converted = await datastore.convert_json_to_hash(None, args.dim, args.batch_size)
+        print(f"Converted {converted} chunks to hashes")
+    else:
+        # convert each collection, one collection at a time
+        for collection_name in args.collection_names:
+            try:
+                converted = await datastore.convert_json_to_hash(
+                    collection_name, VECTOR_DIMENSIONS[args.embedding_method], args.batch_size
+                )
+                print(f"Converted {converted} chunks of collection {collection_name} to hashes")
+            except Exception as e:
+                # log the error and continue with the next collection
+                print(f"Error converting collection {collection_name}: {e}")
+    print("Set REDIS_STORAGE_TYPE=hash so new collections are created as hashes too")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -7,16 +7,18 @@ from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.staticfiles import StaticFiles
 
 from datastore.factory import get_datastore
-from services.file import get_document_from_file
+from services.file import get_form_file_mimetype, get_text_chunks_from_form_file, iter_csv_document_batches
 
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 
-from models.models import DocumentMetadata, Source
+from models.models import Document, DocumentMetadata, Source
 
 from transformers import AutoTokenizer, AutoModel
 
 from db import *
 from models.api import *
+from server.responses import FastJSONResponse, RESPONSE_GZIP_MINIMUM_SIZE, RESPONSE_GZIP_COMPRESS_LEVEL
 
 
 bearer_scheme = HTTPBearer(auto_error=False)
@@ -30,6 +32,12 @@ def validate_api_key(credentials: HTTPAuthorizationCredentials = Depends(HTTPBea
 
 
 app = FastAPI()
+if RESPONSE_GZIP_MINIMUM_SIZE > 0:
+    app.add_middleware(
+        GZipMiddleware,
+        minimum_size=RESPONSE_GZIP_MINIMUM_SIZE,
+        compresslevel=RESPONSE_GZIP_COMPRESS_LEVEL,
+    )
 app.mount("/.well-known", StaticFiles(directory=".well-known"), name="static")
 
 # Create a sub-application, in order to access just the query endpoint in an OpenAPI schema, found at http://0.0.0.0:8000/sub/openapi.json when the app is running locally
@@ -56,7 +64,7 @@ async def create_collection(
         _uuid = uuid.uuid4()
         collection_name = request.collection_name + "_" + str(_uuid)
         collection_name = collection_name.replace(" ", "_").replace("-", "_")
-        response = await datastore.create_collection(collection_name, request.embedding_method)
+        response = await datastore.create_collection(collection_name, request.embedding_method, bulk_load=request.bulk_load, index_params=request.index_params)
         if response == True:
             response = await add_collection_to_db(api_key, request.collection_name, collection_name, request.embedding_method, request.overview, request.description, request.is_active, db=db)
         return CreateCollectionResponse(success=response)
@@ -139,6 +147,83 @@ async def get_all_collections_from_db(
         raise HTTPException(status_code=500, detail="Internal Service Error")
 
 
+@app.get(
+    "/collection-metrics",
+    response_model=CollectionMetricsResponse,
+)
+async def get_collection_metrics(
+    api_key: str = Depends(validate_api_key),
+    db = Depends(get_db),
+):
+    try:
+        collections = await get_collections_from_db(api_key, db=db, return_only_names_and_overviews=False)
+        metrics = datastore.get_metrics(
+            {collection["collection_name"]: collection["embedding_method"] for collection in collections}
+        )
+        # only report the collections of the user, under the names they know
+        return CollectionMetricsResponse(
+            metrics={
+                collection["name"]: metrics[collection["collection_name"]]
+                for collection in collections
+                if collection["collection_name"] in metrics
+            }
+        )
+    except Exception as e:
+        print("Error:", e)
+        raise HTTPException(status_code=500, detail="Internal Service Error")
+
+
+@app.post(
+    "/finish-bulk-load",
+    response_model=BulkLoadStatusResponse,
+)
+async def finish_bulk_load(
+    api_key: str = Depends(validate_api_key),
+    db = Depends(get_db),
+    request: BulkLoadRequest = Body(...),
+):
+    try:
+        collection = await get_collection_from_db(api_key, request.collection_name, db=db)
+    except Exception as e:
+        print("Error:", e)
+        raise HTTPException(status_code=500, detail="Internal Service Error")
+    if collection is None:
+        raise HTTPException(status_code=500, detail="Invalid collection name")
+    try:
+        collection_name, _ = collection
+        # the indexes are built in the background, poll /bulk-load-status for the progress
+        status = await datastore.finish_bulk_load(collection_name)
+        return BulkLoadStatusResponse(**status)
+    except Exception as e:
+        print("Error:", e)
+        raise HTTPException(status_code=500, detail="Internal Service Error")
+
+
+@app.get(
+    "/bulk-load-status",
+    response_model=BulkLoadStatusResponse,
+)
+async def get_bulk_load_status(
+    collection_name: str,
+    api_key: str = Depends(validate_api_key),
+    db = Depends(get_db),
+):
+    try:
+        collection = await get_collection_from_db(api_key, collection_name, db=db)
+    except Exception as e:
+        print("Error:", e)
+        raise HTTPException(status_code=500, detail="Internal Service Error")
+    if collection is None:
+        raise HTTPException(status_code=500, detail="Invalid collection name")
+    try:
+        internal_name, _ = collection
+        status = await datastore.get_bulk_load_status(internal_name)
+        return BulkLoadStatusResponse(**status)
+    except Exception as e:
+        print("Error:", e)
+        raise HTTPException(status_code=500, detail="Internal Service Error")
+
+
 @app.post(
     "/upsert-file",
     response_model=UpsertResponse,
@@ -149,6 +234,7 @@ async def upsert_file(
     file: UploadFile = File(...),
     metadata: Optional[str] = Form(None),
     collection_name: str = Form(None),
+    csv_rows_per_document: Optional[int] = Form(None),
 ):
     try:
         metadata_obj = (
@@ -159,7 +245,12 @@ async def upsert_file(
     except:
         metadata_obj = DocumentMetadata(source=Source.file)
 
-    document = await get_document_from_file(file, metadata_obj)
+    # A csv file can be upserted with every csv_rows_per_document rows as its own document
+    csv_rows = bool(csv_rows_per_document) and get_form_file_mimetype(file) == "text/csv"
+    if not csv_rows:
+        # The file is chunked while it is extracted, so the document is upserted with its text chunks instead of its text
+        text_chunks = await get_text_chunks_from_form_file(file)
+        document = Document(text="", metadata=metadata_obj)
 
     try:
         collection = await get_collection_from_db(api_key, collection_name, db=db)
@@ -170,8 +261,14 @@ async def upsert_file(
         raise HTTPException(status_code=500, detail="Invalid collection name")
     try:
         collection_name, mode = collection
-        ids = await datastore.upsert([document], mode=mode, model=model, tokenizer=tokenizer, collection_name=collection_name)
-        return UpsertResponse(ids=ids)
+        if csv_rows:
+            # The rows are parsed and upserted a batch of documents at a time
+            ids = []
+            async for documents in iter_csv_document_batches(file, metadata_obj, csv_rows_per_document):
+                ids.extend(await datastore.upsert(documents, mode=mode, model=model, tokenizer=tokenizer, collection_name=collection_name))
+        else:
+            ids = await datastore.upsert([document], mode=mode, model=model, tokenizer=tokenizer, collection_name=collection_name, text_chunks=[text_chunks])
+        return FastJSONResponse(UpsertResponse(ids=ids, session_token=datastore.get_session_token(collection_name)))
     except Exception as e:
         print("Error:", e)
         raise HTTPException(status_code=500, detail=f"str({e})")
@@ -196,7 +293,7 @@ async def upsert_main(
     try:
         collection_name, mode = collection
         ids = await datastore.upsert(request.documents, mode=mode, model=model, tokenizer=tokenizer, collection_name=collection_name)
-        return UpsertResponse(ids=ids)
+        return FastJSONResponse(UpsertResponse(ids=ids, session_token=datastore.get_session_token(collection_name)))
     except Exception as e:
         print("Error:", e)
         raise HTTPException(status_code=500, detail="Internal Service Error")
@@ -222,7 +319,7 @@ async def upsert(
     try:
         collection_name, mode = collection
         ids = await datastore.upsert(request.documents, mode=mode, model=model, tokenizer=tokenizer, collection_name=collection_name)
-        return UpsertResponse(ids=ids)
+        return FastJSONResponse(UpsertResponse(ids=ids, session_token=datastore.get_session_token(collection_name)))
     except Exception as e:
         print("Error:", e)
         raise HTTPException(status_code=500, detail="Internal Service Error")
@@ -253,8 +350,9 @@ async def query_main(
             model=model,
             tokenizer=tokenizer,
             collection_name=collection_name,
+            session_token=request.session_token,
         )
-        return QueryResponse(results=results)
+        return FastJSONResponse(QueryResponse(results=results))
     except Exception as e:
         print("Error:", e)
         raise HTTPException(status_code=500, detail="Internal Service Error")
@@ -287,8 +385,103 @@ async def query(
             model=model,
             tokenizer=tokenizer,
             collection_name=collection_name,
+            session_token=request.session_token,
+        )
+        return FastJSONResponse(QueryResponse(results=results))
+    except Exception as e:
+        print("Error:", e)
+        raise HTTPException(status_code=500, detail="Internal Service Error")
+
+
+@app.post(
+    "/query-collections",
+    response_model=MultiCollectionQueryResponse,
+)
+async def query_collections_main(
+    api_key: str = Depends(validate_api_key),
+    db = Depends(get_db),
+    request: MultiCollectionQueryRequest = Body(...),
+):
+    try:
+        collections = await get_collections_from_db(api_key, db=db, return_only_names_and_overviews=False)
+    except Exception as e:
+        print("Error:", e)
+        raise HTTPException(status_code=500, detail="Internal Service Error")
+    collections = {
+        collection["name"]: collection
+        for collection in collections
+        if collection["is_active"]
+        and (request.collection_names is None or collection["name"] in request.collection_names)
+    }
+    if not collections or (request.collection_names is not None and len(collections) != len(set(request.collection_names))):
+        raise HTTPException(status_code=500, detail="Invalid collection name")
+    try:
+        names = {collection["collection_name"]: name for name, collection in collections.items()}
+        results, failed_collections = await datastore.query_collections(
+            request.queries,
+            {collection["collection_name"]: collection["embedding_method"] for collection in collections.values()},
+            model=model,
+            tokenizer=tokenizer,
+            timeout=request.timeout,
+        )
+        # attribute the results to the collection names the user knows
+        for result in results:
+            for chunk in result.results:
+                chunk.collection_name = names[chunk.collection_name]
+        return FastJSONResponse(
+            MultiCollectionQueryResponse(
+                results=results,
+                failed_collections=[names[collection_name] for collection_name in failed_collections],
+            )
+        )
+    except Exception as e:
+        print("Error:", e)
+        raise HTTPException(status_code=500, detail="Internal Service Error")
+
+
+@sub_app.post(
+    "/query-collections",
+    response_model=MultiCollectionQueryResponse,
+    # NOTE: We are describing the shape of the API endpoint input due to a current limitation in parsing arrays of objects from OpenAPI schemas. This will not be necessary in the future.
+    description="Accepts an objects array with each item having a query and an optional filter, and an optional list of collection names (defaults to all active collections). Searches all the collections at once and returns the best results across the collections of each embedding method, each with the collection it came from. Prefer this over several /query calls when the answer may be in more than one collection.",
+)
+async def query_collections(
+    api_key: str = Depends(validate_api_key),
+    db = Depends(get_db),
+    request: MultiCollectionQueryRequest = Body(...),
+):
+    try:
+        collections = await get_collections_from_db(api_key, db=db, return_only_names_and_overviews=False)
+    except Exception as e:
+        print("Error:", e)
+        raise HTTPException(status_code=500, detail="Internal Service Error")
+    collections = {
+        collection["name"]: collection
+        for collection in collections
+        if collection["is_active"]
+        and (request.collection_names is None or collection["name"] in request.collection_names)
+    }
+    if not collections or (request.collection_names is not None and len(collections) != len(set(request.collection_names))):
+        raise HTTPException(status_code=500, detail="Invalid collection name")
+    try:
+        names = {collection["collection_name"]: name for name, collection in collections.items()}
+        results, failed_collections = await datastore.query_collections(
+            request.queries,
+            {collection["collection_name"]: collection["embedding_method"] for collection in collections.values()},
+            model=model,
+            tokenizer=tokenizer,
+            timeout=request.timeout,
+        )
+        # attribute the results to the collection names the user knows
+        for result in results:
+            for chunk in result.results:
+                chunk.collection_name = names[chunk.collection_name]
+        return FastJSONResponse(
+            MultiCollectionQueryResponse(
+                results=results,
+                failed_collections=[names[collection_name] for collection_name in failed_collections],
+            )
         )
-        return QueryResponse(results=results)
     except Exception as e:
         print("Error:", e)
         raise HTTPException(status_code=500, detail="Internal Service Error")
@@ -0,0 +1,42 @@
+import os
+from typing import Any
+
+import orjson
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+# Responses larger than this many bytes are gzipped when the client accepts it, set to 0 to disable
+RESPONSE_GZIP_MINIMUM_SIZE = int(os.environ.get("RESPONSE_GZIP_MINIMUM_SIZE", 64 * 1024))
+# Embeddings are float-heavy and compress poorly, level 1 gets most of the size reduction at a fraction of the CPU cost
+RESPONSE_GZIP_COMPRESS_LEVEL = int(os.environ.get("RESPONSE_GZIP_COMPRESS_LEVEL", 1))
+
+
+def _default(obj: Any) -> Any:
+    """
+    orjson fallback for types it does not serialize natively.
+
+    Pydantic models are handed back as their field dict, so nested models are walked by orjson
+    itself instead of being copied by `.dict()` first. Lists of floats (embeddings) are encoded
+    directly from the model without an intermediate copy.
+    """
+    if isinstance(obj, BaseModel):
+        return obj.__dict__
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def dumps(content: Any) -> bytes:
+    """Serialize a response body (pydantic models, dicts, lists, numpy arrays) to JSON bytes."""
+    return orjson.dumps(content, default=_default, option=orjson.OPT_SERIALIZE_NUMPY)
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSON response for models the endpoint has already built and validated.
+
+    Returning a response instance from a FastAPI endpoint skips the `response_model` validation
+    and the `jsonable_encoder` pass, so the `response_model` on the route is only used for the
+    OpenAPI schema.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -1,4 +1,4 @@
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, Iterable, List, Optional, Tuple
 import uuid
 from models.models import Document, DocumentChunk, DocumentChunkMetadata
 
@@ -35,11 +35,31 @@ def get_text_chunks(text: str, chunk_token_size: Optional[int]) -> List[str]:
     if not text or text.isspace():
         return []
 
-    # Tokenize the text
-    tokens = tokenizer.encode(text, disallowed_special=())
+    return get_text_chunks_from_segments([text], chunk_token_size)
 
+
+def get_text_chunks_from_segments(
+    segments: Iterable[str], chunk_token_size: Optional[int]
+) -> List[str]:
+    """
+    Split a text that arrives in consecutive segments (e.g. the pages of a PDF) into chunks of ~CHUNK_SIZE tokens,
+    based on punctuation and newline boundaries.
+
+    The segments are chunked as they arrive, so only the unchunked tail of the text is buffered and the whole text
+    is never built as one string. Each segment is tokenized on its own, so the chunks are the same as get_text_chunks
+    on the concatenated segments only when every segment boundary is also a token boundary (e.g. after a newline).
+    Otherwise the tokens on either side of a boundary may differ from the ones of the concatenated text, which
+    BPE could have merged across it.
+
+    Args:
+        segments: The consecutive parts of the text to split into chunks.
+        chunk_token_size: The target size of each chunk in tokens, or None to use the default CHUNK_SIZE.
+
+    Returns:
+        A list of text chunks, each of which is a string of ~CHUNK_SIZE tokens.
+    """
     # Initialize an empty list of chunks
-    chunks = []
+    chunks: List[str] = []
 
     # Use the provided chunk token size or the default one
     chunk_size = chunk_token_size or CHUNK_SIZE
@@ -47,10 +67,53 @@ def get_text_chunks(text: str, chunk_token_size: Optional[int]) -> List[str]:
     # Initialize a counter for the number of chunks
     num_chunks = 0
 
+    # The tokens that have not been chunked yet
+    tokens: List[int] = []
+
+    for segment in segments:
+        if not segment:
+            continue
+
+        # Tokenize the segment after the tail left over from the previous segments
+        tokens.extend(tokenizer.encode(segment, disallowed_special=()))
+
+        # Only chunk full chunks, the tail may still continue in the next segment
+        consumed, num_chunks = _chunk_tokens(tokens, chunk_size, chunks, num_chunks, final=False)
+        del tokens[:consumed]
+
+    # Chunk the tail of the text
+    consumed, num_chunks = _chunk_tokens(tokens, chunk_size, chunks, num_chunks, final=True)
+    del tokens[:consumed]
+
+    # Handle the remaining tokens
+    if tokens:
+        remaining_text = tokenizer.decode(tokens).replace("\n", " ").strip()
+        if len(remaining_text) > MIN_CHUNK_LENGTH_TO_EMBED:
+            chunks.append(remaining_text)
+
+    return chunks
+
+
+def _chunk_tokens(
+    tokens: List[int], chunk_size: int, chunks: List[str], num_chunks: int, final: bool
+) -> Tuple[int, int]:
+    """
+    Append the chunks found in tokens to chunks.
+
+    Unless final is set, stops as soon as less than a full chunk of tokens is left.
+    Returns the number of tokens consumed and the updated number of chunks.
+    """
+    # The position of the first token that has not been consumed yet
+    start = 0
+
     # Loop until all tokens are consumed
-    while tokens and num_chunks < MAX_NUM_CHUNKS:
+    while (
+        start < len(tokens)
+        and num_chunks < MAX_NUM_CHUNKS
+        and (final or len(tokens) - start >= chunk_size)
+    ):
         # Take the first chunk_size tokens as a chunk
-        chunk = tokens[:chunk_size]
+        chunk = tokens[start : start + chunk_size]
 
         # Decode the chunk into text
         chunk_text = tokenizer.decode(chunk)
@@ -58,7 +121,7 @@ def get_text_chunks(text: str, chunk_token_size: Optional[int]) -> List[str]:
         # Skip the chunk if it is empty or whitespace
         if not chunk_text or chunk_text.isspace():
             # Remove the tokens corresponding to the chunk text from the remaining tokens
-            tokens = tokens[len(chunk) :]
+            start += len(chunk)
             # Continue to the next iteration of the loop
             continue
 
@@ -83,22 +146,16 @@ def get_text_chunks(text: str, chunk_token_size: Optional[int]) -> List[str]:
             chunks.append(chunk_text_to_append)
 
         # Remove the tokens corresponding to the chunk text from the remaining tokens
-        tokens = tokens[len(tokenizer.encode(chunk_text, disallowed_special=())) :]
+        start += len(tokenizer.encode(chunk_text, disallowed_special=()))
 
         # Increment the number of chunks
         num_chunks += 1
 
-    # Handle the remaining tokens
-    if tokens:
-        remaining_text = tokenizer.decode(tokens).replace("\n", " ").strip()
-        if len(remaining_text) > MIN_CHUNK_LENGTH_TO_EMBED:
-            chunks.append(remaining_text)
-
-    return chunks
+    return start, num_chunks
 
 
 def create_document_chunks(
-    doc: Document, chunk_token_size: Optional[int]
+    doc: Document, chunk_token_size: Optional[int], text_chunks: Optional[List[str]] = None
 ) -> Tuple[List[DocumentChunk], str]:
     """
     Create a list of document chunks from a document object and return the document id.
@@ -106,20 +163,22 @@ def create_document_chunks(
     Args:
         doc: The document object to create chunks from. It should have a text attribute and optionally an id and a metadata attribute.
         chunk_token_size: The target size of each chunk in tokens, or None to use the default CHUNK_SIZE.
+        text_chunks: The already split text of the document, used instead of splitting doc.text.
 
     Returns:
         A tuple of (doc_chunks, doc_id), where doc_chunks is a list of document chunks, each of which is a DocumentChunk object with an id, a document_id, a text, and a metadata attribute,
         and doc_id is the id of the document object, generated if not provided. The id of each chunk is generated from the document id and a sequential number, and the metadata is copied from the document object.
     """
     # Check if the document text is empty or whitespace
-    if not doc.text or doc.text.isspace():
+    if text_chunks is None and (not doc.text or doc.text.isspace()):
         return [], doc.id or str(uuid.uuid4())
 
     # Generate a document id if not provided
     doc_id = doc.id or str(uuid.uuid4())
 
     # Split the document text into chunks
-    text_chunks = get_text_chunks(doc.text, chunk_token_size)
+    if text_chunks is None:
+        text_chunks = get_text_chunks(doc.text, chunk_token_size)
 
     metadata = (
         DocumentChunkMetadata(**doc.metadata.__dict__)
@@ -148,7 +207,8 @@ def create_document_chunks(
 
 
 def get_document_chunks(
-    documents: List[Document], chunk_token_size: Optional[int], mode:str='openai', model=None, tokenizer=None
+    documents: List[Document], chunk_token_size: Optional[int], mode:str='openai', model=None, tokenizer=None,
+    text_chunks: Optional[List[Optional[List[str]]]] = None,
 ) -> Dict[str, List[DocumentChunk]]:
     """
     Convert a list of documents into a dictionary from document id to list of document chunks.
@@ -156,6 +216,7 @@ def get_document_chunks(
     Args:
         documents: The list of documents to convert.
         chunk_token_size: The target size of each chunk in tokens, or None to use the default CHUNK_SIZE.
+        text_chunks: The already split text of each document, in the same order as documents, or None for the documents to split.
 
     Returns:
         A dictionary mapping each document id to a list of document chunks, each of which is a DocumentChunk object
@@ -168,8 +229,10 @@ def get_document_chunks(
     all_chunks: List[DocumentChunk] = []
 
     # Loop over each document and create chunks
-    for doc in documents:
-        doc_chunks, doc_id = create_document_chunks(doc, chunk_token_size)
+    for i, doc in enumerate(documents):
+        doc_chunks, doc_id = create_document_chunks(
+            doc, chunk_token_size, text_chunks[i] if text_chunks else None
+        )
 
         # Append the chunks for this document to the list of all chunks
         all_chunks.extend(doc_chunks)
@@ -0,0 +1,129 @@
+import os
+import gzip
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import BinaryIO, Iterable, Iterator, Optional
+
+# The directory the extracted texts are cached in
+EXTRACTION_CACHE_DIR = os.environ.get("EXTRACTION_CACHE_DIR") or os.path.join(
+    tempfile.gettempdir(), "extraction_cache"
+)
+# The maximum size of the compressed cache on disk, the least recently used texts are evicted first. The cache keeps
+# the text of the uploaded files on disk unencrypted, so it is disabled unless a size is set
+EXTRACTION_CACHE_MAX_BYTES = int(os.environ.get("EXTRACTION_CACHE_MAX_BYTES", 0))
+
+HASH_BLOCK_SIZE = 1024 * 1024  # The number of bytes read at a time when hashing a file
+CACHE_FILE_SUFFIX = ".txt.gz"
+
+_extraction_cache: Optional["ExtractionCache"] = None
+_extraction_cache_lock = threading.Lock()
+
+
+class ExtractionCache:
+    """
+    A content-addressed cache of the text extracted from files.
+
+    The text is keyed by the sha256 of the file bytes and its mimetype, and stored gzipped on disk. The total size
+    of the cache is bounded, the least recently used texts are evicted first.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # Only the user running the plugin may read the cached texts
+        os.makedirs(self.directory, mode=0o700, exist_ok=True)
+
+        # Cache key to size on disk, in least recently used order
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._size = 0
+        # Pick up the texts cached by previous runs, oldest first
+        cached = []
+        for filename in os.listdir(self.directory):
+            if filename.endswith(CACHE_FILE_SUFFIX):
+                stat = os.stat(os.path.join(self.directory, filename))
+                cached.append((stat.st_mtime, filename[: -len(CACHE_FILE_SUFFIX)], stat.st_size))
+        for _, key, size in sorted(cached):
+            self._entries[key] = size
+            self._size += size
+        self._evict()
+
+    @staticmethod
+    def key(file: BinaryIO, mimetype: str) -> str:
+        """Return the cache key of a seekable binary stream, and rewind it."""
+        sha = hashlib.sha256()
+        sha.update(mimetype.encode("utf-8") + b"\0")
+        file.seek(0)
+        for block in iter(lambda: file.read(HASH_BLOCK_SIZE), b""):
+            sha.update(block)
+        file.seek(0)
+        return sha.hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached text for the key, or None on a miss."""
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+
+        path = self._path(key)
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                text = f.read()
+            # Keep the recency on disk for the next run
+            os.utime(path)
+            return text
+        except OSError:
+            # Evicted by another process sharing the directory
+            with self._lock:
+                self._size -= self._entries.pop(key, 0)
+            return None
+
+    def store_segments(self, key: str, segments: Iterable[str]) -> Iterator[str]:
+        """
+        Yield the segments of an extracted text while caching them under the key.
+
+        The text is compressed to disk as it streams, and only added to the cache once all segments were consumed.
+        """
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with gzip.open(os.fdopen(fd, "wb"), "wt", encoding="utf-8", compresslevel=6) as f:
+                for segment in segments:
+                    f.write(segment)
+                    yield segment
+            os.replace(temp_path, self._path(key))
+        except BaseException:
+            os.remove(temp_path)
+            raise
+
+        with self._lock:
+            self._size -= self._entries.pop(key, 0)
+            size = os.path.getsize(self._path(key))
+            self._entries[key] = size
+            self._size += size
+            self._evict()
+
+    def _evict(self):
+        while self._size > self.max_bytes and self._entries:
+            key, size = self._entries.popitem(last=False)
+            self._size -= size
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key + CACHE_FILE_SUFFIX)
+
+
+def get_extraction_cache() -> Optional[ExtractionCache]:
+    """Return the process wide extraction cache, or None if it is disabled."""
+    global _extraction_cache
+    if EXTRACTION_CACHE_MAX_BYTES <= 0:
+        return None
+    with _extraction_cache_lock:
+        if _extraction_cache is None:
+            _extraction_cache = ExtractionCache(EXTRACTION_CACHE_DIR, EXTRACTION_CACHE_MAX_BYTES)
+    return _extraction_cache
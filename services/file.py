@@ -1,14 +1,30 @@
 import os
-from io import BufferedReader
-from typing import Optional
+import asyncio
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from itertools import islice
+from typing import AsyncIterator, BinaryIO, Dict, Iterator, List, Optional
 from fastapi import UploadFile
 import mimetypes
-from PyPDF2 import PdfReader
 import docx2txt
 import csv
 import pptx
 
-from models.models import Document, DocumentMetadata
+from models.models import Document, DocumentMetadata, Source
+from services.chunks import get_text_chunks_from_segments
+from services.extraction_cache import get_extraction_cache
+from services.pdf import iter_pdf_pages_text
+
+# The number of worker threads that parse uploaded files, so the parsing does not block the event loop
+FILE_EXTRACTION_WORKERS = int(os.environ.get("FILE_EXTRACTION_WORKERS", 4))
+# Uploads that are not seekable are spooled in memory up to this many bytes, then to a unique temporary file
+SPOOLED_FILE_MAX_SIZE = 16 * 1024 * 1024
+CSV_ROWS_PER_SEGMENT = 1000  # The number of csv rows extracted as one text segment
+CSV_DOCUMENT_BATCH_SIZE = 50  # The number of csv row documents upserted at a time
+
+_extraction_executor: Optional[ThreadPoolExecutor] = None
 
 
 async def get_document_from_file(
@@ -21,18 +37,97 @@ async def get_document_from_file(
     return doc
 
 
+async def iter_csv_document_batches(
+    file: UploadFile,
+    metadata: DocumentMetadata,
+    rows_per_document: int = 1,
+    batch_size: int = CSV_DOCUMENT_BATCH_SIZE,
+) -> AsyncIterator[List[Document]]:
+    """
+    Yield the documents of a csv file in batches of batch_size, with every rows_per_document rows as one document.
+
+    The rows are parsed in a worker thread one batch at a time, so memory stays flat however large the file is.
+    """
+    with _open_seekable_stream(file.file) as stream:
+        documents = iter_csv_documents(stream, metadata, rows_per_document)
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await loop.run_in_executor(
+                _get_extraction_executor(), lambda: list(islice(documents, batch_size))
+            )
+            if not batch:
+                break
+            yield batch
+
+
+def iter_csv_documents(
+    file: BinaryIO, metadata: DocumentMetadata, rows_per_document: int = 1
+) -> Iterator[Document]:
+    """
+    Yield a document for every rows_per_document rows of a csv file with a header row.
+
+    The text of a document is its rows as "column: value" pairs. Columns named like a metadata field (source,
+    source_id, url, created_at, author) fill the metadata of the document, from its first row, on top of the
+    given metadata. With one row per document, an id column is used as the document id.
+    """
+    reader = csv.reader(line.decode("utf-8") for line in file)
+    header = next(reader, None)
+    if header is None:
+        return
+    header = [column.strip() for column in header]
+    metadata_columns = {
+        i: column.lower()
+        for i, column in enumerate(header)
+        if column.lower() in DocumentMetadata.__fields__
+    }
+    id_column = next(
+        (i for i, column in enumerate(header) if column.lower() == "id"), None
+    )
+
+    rows: List[List[str]] = []
+    for row in reader:
+        if not any(row):
+            continue
+        rows.append(row)
+        if len(rows) == rows_per_document:
+            yield _get_csv_document(header, rows, rows_per_document, metadata, metadata_columns, id_column)
+            rows = []
+    if rows:
+        yield _get_csv_document(header, rows, rows_per_document, metadata, metadata_columns, id_column)
+
+
+def _get_csv_document(
+    header: List[str],
+    rows: List[List[str]],
+    rows_per_document: int,
+    metadata: DocumentMetadata,
+    metadata_columns: Dict[int, str],
+    id_column: Optional[int],
+) -> Document:
+    text = "\n".join(
+        ", ".join(f"{column}: {value}" for column, value in zip(header, row) if value)
+        for row in rows
+    )
+    document_metadata = metadata.dict()
+    for i, field in metadata_columns.items():
+        value = rows[0][i] if i < len(rows[0]) else None
+        # Skip empty cells and sources that are not a valid Source
+        if value and (field != "source" or value in Source.__members__):
+            document_metadata[field] = value
+    # Only a document of a single row takes its id, not the last and shorter document of a file in groups of rows
+    document_id = (
+        rows[0][id_column]
+        if rows_per_document == 1 and id_column is not None and id_column < len(rows[0])
+        else None
+    )
+    return Document(id=document_id or None, text=text, metadata=DocumentMetadata(**document_metadata))
+
+
 def extract_text_from_filepath(filepath: str, mimetype: Optional[str] = None) -> str:
     """Return the text content of a file given its filepath."""
 
     if mimetype is None:
-        # Get the mimetype of the file based on its extension
-        mimetype, _ = mimetypes.guess_type(filepath)
-
-    if not mimetype:
-        if filepath.endswith(".md"):
-            mimetype = "text/markdown"
-        else:
-            raise Exception("Unsupported file type")
+        mimetype = guess_mimetype(filepath)
 
     try:
         with open(filepath, "rb") as file:
@@ -44,11 +139,49 @@ def extract_text_from_filepath(filepath: str, mimetype: Optional[str] = None) ->
     return extracted_text
 
 
-def extract_text_from_file(file: BufferedReader, mimetype: str) -> str:
+def guess_mimetype(filename: Optional[str]) -> str:
+    """Return the mimetype of a file based on its extension."""
+    mimetype, _ = mimetypes.guess_type(filename or "")
+
+    if not mimetype:
+        if filename and filename.endswith(".md"):
+            mimetype = "text/markdown"
+        else:
+            raise Exception("Unsupported file type")
+
+    return mimetype
+
+
+def extract_text_from_file(file: BinaryIO, mimetype: str) -> str:
+    return "".join(extract_text_segments_from_file(file, mimetype))
+
+
+def extract_text_segments_from_file(file: BinaryIO, mimetype: str) -> Iterator[str]:
+    """
+    Yield the text content of a file in consecutive segments, e.g. page by page for a PDF.
+
+    The extracted text is cached by the content of the file, a file that was already extracted is not parsed again.
+    """
+    cache = get_extraction_cache()
+    if cache is None:
+        yield from _parse_text_segments(file, mimetype)
+        return
+
+    key = cache.key(file, mimetype)
+    cached_text = cache.get(key)
+    if cached_text is not None:
+        yield cached_text
+        return
+
+    yield from cache.store_segments(key, _parse_text_segments(file, mimetype))
+
+
+def _parse_text_segments(file: BinaryIO, mimetype: str) -> Iterator[str]:
     if mimetype == "application/pdf":
-        # Extract text from pdf using PyPDF2
-        reader = PdfReader(file)
-        extracted_text = " ".join([page.extract_text() for page in reader.pages])
+        # Extract text from pdf using PyPDF2, page by page
+        for i, page_text in enumerate(iter_pdf_pages_text(file)):
+            yield page_text if i == 0 else " " + page_text
+        return
     elif mimetype == "text/plain" or mimetype == "text/markdown":
         # Read text from plain text file
         extracted_text = file.read().decode("utf-8")
@@ -59,58 +192,121 @@ def extract_text_from_file(file: BufferedReader, mimetype: str) -> str:
         # Extract text from docx using docx2txt
         extracted_text = docx2txt.process(file)
     elif mimetype == "text/csv":
-        # Extract text from csv using csv module
-        extracted_text = ""
-        decoded_buffer = (line.decode("utf-8") for line in file)
-        reader = csv.reader(decoded_buffer)
-        for row in reader:
-            extracted_text += " ".join(row) + "\n"
+        # Extract text from csv using csv module, a batch of rows at a time
+        yield from _iter_csv_text(file)
+        return
     elif (
         mimetype
         == "application/vnd.openxmlformats-officedocument.presentationml.presentation"
     ):
-        # Extract text from pptx using python-pptx
-        extracted_text = ""
+        # Extract text from pptx using python-pptx, a text frame at a time
         presentation = pptx.Presentation(file)
         for slide in presentation.slides:
             for shape in slide.shapes:
                 if shape.has_text_frame:
-                    for paragraph in shape.text_frame.paragraphs:
-                        for run in paragraph.runs:
-                            extracted_text += run.text + " "
-                    extracted_text += "\n"
+                    yield "".join(
+                        run.text + " "
+                        for paragraph in shape.text_frame.paragraphs
+                        for run in paragraph.runs
+                    ) + "\n"
+        return
     else:
         # Unsupported file type
         raise ValueError("Unsupported file type: {}".format(mimetype))
 
-    return extracted_text
+    yield extracted_text
 
 
 # Extract text from a file based on its mimetype
 async def extract_text_from_form_file(file: UploadFile):
     """Return the text content of a file."""
-    # get the file body from the upload file object
+    mimetype = get_form_file_mimetype(file)
+
+    # Parse the upload's own stream in a worker thread, every parser accepts a seekable binary stream
+    loop = asyncio.get_running_loop()
+    with _open_seekable_stream(file.file) as stream:
+        try:
+            extracted_text = await loop.run_in_executor(
+                _get_extraction_executor(), extract_text_from_file, stream, mimetype
+            )
+        except Exception as e:
+            print(f"Error: {e}")
+            raise e
+
+    return extracted_text
+
+
+async def get_text_chunks_from_form_file(
+    file: UploadFile, chunk_token_size: Optional[int] = None
+) -> List[str]:
+    """
+    Return the text content of a file split into chunks.
+
+    The text is chunked as the parser yields it (page by page for a PDF), so the whole text of a large file is
+    never built as one string.
+    """
+    mimetype = get_form_file_mimetype(file)
+
+    loop = asyncio.get_running_loop()
+    with _open_seekable_stream(file.file) as stream:
+        try:
+            text_chunks = await loop.run_in_executor(
+                _get_extraction_executor(),
+                lambda: get_text_chunks_from_segments(
+                    extract_text_segments_from_file(stream, mimetype), chunk_token_size
+                ),
+            )
+        except Exception as e:
+            print(f"Error: {e}")
+            raise e
+
+    return text_chunks
+
+
+def _iter_csv_text(file: BinaryIO) -> Iterator[str]:
+    decoded_buffer = (line.decode("utf-8") for line in file)
+    reader = csv.reader(decoded_buffer)
+    lines: List[str] = []
+    for row in reader:
+        lines.append(" ".join(row) + "\n")
+        if len(lines) == CSV_ROWS_PER_SEGMENT:
+            yield "".join(lines)
+            lines = []
+    if lines:
+        yield "".join(lines)
+
+
+def get_form_file_mimetype(file: UploadFile) -> str:
+    # Browsers send application/octet-stream for types they do not know, fall back to the file extension
     mimetype = file.content_type
+    if not mimetype or mimetype == "application/octet-stream":
+        mimetype = guess_mimetype(file.filename)
     print(f"mimetype: {mimetype}")
-    print(f"file.file: {file.file}")
-    print("file: ", file)
+    return mimetype
 
-    file_stream = await file.read()
 
-    temp_file_path = "/tmp/temp_file"
+@contextmanager
+def _open_seekable_stream(stream: BinaryIO) -> Iterator[BinaryIO]:
+    """
+    Yield the stream rewound to its start, spooled to a unique temporary file first if it cannot seek.
 
-    # write the file to a temporary location
-    with open(temp_file_path, "wb") as f:
-        f.write(file_stream)
+    The temporary file is closed, and deleted, on exit. The stream itself is left open for its owner to close.
+    """
+    if stream.seekable():
+        stream.seek(0)
+        yield stream
+        return
 
-    try:
-        extracted_text = extract_text_from_filepath(temp_file_path, mimetype)
-    except Exception as e:
-        print(f"Error: {e}")
-        os.remove(temp_file_path)
-        raise e
+    with tempfile.SpooledTemporaryFile(max_size=SPOOLED_FILE_MAX_SIZE) as spooled:
+        shutil.copyfileobj(stream, spooled)
+        spooled.seek(0)
+        yield spooled  # type: ignore
 
-    # remove file from temp location
-    os.remove(temp_file_path)
 
-    return extracted_text
+def _get_extraction_executor() -> ThreadPoolExecutor:
+    global _extraction_executor
+    if _extraction_executor is None:
+        _extraction_executor = ThreadPoolExecutor(
+            max_workers=FILE_EXTRACTION_WORKERS, thread_name_prefix="file-extraction"
+        )
+    return _extraction_executor
@@ -0,0 +1,90 @@
+import os
+import multiprocessing
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import BinaryIO, Iterator, List, Optional
+
+from PyPDF2 import PdfReader
+
+# PDFs with at least this many pages are split into page ranges that are extracted by a process pool
+PDF_PARALLEL_MIN_PAGES = int(os.environ.get("PDF_PARALLEL_MIN_PAGES", 16))
+# The number of processes extracting PDF pages, set to 1 to always extract serially
+PDF_EXTRACTION_PROCESSES = int(
+    os.environ.get("PDF_EXTRACTION_PROCESSES", min(os.cpu_count() or 1, 8))
+)
+PDF_MIN_PAGES_PER_TASK = 4  # The smallest page range handed to a worker process
+PDF_TASKS_PER_PROCESS = 4  # Split the pages into this many ranges per worker process to balance uneven pages
+
+_pdf_executor: Optional[ProcessPoolExecutor] = None
+
+
+def iter_pdf_pages_text(file: BinaryIO) -> Iterator[str]:
+    """
+    Yield the text of each page of a PDF, in page order.
+
+    Large PDFs are split into page ranges that are extracted concurrently by a process pool, and the pages
+    are yielded as soon as their range completes, so the caller can start chunking before the last page is
+    extracted.
+
+    Args:
+        file: A seekable binary stream of the PDF.
+
+    Yields:
+        The extracted text of each page.
+    """
+    reader = PdfReader(file)
+    num_pages = len(reader.pages)
+
+    if num_pages < PDF_PARALLEL_MIN_PAGES or PDF_EXTRACTION_PROCESSES < 2:
+        for page in reader.pages:
+            yield page.extract_text()
+        return
+
+    # Worker processes open the PDF by path, a stream without one is written to a unique temporary file once
+    # instead of pickling the whole PDF into every task
+    filepath = getattr(file, "name", None)
+    temp_file = None
+    if not isinstance(filepath, str) or not os.path.isfile(filepath):
+        temp_file = tempfile.NamedTemporaryFile(suffix=".pdf", delete=False)
+        file.seek(0)
+        shutil.copyfileobj(file, temp_file)
+        temp_file.close()
+        filepath = temp_file.name
+
+    pages_per_task = max(
+        PDF_MIN_PAGES_PER_TASK,
+        -(-num_pages // (PDF_EXTRACTION_PROCESSES * PDF_TASKS_PER_PROCESS)),
+    )
+    executor = _get_pdf_executor()
+    futures = [
+        executor.submit(
+            _extract_pdf_page_range, filepath, start, min(start + pages_per_task, num_pages)
+        )
+        for start in range(0, num_pages, pages_per_task)
+    ]
+    try:
+        # Yield the ranges in order, each one as soon as it is done
+        for future in futures:
+            yield from future.result()
+    finally:
+        for future in futures:
+            future.cancel()
+        if temp_file is not None:
+            os.remove(filepath)
+
+
+def _extract_pdf_page_range(filepath: str, start: int, end: int) -> List[str]:
+    reader = PdfReader(filepath)
+    return [reader.pages[i].extract_text() for i in range(start, end)]
+
+
+def _get_pdf_executor() -> ProcessPoolExecutor:
+    global _pdf_executor
+    if _pdf_executor is None:
+        # Spawn rather than fork, the server process runs threads (and torch) that are not fork safe
+        _pdf_executor = ProcessPoolExecutor(
+            max_workers=PDF_EXTRACTION_PROCESSES,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _pdf_executor
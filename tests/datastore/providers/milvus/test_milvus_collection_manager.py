@@ -0,0 +1,141 @@
+import time
+from types import SimpleNamespace
+
+from datastore.providers.milvus_datastore import EMBEDDING_FIELD, MilvusCollectionManager, MilvusDataStore
+
+
+class FakeCollection:
+    """A loadable collection of 1 MB of vectors."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.loaded = False
+        self.schema = SimpleNamespace(fields=[SimpleNamespace(name=EMBEDDING_FIELD, params={"dim": 256})])
+        self.num_entities = 1024
+
+    def load(self):
+        self.loaded = True
+
+    def release(self):
+        self.loaded = False
+
+
+def create_manager(*names: str, memory_budget_mb: int = 0, idle_ttl: int = 0) -> MilvusCollectionManager:
+    manager = MilvusCollectionManager("", idle_ttl=idle_ttl, memory_budget_mb=memory_budget_mb)
+    for name in names:
+        manager._handles[name] = FakeCollection(name)
+    return manager
+
+
+def test_acquire_loads_once():
+    manager = create_manager("a")
+    col = manager.acquire("a")
+    manager.done("a")
+    manager.acquire("a")
+    manager.done("a")
+
+    assert col.loaded
+    assert 1 == manager.metrics()["a"]["loads"]
+    assert 0 == manager.metrics()["a"]["users"]
+
+
+def test_over_budget_never_releases_collections_in_use():
+    manager = create_manager("a", "b", "c", memory_budget_mb=1)
+    a = manager.acquire("a")
+    b = manager.acquire("b")
+
+    # a is the least recently used, but still searched
+    assert a.loaded and b.loaded
+
+    manager.done("a")
+    manager.done("b")
+    c = manager.acquire("c")
+
+    # Neither a nor b is in use any more, both are released to get under the budget
+    assert c.loaded
+    assert not a.loaded and not b.loaded
+    manager.done("c")
+
+
+def test_idle_collections_in_use_are_not_released():
+    manager = create_manager("a", "b", idle_ttl=1)
+    a = manager.acquire("a")
+    manager.acquire("b")
+    manager.done("b")
+    manager._stats["a"]["last_access"] -= 10
+    manager._stats["b"]["last_access"] -= 10
+    manager._last_release_check -= manager.RELEASE_CHECK_INTERVAL
+
+    manager._maybe_release_idle()
+
+    assert a.loaded
+    assert not manager.get("b").loaded
+    manager.done("a")
+
+
+def test_idle_collections_released_without_further_use():
+    manager = create_manager("a", idle_ttl=1)
+    manager.RELEASE_CHECK_INTERVAL = 0.01
+    a = manager.acquire("a")
+    manager.done("a")
+    manager._stats["a"]["last_access"] -= 10
+
+    # No acquire comes in, the background thread releases the collection
+    deadline = time.monotonic() + 5
+    while a.loaded and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert not a.loaded
+    # The thread stops once nothing is loaded
+    deadline = time.monotonic() + 5
+    while manager._release_thread is not None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert manager._release_thread is None
+
+
+def test_release_unused_only():
+    manager = create_manager("a")
+    a = manager.acquire("a")
+
+    assert not manager.release("a", unused_only=True)
+    assert a.loaded
+
+    manager.done("a")
+    assert manager.release("a", unused_only=True)
+    assert not a.loaded
+    # Loaded again on the next use
+    manager.acquire("a")
+    assert a.loaded
+
+
+def test_failed_load_is_not_counted_as_in_use():
+    manager = create_manager("a")
+
+    def fail():
+        raise Exception("no index")
+
+    manager.get("a").load = fail
+    try:
+        manager.acquire("a")
+    except Exception:
+        pass
+
+    assert 0 == manager.metrics()["a"]["users"]
+
+
+def test_partition_key_metrics_under_each_collection():
+    # Skip __init__, it connects to Milvus
+    datastore = MilvusDataStore.__new__(MilvusDataStore)
+    datastore._partition_key_mode = True
+    datastore._search_latencies = {}
+    shared_name = datastore._get_physical_collection_name("a", "openai")
+    datastore._collections = create_manager(shared_name)
+    datastore._collections.acquire(shared_name)
+    datastore._collections.done(shared_name)
+
+    metrics = datastore.get_metrics({"a": "openai", "b": "openai", "c": "mpnet"})
+
+    # c is in the shared collection of mpnet, which was never loaded
+    assert {"a", "b"} == set(metrics)
+    assert shared_name == metrics["a"]["shared_collection"]
+    assert 1 == metrics["b"]["loads"]
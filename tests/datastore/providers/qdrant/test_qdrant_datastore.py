@@ -4,7 +4,7 @@ import pytest
 import qdrant_client
 from qdrant_client.http.models import PayloadSchemaType
 
-from datastore.providers.qdrant_datastore import QdrantDataStore
+from datastore.providers.qdrant_datastore import PAYLOAD_INDEXES, QdrantDataStore
 from models.models import (
     DocumentChunk,
     DocumentChunkMetadata,
@@ -85,13 +85,12 @@ async def test_datastore_creates_payload_indexes(
 ):
     collection_info = client.get_collection(collection_name="documents")
 
-    assert 2 == len(collection_info.payload_schema)
-    assert "created_at" in collection_info.payload_schema
-    created_at = collection_info.payload_schema["created_at"]
-    assert PayloadSchemaType.INTEGER == created_at.data_type
-    assert "metadata.document_id" in collection_info.payload_schema
-    document_id = collection_info.payload_schema["metadata.document_id"]
-    assert PayloadSchemaType.KEYWORD == document_id.data_type
+    # One index per payload key the filters match on
+    assert set(PAYLOAD_INDEXES) == set(collection_info.payload_schema)
+    for field_name, field_schema in PAYLOAD_INDEXES.items():
+        assert field_schema == collection_info.payload_schema[field_name].data_type
+    assert PayloadSchemaType.INTEGER == collection_info.payload_schema["created_at"].data_type
+    assert PayloadSchemaType.KEYWORD == collection_info.payload_schema["metadata.document_id"].data_type
 
 
 @pytest.mark.asyncio
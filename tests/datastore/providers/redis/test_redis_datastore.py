@@ -1,4 +1,5 @@
 from datastore.providers.redis_datastore import RedisDataStore
+from redis.commands.search.document import Document
 import datastore.providers.redis_datastore as static_redis
 from models.models import DocumentChunk, DocumentChunkMetadata, QueryWithEmbedding, Source
 import pytest
@@ -43,3 +44,52 @@ async def test_redis_upsert_query(redis_datastore):
     for i in range(5):
         assert f"Lorem ipsum {i}" == query_results[0].results[i].text
         assert f"doc-{i}" == query_results[0].results[i].id
+
+
+def test_redis_score_is_similarity():
+    # Redis returns the cosine distance of each hit, a closer hit must score higher
+    datastore = RedisDataStore.__new__(RedisDataStore)
+    metadata = '{"document_id": "doc-0", "source": "file"}'
+    near = datastore._get_chunk_with_score(Document("doc:0", score="0.1", text="near", metadata=metadata), "json")
+    far = datastore._get_chunk_with_score(Document("doc:1", score="0.6", text="far", metadata=metadata), "json")
+    assert near.score == pytest.approx(0.9)
+    assert near.score > far.score
+
+
+@pytest.mark.asyncio
+async def test_init_keeps_the_storage_type_of_the_existing_index(monkeypatch):
+    # An existing JSON index stays JSON when REDIS_STORAGE_TYPE=hash, until it is migrated
+    class FakeSearch:
+        async def info(self):
+            return {"index_definition": [b"key_type", b"JSON", b"prefixes", [b"doc:"]]}
+
+    class FakeRedis:
+        def __init__(self, **kwargs):
+            pass
+
+        def ft(self, index_name):
+            return FakeSearch()
+
+    async def modules_exist(client, modules):
+        pass
+
+    monkeypatch.setattr(static_redis.redis, "Redis", FakeRedis)
+    monkeypatch.setattr(static_redis, "_check_redis_module_exist", modules_exist)
+    datastore = await RedisDataStore.init(dim=5, storage_type="hash")
+
+    assert "json" == await datastore._get_storage_type(None)
+
+
+def test_index_params_from_index_info():
+    # FT.INFO lists each field as its name and value pairs, the vector field with its algorithm and HNSW params
+    info = {
+        "attributes": [
+            [b"identifier", b"$.document_id", b"attribute", b"document_id", b"type", b"TAG", b"SEPARATOR", b","],
+            [b"identifier", b"$.embedding", b"attribute", b"embedding", b"type", b"VECTOR", b"algorithm", b"HNSW",
+             b"data_type", b"FLOAT64", b"dim", 768, b"distance_metric", b"COSINE", b"M", 32, b"ef_construction", 400],
+        ]
+    }
+    assert {"index_type": "HNSW", "M": 32, "EF_CONSTRUCTION": 400} == static_redis._get_index_params(info)
+    # Servers that do not report the vector params
+    info["attributes"][1] = [b"identifier", b"$.embedding", b"attribute", b"embedding", b"type", b"VECTOR"]
+    assert static_redis._get_index_params(info) is None
@@ -0,0 +1,141 @@
+import asyncio
+from typing import Dict, List, Optional
+
+import pytest
+
+from datastore.datastore import DataStore
+from models.models import (
+    DocumentChunkMetadata,
+    DocumentChunkWithScore,
+    Query,
+    QueryResult,
+    QueryWithEmbedding,
+)
+
+
+class StubDataStore(DataStore):
+    """Answers every query of a collection with fixed scored chunks, or fails or stalls for some collections."""
+
+    def __init__(self, scores: Dict[str, List[float]], failing=(), stalling=()):
+        self.scores = scores
+        self.failing = failing
+        self.stalling = stalling
+        self.embedded_modes: List[str] = []
+
+    def _embed_queries(self, queries: List[Query], mode="openai", model=None, tokenizer=None) -> List[QueryWithEmbedding]:
+        self.embedded_modes.append(mode)
+        return [QueryWithEmbedding(**query.dict(), embedding=[0.0]) for query in queries]
+
+    async def _upsert(self, chunks, collection_name=None, mode="mpnet") -> List[str]:
+        raise NotImplementedError
+
+    async def _query(
+        self, queries: List[QueryWithEmbedding], collection_name=None, mode="mpnet", session_token: Optional[str] = None
+    ) -> List[QueryResult]:
+        if collection_name in self.failing:
+            raise Exception(f"{collection_name} is down")
+        if collection_name in self.stalling:
+            await asyncio.sleep(10)
+        return [
+            QueryResult(
+                query=query.query,
+                results=[
+                    DocumentChunkWithScore(
+                        id=f"{collection_name}_{i}",
+                        text=f"{query.query} {i}",
+                        metadata=DocumentChunkMetadata(),
+                        score=score,
+                    )
+                    for i, score in enumerate(self.scores[collection_name])
+                ],
+            )
+            for query in queries
+        ]
+
+    async def delete(self, ids=None, filter=None, delete_all=None, collection_name=None) -> bool:
+        raise NotImplementedError
+
+
+@pytest.mark.asyncio
+async def test_query_collections_merges_global_top_k():
+    datastore = StubDataStore({"a": [0.9, 0.5, 0.1], "b": [0.8, 0.7, 0.2]})
+    results, failed_collections = await datastore.query_collections(
+        [Query(query="first", top_k=4), Query(query="second", top_k=2)],
+        {"a": "openai", "b": "openai"},
+    )
+
+    assert [] == failed_collections
+    assert 2 == len(results)
+    assert "first" == results[0].query
+    assert "openai" == results[0].embedding_method
+    assert [0.9, 0.8, 0.7, 0.5] == [chunk.score for chunk in results[0].results]
+    assert ["a_0", "b_0", "b_1", "a_1"] == [chunk.id for chunk in results[0].results]
+    assert ["a", "b", "b", "a"] == [chunk.collection_name for chunk in results[0].results]
+    assert [0.9, 0.8] == [chunk.score for chunk in results[1].results]
+    # The queries are embedded once for the shared embedding method
+    assert ["openai"] == datastore.embedded_modes
+
+
+@pytest.mark.asyncio
+async def test_query_collections_embeds_once_per_method():
+    datastore = StubDataStore({"a": [0.9], "b": [0.8], "c": [0.7]})
+    await datastore.query_collections([Query(query="first")], {"a": "openai", "b": "mpnet", "c": "openai"})
+
+    assert ["mpnet", "openai"] == sorted(datastore.embedded_modes)
+
+
+@pytest.mark.asyncio
+async def test_query_collections_ranks_each_method_apart():
+    # Scores of different embedding methods are not comparable, each method gets its own top_k
+    datastore = StubDataStore({"a": [0.9, 0.2], "b": [0.5, 0.4], "c": [0.8, 0.1]})
+    results, _ = await datastore.query_collections(
+        [Query(query="first", top_k=2), Query(query="second", top_k=1)], {"a": "openai", "b": "mpnet", "c": "openai"}
+    )
+
+    assert [("first", "mpnet"), ("first", "openai"), ("second", "mpnet"), ("second", "openai")] == [
+        (result.query, result.embedding_method) for result in results
+    ]
+    assert ["b_0", "b_1"] == [chunk.id for chunk in results[0].results]
+    assert ["a_0", "c_0"] == [chunk.id for chunk in results[1].results]
+    assert ["b_0"] == [chunk.id for chunk in results[2].results]
+    assert ["a_0"] == [chunk.id for chunk in results[3].results]
+
+
+@pytest.mark.asyncio
+async def test_query_collections_skips_failed_collections():
+    datastore = StubDataStore({"a": [0.3], "b": [0.9], "c": [0.2]}, failing=("b",))
+    results, failed_collections = await datastore.query_collections(
+        [Query(query="first", top_k=3)], {"a": "openai", "b": "openai", "c": "openai"}
+    )
+
+    assert ["b"] == failed_collections
+    assert ["a_0", "c_0"] == [chunk.id for chunk in results[0].results]
+
+
+@pytest.mark.asyncio
+async def test_query_collections_skips_timed_out_collections():
+    datastore = StubDataStore({"a": [0.3], "b": [0.9]}, stalling=("b",))
+    results, failed_collections = await datastore.query_collections(
+        [Query(query="first", top_k=3)], {"a": "openai", "b": "openai"}, timeout=0.1
+    )
+
+    assert ["b"] == failed_collections
+    assert ["a_0"] == [chunk.id for chunk in results[0].results]
+
+
+@pytest.mark.asyncio
+async def test_query_collections_zero_timeout_is_kept():
+    # An explicit zero timeout is not replaced by the default one, no collection has the time to answer
+    datastore = StubDataStore({"a": [0.3]})
+    _, failed_collections = await datastore.query_collections([Query(query="first")], {"a": "openai"}, timeout=0)
+
+    assert ["a"] == failed_collections
+
+
+@pytest.mark.asyncio
+async def test_query_collections_all_failed():
+    datastore = StubDataStore({"a": [0.3]}, failing=("a",))
+    results, failed_collections = await datastore.query_collections([Query(query="first")], {"a": "openai"})
+
+    assert ["a"] == failed_collections
+    assert [] == results[0].results
@@ -0,0 +1,22 @@
+from services.chunks import get_text_chunks, get_text_chunks_from_segments, tokenizer
+
+
+def test_segments_chunked_like_concatenated_text_at_token_boundaries():
+    # The segments end with a newline next to non-ASCII text, a boundary BPE does not merge across
+    segments = [
+        "Le café était très chaud. Ça va être une journée ensoleillée à Zürich.\n" * 20,
+        "Über den Wolken muß die Freiheit wohl grenzenlos sein. Naïve façade, déjà vu.\n" * 20,
+        "日本語のテキストも含まれています。東京は晴れです。\n" * 20,
+    ]
+    text = "".join(segments)
+    assert tokenizer.encode(text) == [token for segment in segments for token in tokenizer.encode(segment)]
+
+    chunks = get_text_chunks_from_segments(segments, 50)
+
+    assert len(chunks) > 1
+    assert get_text_chunks(text, 50) == chunks
+
+
+def test_segments_empty():
+    assert [] == get_text_chunks_from_segments([], 50)
+    assert [] == get_text_chunks_from_segments(["", ""], 50)
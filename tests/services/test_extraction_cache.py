@@ -0,0 +1,94 @@
+import io
+import os
+
+import pytest
+
+from services.extraction_cache import CACHE_FILE_SUFFIX, ExtractionCache
+
+
+def store(cache: ExtractionCache, key: str, segments):
+    # The text is only cached once all the segments were consumed
+    return list(cache.store_segments(key, segments))
+
+
+def cached_size(cache: ExtractionCache, key: str) -> int:
+    return os.path.getsize(os.path.join(cache.directory, key + CACHE_FILE_SUFFIX))
+
+
+@pytest.fixture
+def cache(tmp_path) -> ExtractionCache:
+    return ExtractionCache(str(tmp_path / "cache"), 1024 * 1024)
+
+
+def test_key_depends_on_content_and_mimetype_and_rewinds():
+    file = io.BytesIO(b"some file content")
+    file.read(4)
+    key = ExtractionCache.key(file, "text/plain")
+
+    assert 0 == file.tell()
+    assert key == ExtractionCache.key(io.BytesIO(b"some file content"), "text/plain")
+    assert key != ExtractionCache.key(io.BytesIO(b"some file content"), "text/markdown")
+    assert key != ExtractionCache.key(io.BytesIO(b"other file content"), "text/plain")
+
+
+def test_get_store_round_trip(cache):
+    assert cache.get("a") is None
+
+    segments = ["Première page, déjà vue. ", "Second page."]
+    assert segments == store(cache, "a", segments)
+
+    assert "".join(segments) == cache.get("a")
+
+
+def test_partially_consumed_segments_are_not_cached(cache):
+    segments = cache.store_segments("a", iter(["first ", "second"]))
+    next(segments)
+    segments.close()
+
+    assert cache.get("a") is None
+    assert [] == os.listdir(cache.directory)
+
+
+def test_failed_extraction_is_not_cached(cache):
+    def failing_segments():
+        yield "first "
+        raise ValueError("corrupt file")
+
+    with pytest.raises(ValueError):
+        store(cache, "a", failing_segments())
+
+    assert cache.get("a") is None
+    assert [] == os.listdir(cache.directory)
+
+
+def test_least_recently_used_evicted_first(cache):
+    store(cache, "a", ["text a " * 10])
+    store(cache, "b", ["text b " * 10])
+    # Room for exactly these two texts, then use a so that b is the least recently used
+    cache.max_bytes = cached_size(cache, "a") + cached_size(cache, "b")
+    assert cache.get("a") is not None
+
+    store(cache, "c", ["text c " * 10])
+
+    assert cache.get("b") is None
+    assert "text a " * 10 == cache.get("a")
+    assert "text c " * 10 == cache.get("c")
+    assert not os.path.exists(os.path.join(cache.directory, "b" + CACHE_FILE_SUFFIX))
+
+
+def test_entries_picked_up_by_a_new_cache(cache):
+    store(cache, "a", ["text a"])
+
+    reopened = ExtractionCache(cache.directory, cache.max_bytes)
+
+    assert "text a" == reopened.get("a")
+
+
+def test_new_cache_evicts_down_to_its_size(cache):
+    store(cache, "a", ["text a " * 10])
+    store(cache, "b", ["text b " * 10])
+
+    reopened = ExtractionCache(cache.directory, cached_size(cache, "b"))
+
+    assert reopened.get("a") is None
+    assert "text b " * 10 == reopened.get("b")
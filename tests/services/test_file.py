@@ -0,0 +1,101 @@
+import io
+from typing import List
+
+from models.models import Document, DocumentMetadata, Source
+from services.file import _open_seekable_stream, iter_csv_documents
+
+
+def csv_documents(text: str, rows_per_document: int = 1, metadata=None) -> List[Document]:
+    file = io.BytesIO(text.encode("utf-8"))
+    return list(iter_csv_documents(file, metadata or DocumentMetadata(), rows_per_document))
+
+
+def test_csv_row_documents():
+    documents = csv_documents("name,city\nAda,London\nGrace,New York\n")
+
+    assert ["name: Ada, city: London", "name: Grace, city: New York"] == [document.text for document in documents]
+    assert [None, None] == [document.id for document in documents]
+
+
+def test_csv_groups_of_rows():
+    documents = csv_documents("name\na\nb\nc\nd\ne\n", rows_per_document=2)
+
+    assert ["name: a\nname: b", "name: c\nname: d", "name: e"] == [document.text for document in documents]
+
+
+def test_csv_id_column_with_one_row_per_document():
+    documents = csv_documents("ID,name\n1,Ada\n2,Grace\n,Alan\n")
+
+    assert ["1", "2", None] == [document.id for document in documents]
+
+
+def test_csv_id_column_ignored_with_groups_of_rows():
+    # The trailing document has a single row, it must not take that row's id either
+    documents = csv_documents("id,name\n1,Ada\n2,Grace\n3,Alan\n", rows_per_document=2)
+
+    assert 2 == len(documents)
+    assert [None, None] == [document.id for document in documents]
+
+
+def test_csv_metadata_columns():
+    documents = csv_documents(
+        "Source,author,url,created_at,text\n"
+        "email,Ada,https://example.com,2023-03-05,first\n"
+        "chat,Grace,,2023-03-06,second\n",
+        rows_per_document=2,
+        metadata=DocumentMetadata(source_id="upload", author="unknown"),
+    )
+
+    assert 1 == len(documents)
+    metadata = documents[0].metadata
+    # The metadata comes from the first row of the document, over the given metadata
+    assert Source.email == metadata.source
+    assert "Ada" == metadata.author
+    assert "https://example.com" == metadata.url
+    assert "2023-03-05" == metadata.created_at
+    assert "upload" == metadata.source_id
+
+
+def test_csv_invalid_source_and_empty_cells_keep_the_given_metadata():
+    documents = csv_documents(
+        "source,author,text\nfax,,first\n",
+        metadata=DocumentMetadata(source=Source.file, author="unknown"),
+    )
+
+    assert Source.file == documents[0].metadata.source
+    assert "unknown" == documents[0].metadata.author
+
+
+def test_csv_blank_rows_skipped():
+    documents = csv_documents("name\n\na\n,\nb\n\n", rows_per_document=2)
+
+    assert ["name: a\nname: b"] == [document.text for document in documents]
+
+
+def test_csv_empty_file():
+    assert [] == csv_documents("")
+
+
+class UnseekableStream(io.BytesIO):
+    def seekable(self) -> bool:
+        return False
+
+
+def test_unseekable_stream_spooled_copy_closed():
+    stream = UnseekableStream(b"a,b\n1,2\n")
+    with _open_seekable_stream(stream) as spooled:
+        assert spooled is not stream
+        assert b"a,b\n1,2\n" == spooled.read()
+
+    assert spooled.closed
+    assert not stream.closed
+
+
+def test_seekable_stream_rewound_and_left_open():
+    stream = io.BytesIO(b"a,b\n")
+    stream.read()
+    with _open_seekable_stream(stream) as rewound:
+        assert rewound is stream
+        assert b"a,b\n" == rewound.read()
+
+    assert not stream.closed